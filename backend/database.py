@@ -31,11 +31,23 @@ class Database:
             return
         
         # Users collection indexes
+        # Legacy users have no id field, so only index users that have one
+        await self.db.users.create_index(
+            "id",
+            unique=True,
+            partialFilterExpression={"id": {"$type": "string"}}
+        )
         await self.db.users.create_index("usn", unique=True)
         await self.db.users.create_index("email", unique=True)
         await self.db.users.create_index("department")
         await self.db.users.create_index("college")
         await self.db.users.create_index("year")
+        # Cleared tokens are set to None, so only index live (string) tokens
+        await self.db.users.create_index(
+            "email_verification_token",
+            unique=True,
+            partialFilterExpression={"email_verification_token": {"$type": "string"}}
+        )
         
         # Notes collection indexes
         await self.db.notes.create_index("user_id")
@@ -45,6 +57,43 @@ class Database:
         await self.db.notes.create_index("is_approved")
         await self.db.notes.create_index("is_flagged")
         await self.db.notes.create_index("uploaded_at")
+        # Browse listings: approved notes filtered by department/year/subject,
+        # newest first. Equality fields lead so the sort comes from the index.
+        await self.db.notes.create_index(
+            [("department", 1), ("year", 1), ("subject", 1), ("uploaded_at", -1)],
+            partialFilterExpression={"is_approved": True}
+        )
+        await self.db.notes.create_index([("is_approved", 1), ("uploaded_at", -1)])
+        # The notes text index (one per collection) is owned by
+        # SearchService.ensure_text_indexes, run at startup
+        # Trigram lookup for SearchService.fuzzy_search (multikey)
+        await self.db.notes.create_index([("search_ngrams", 1), ("is_approved", 1)])
+        # SearchService.search_notes: always scoped to the user's college, then
+        # optional filters; one index per sort order it offers
+        await self.db.notes.create_index(
+            [("college", 1), ("department", 1), ("subject", 1), ("year", 1), ("uploaded_at", -1)]
+        )
+        await self.db.notes.create_index([("college", 1), ("uploaded_at", -1)])
+        await self.db.notes.create_index([("college", 1), ("download_count", -1)])
+        await self.db.notes.create_index([("college", 1), ("view_count", -1)])
+        await self.db.notes.create_index([("college", 1), ("file_extension", 1), ("uploaded_at", -1)])
+        
+        # Autocomplete prefix ranges; collation matches search_service.AUTOCOMPLETE_COLLATION
+        await self.db.notes.create_index(
+            [("is_approved", 1), ("title", 1)],
+            name="notes_title_ci",
+            collation={"locale": "en", "strength": 2}
+        )
+        await self.db.notes.create_index(
+            [("is_approved", 1), ("subject", 1)],
+            name="notes_subject_ci",
+            collation={"locale": "en", "strength": 2}
+        )
+        
+        # Search history: per-user, newest first
+        await self.db.search_history.create_index([("user_id", 1), ("timestamp", -1)])
+        # Expire search history after 30 days
+        await self.db.search_history.create_index("timestamp", expireAfterSeconds=30 * 24 * 3600)
         
         # Bookmarks collection indexes
         await self.db.bookmarks.create_index([("user_id", 1), ("note_id", 1)], unique=True)
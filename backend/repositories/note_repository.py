@@ -5,9 +5,21 @@ Data access layer for notes using repository pattern (DDD)
 
 from typing import List, Dict, Any, Optional
 from datetime import datetime
+from functools import lru_cache
 from bson import ObjectId
 
 
+@lru_cache(maxsize=8192)
+def _oid(note_id: str) -> ObjectId:
+    """
+    Convert a note ID string to an ObjectId, memoized for hot notes
+    
+    Invalid IDs raise as before; exceptions are never cached, so only
+    valid conversions occupy the cache.
+    """
+    return ObjectId(note_id)
+
+
 class NoteRepository:
     """Repository for note data access"""
     
@@ -24,7 +36,7 @@ class NoteRepository:
     async def find_by_id(self, note_id: str) -> Optional[Dict[str, Any]]:
         """Find note by ID"""
         try:
-            return await self.collection.find_one({"_id": ObjectId(note_id)})
+            return await self.collection.find_one({"_id": _oid(note_id)})
         except Exception:
             return None
     
@@ -44,7 +56,7 @@ class NoteRepository:
         """Update note by ID"""
         try:
             result = await self.collection.update_one(
-                {"_id": ObjectId(note_id)},
+                {"_id": _oid(note_id)},
                 {"$set": update_data}
             )
             return result.modified_count > 0
@@ -55,7 +67,7 @@ class NoteRepository:
         """Increment a numeric field"""
         try:
             result = await self.collection.update_one(
-                {"_id": ObjectId(note_id)},
+                {"_id": _oid(note_id)},
                 {"$inc": {field: value}}
             )
             return result.modified_count > 0
@@ -65,7 +77,7 @@ class NoteRepository:
     async def delete_by_id(self, note_id: str) -> bool:
         """Delete note by ID"""
         try:
-            result = await self.collection.delete_one({"_id": ObjectId(note_id)})
+            result = await self.collection.delete_one({"_id": _oid(note_id)})
             return result.deleted_count > 0
         except Exception:
             return False
@@ -77,7 +89,7 @@ class NoteRepository:
     async def exists(self, note_id: str) -> bool:
         """Check if note exists"""
         try:
-            count = await self.collection.count_documents({"_id": ObjectId(note_id)})
+            count = await self.collection.count_documents({"_id": _oid(note_id)})
             return count > 0
         except Exception:
             return False
@@ -90,7 +90,7 @@ async def list_feature_flags(
     if not feature_flags.db:
         feature_flags.db = database
     
-    flags = await feature_flags.list_flags()
+    flags = await feature_flags.list_flags(include_metadata=True)
     return {"flags": flags, "count": len(flags)}
 
 
@@ -305,6 +305,17 @@ async def get_endpoint_performance(
     }
 
 
+@router.get("/performance/latency")
+async def get_latency_histogram(
+    endpoint: Optional[str] = None,
+    admin_id: str = Depends(require_admin)
+):
+    """Get approximate endpoint latency percentiles since the last reset"""
+    stats = performance_monitoring.get_latency_histogram_stats(endpoint=endpoint)
+
+    return {"stats": stats}
+
+
 @router.get("/performance/queries")
 async def get_query_performance(
     collection: Optional[str] = None,
@@ -16,6 +16,7 @@ import uuid
 
 from database import get_database
 from auth import get_current_user_id
+from services.search_service import build_search_ngrams
 from models import (
     NoteCreate, NoteResponse, NoteInDB, NotesSearchParams,
     FlagNoteRequest, ReviewNoteRequest
@@ -150,13 +151,15 @@ async def upload_note(
         "userId": user_id,
         "filename": unique_filename,
         "originalFilename": file.filename,
+        "file_extension": file_ext.lstrip("."),
         "uploadedAt": datetime.utcnow().isoformat(),
         "viewCount": 0,
         "downloadCount": 0,
         "isFlagged": False
     }
     
-    await database.notes.insert_one(note)
+    # search_ngrams is only for fuzzy search lookups, not part of the response
+    await database.notes.insert_one({**note, "search_ngrams": build_search_ngrams(title, subject)})
     
     # Award points and update streak for upload
     try:
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Backfill Script - Add Search Fields to Existing Notes
+Fuzzy search looks notes up by title/subject trigrams (search_ngrams) and
+file type filters match file_extension; notes uploaded before these fields
+existed need them computed once
+"""
+
+import asyncio
+import sys
+import os
+
+from pymongo import UpdateOne
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db
+from services.search_service import build_search_ngrams, file_extension
+
+BATCH_SIZE = 500
+
+
+async def main():
+    """Main backfill script"""
+    print("=" * 60)
+    print("NotesHub - Search Fields Backfill Script")
+    print("=" * 60)
+    print()
+
+    # Connect to database
+    print("🔌 Connecting to database...")
+    await db.connect_to_database()
+    print("✓ Database connected")
+    print()
+
+    cursor = db.db.notes.find(
+        {"$or": [
+            {"search_ngrams": {"$exists": False}},
+            {"file_extension": {"$exists": False}}
+        ]},
+        {"_id": 1, "title": 1, "subject": 1, "original_filename": 1, "originalFilename": 1}
+    )
+
+    updated_count = 0
+    batch = []
+
+    async for note in cursor:
+        # Notes uploaded through /api/notes use camelCase field names
+        filename = note.get("original_filename") or note.get("originalFilename")
+        batch.append(UpdateOne({"_id": note["_id"]}, {"$set": {
+            "search_ngrams": build_search_ngrams(note.get("title"), note.get("subject")),
+            "file_extension": file_extension(filename)
+        }}))
+
+        if len(batch) >= BATCH_SIZE:
+            await db.db.notes.bulk_write(batch, ordered=False)
+            updated_count += len(batch)
+            print(f"  ✓ Updated {updated_count} notes")
+            batch = []
+
+    if batch:
+        await db.db.notes.bulk_write(batch, ordered=False)
+        updated_count += len(batch)
+
+    print()
+    print("=" * 60)
+    print("📊 Backfill Summary:")
+    print(f"   Notes updated: {updated_count}")
+    print("=" * 60)
+    print()
+
+    # Close database connection
+    await db.close_database_connection()
+    print("✓ Database connection closed")
+    print("✅ Backfill complete!")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -64,6 +64,10 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"Warning: Could not initialize search indexes: {e}")
     
+    # Create storage buckets once, so uploads never have to
+    from services.storage_service import storage_service
+    await storage_service.ensure_buckets()
+    
     # Initialize feature flags and A/B testing with database
     try:
         from services.feature_flags import feature_flags
@@ -96,6 +100,8 @@ async def lifespan(app: FastAPI):
     yield
     
     # Shutdown
+    from services.email_service import email_service
+    await email_service.aclose()
     await db.close_database_connection()
     print("✅ NotesHub API shut down gracefully")
 
@@ -3,6 +3,7 @@ MongoDB Backup Service
 Handles automated backups with rotation and cloud storage
 """
 import os
+import hashlib
 import subprocess
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -32,6 +33,9 @@ class BackupService:
         self.s3_endpoint = os.getenv("BACKUP_S3_ENDPOINT")
         self.s3_access_key = os.getenv("BACKUP_S3_ACCESS_KEY")
         self.s3_secret_key = os.getenv("BACKUP_S3_SECRET_KEY")
+        self.s3_max_concurrency = int(os.getenv("BACKUP_S3_MAX_CONCURRENCY", "10"))
+        # Built lazily; one worker pool and connection pool shared by all uploads
+        self._transfer_manager = None
         
         # Create backup directory
         Path(self.backup_dir).mkdir(parents=True, exist_ok=True)
@@ -90,6 +94,15 @@ class BackupService:
                 shutil.rmtree(backup_path)
                 backup_path = Path(tar_path)
             
+            # Checksum the archive once, while it is still hot in the page cache.
+            # Only compressed archives are checksummed; directory dumps are not.
+            checksum = None
+            if backup_path.is_file():
+                checksum = self._compute_checksum(backup_path)
+                self._write_checksum(backup_path, checksum)
+            else:
+                logger.warning(f"Backup {backup_name} is an uncompressed directory; skipping SHA-256 checksum")
+            
             backup_info = {
                 "success": True,
                 "backup_name": backup_name,
@@ -97,14 +110,15 @@ class BackupService:
                 "size_bytes": backup_size,
                 "size_mb": round(backup_size / (1024 * 1024), 2),
                 "timestamp": timestamp,
-                "created_at": datetime.utcnow().isoformat()
+                "created_at": datetime.utcnow().isoformat(),
+                "sha256": checksum
             }
             
             logger.info(f"Backup completed: {backup_name} ({backup_info['size_mb']}MB)")
             
             # Upload to cloud if enabled
             if self.cloud_enabled:
-                cloud_result = self._upload_to_cloud(backup_path)
+                cloud_result = self._upload_to_cloud(backup_path, checksum)
                 backup_info["cloud_uploaded"] = cloud_result
             
             return backup_info
@@ -133,6 +147,13 @@ class BackupService:
             if not backup_path.exists():
                 tar_path = Path(f"{backup_path}.tar.gz")
                 if tar_path.exists():
+                    expected = self._read_checksum(tar_path)
+                    if expected is None:
+                        logger.warning(f"No checksum recorded for {tar_path.name}, skipping verification")
+                    elif self._compute_checksum(tar_path) != expected:
+                        logger.error(f"Checksum mismatch for {tar_path.name}, refusing to restore")
+                        return {"success": False, "error": "Backup checksum mismatch"}
+                    
                     logger.info(f"Extracting tarball: {tar_path}")
                     self._extract_tarball(tar_path, backup_path)
                 else:
@@ -196,7 +217,8 @@ class BackupService:
                     "size_bytes": stat.st_size if item.is_file() else self._get_directory_size(item),
                     "size_mb": round(stat.st_size / (1024 * 1024), 2) if item.is_file() else round(self._get_directory_size(item) / (1024 * 1024), 2),
                     "created_at": datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                    "type": "compressed" if item.suffix == ".gz" else "directory"
+                    "type": "compressed" if item.suffix == ".gz" else "directory",
+                    "sha256": self._read_checksum(item) if item.is_file() else None
                 })
         
         # Sort by creation time (newest first)
@@ -228,6 +250,7 @@ class BackupService:
                             shutil.rmtree(item)
                         else:
                             item.unlink()
+                            self._checksum_path(item).unlink(missing_ok=True)
                         
                         deleted_count += 1
                         freed_space += size
@@ -262,18 +285,36 @@ class BackupService:
         with tarfile.open(tar_path, "r:gz") as tar:
             tar.extractall(dest_dir.parent)
     
-    def _upload_to_cloud(self, backup_path: Path) -> bool:
+    def _compute_checksum(self, file_path: Path) -> str:
+        """Compute SHA-256 of a backup archive without buffering it in Python"""
+        with open(file_path, "rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
+    
+    def _checksum_path(self, archive_path: Path) -> Path:
+        """Path of the sha256sum-style manifest stored next to an archive"""
+        return archive_path.with_name(f"{archive_path.name}.sha256")
+    
+    def _write_checksum(self, archive_path: Path, checksum: str):
+        """Persist the archive checksum in sha256sum format"""
+        self._checksum_path(archive_path).write_text(f"{checksum}  {archive_path.name}\n")
+    
+    def _read_checksum(self, archive_path: Path) -> Optional[str]:
+        """Read the recorded checksum for an archive, if any"""
+        try:
+            return self._checksum_path(archive_path).read_text().split()[0]
+        except (FileNotFoundError, IndexError):
+            return None
+    
+    def _get_transfer_manager(self):
         """
-        Upload backup to S3-compatible cloud storage
+        Get the shared S3 transfer manager
         
-        Returns:
-            True if upload successful
+        Reusing one manager keeps its worker threads and HTTP connections
+        warm across uploads instead of building a new pool per file.
         """
-        if not self.cloud_enabled:
-            return False
-        
-        try:
+        if self._transfer_manager is None:
             import boto3
+            from boto3.s3.transfer import TransferConfig, create_transfer_manager
             from botocore.client import Config
             
             # Initialize S3 client
@@ -282,16 +323,46 @@ class BackupService:
                 endpoint_url=self.s3_endpoint,
                 aws_access_key_id=self.s3_access_key,
                 aws_secret_access_key=self.s3_secret_key,
-                config=Config(signature_version='s3v4')
+                config=Config(
+                    signature_version='s3v4',
+                    max_pool_connections=self.s3_max_concurrency
+                )
+            )
+            self._transfer_manager = create_transfer_manager(
+                s3_client,
+                TransferConfig(max_concurrency=self.s3_max_concurrency)
             )
+        return self._transfer_manager
+    
+    def _upload_to_cloud(self, backup_path: Path, checksum: Optional[str] = None) -> bool:
+        """
+        Upload backup to S3-compatible cloud storage
+        
+        Args:
+            backup_path: Archive to upload
+            checksum: Hex SHA-256 of the archive, stored as object metadata
+        
+        Returns:
+            True if upload successful
+        """
+        if not self.cloud_enabled:
+            return False
+        
+        try:
+            transfer_manager = self._get_transfer_manager()
             
             # Upload file
             s3_key = f"backups/{backup_path.name}"
-            s3_client.upload_file(
+            # Let S3 verify integrity server-side for every (multi)part
+            extra_args = {"ChecksumAlgorithm": "SHA256"}
+            if checksum:
+                extra_args["Metadata"] = {"sha256": checksum}
+            transfer_manager.upload(
                 str(backup_path),
                 self.s3_bucket,
-                s3_key
-            )
+                s3_key,
+                extra_args=extra_args
+            ).result()
             
             logger.info(f"Backup uploaded to cloud: {s3_key}")
             return True
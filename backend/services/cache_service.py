@@ -8,6 +8,10 @@ from datetime import timedelta
 import hashlib
 
 
+class _RawPayload(str):
+    """Pre-serialized JSON held by the in-memory backend, decoded on read"""
+
+
 class CacheService:
     """
     Caching service with Redis backend
@@ -57,12 +61,22 @@ class CacheService:
                 if value:
                     return json.loads(value)
             else:
-                return self.in_memory_cache.get(key)
+                value = self.in_memory_cache.get(key)
+                if isinstance(value, _RawPayload):
+                    return json.loads(value)
+                return value
         except Exception as e:
             print(f"Cache get error: {e}")
             return None
     
-    async def set(self, key: str, value: Any, ttl: int = 300) -> bool:
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: int = 300,
+        nx: bool = False,
+        raw: bool = False
+    ) -> bool:
         """
         Set value in cache with TTL
         
@@ -70,17 +84,31 @@ class CacheService:
             key: Cache key
             value: Value to cache (will be JSON serialized)
             ttl: Time to live in seconds (default: 5 minutes)
+            nx: Only set the key if it does not already exist (write-once)
+            raw: ``value`` is already-serialized JSON (``str``/``bytes``);
+                store it as-is and skip the JSON round-trip
+        
+        Returns:
+            True if the value was stored (False when ``nx`` and key exists)
         """
         if not self.cache_enabled:
             return False
         
         try:
-            json_value = json.dumps(value, default=str)
+            if raw:
+                payload = value.decode() if isinstance(value, (bytes, bytearray)) else value
+            else:
+                payload = json.dumps(value, default=str)
             
             if self.redis_client:
-                await self.redis_client.setex(key, ttl, json_value)
+                if nx:
+                    # SET NX EX is a single atomic command; no GET-then-SET race
+                    return bool(await self.redis_client.set(key, payload, ex=ttl, nx=True))
+                await self.redis_client.setex(key, ttl, payload)
             else:
-                self.in_memory_cache[key] = value
+                if nx and key in self.in_memory_cache:
+                    return False
+                self.in_memory_cache[key] = _RawPayload(payload) if raw else value
                 # Simple in-memory expiration (would need background task for cleanup)
             
             return True
@@ -3,10 +3,29 @@ Email Service
 Handles sending emails for welcome, password reset, and notifications
 Supports Resend API for production email sending
 """
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Set, Awaitable
 from datetime import datetime
+import asyncio
+import logging
 import os
-import resend
+import httpx
+from markupsafe import escape
+
+from services.email_templates import (
+    WELCOME_TEMPLATE,
+    PASSWORD_RESET_TEMPLATE,
+    NOTE_UPLOAD_TEMPLATE,
+    DOWNLOAD_TEMPLATE,
+)
+
+
+logger = logging.getLogger(__name__)
+
+RESEND_API_URL = "https://api.resend.com"
+
+# Subject lines for notification emails (filled with the note title)
+NOTE_UPLOAD_SUBJECT = "New Note Available: %s"
+DOWNLOAD_SUBJECT = "Your note '%s' was downloaded"
 
 
 class EmailService:
@@ -16,10 +35,18 @@ class EmailService:
     """
     
     def __init__(self):
-        self.enabled = os.getenv("EMAIL_ENABLED", "false").lower() == "true"
+        self._enabled = os.getenv("EMAIL_ENABLED", "false").lower() == "true"
+        self._provider = os.getenv("EMAIL_PROVIDER", "mock")  # mock or resend
+        self._update_mode()
         self.from_email = os.getenv("EMAIL_FROM", "noreply@noteshub.app")
         self.from_name = os.getenv("EMAIL_FROM_NAME", "NotesHub")
-        self.provider = os.getenv("EMAIL_PROVIDER", "mock")  # mock or resend
+        # Caps in-flight provider requests for bulk sends
+        self._send_semaphore = asyncio.Semaphore(int(os.getenv("EMAIL_CONCURRENCY", "20")))
+        self._resend_api_key: Optional[str] = None
+        # Shared HTTP client, created on first send and reused (keep-alive)
+        self._client: Optional[httpx.AsyncClient] = None
+        # Background sends started via enqueue(), kept alive until done
+        self._pending_sends: Set[asyncio.Task] = set()
         
         # Initialize Resend if enabled
         if self.provider == "resend" and self.enabled:
@@ -28,11 +55,73 @@ class EmailService:
                 print("⚠️  RESEND_API_KEY not found. Falling back to mock mode.")
                 self.provider = "mock"
             else:
-                resend.api_key = resend_api_key
+                self._resend_api_key = resend_api_key
                 print(f"✅ Email service initialized with Resend API")
         
         print(f"📧 Email service initialized (provider: {self.provider}, enabled: {self.enabled})")
     
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+    
+    @enabled.setter
+    def enabled(self, value: bool):
+        self._enabled = value
+        self._update_mode()
+    
+    @property
+    def provider(self) -> str:
+        return self._provider
+    
+    @provider.setter
+    def provider(self, value: str):
+        self._provider = value
+        self._update_mode()
+    
+    def _update_mode(self):
+        """Precompute the send path so send_email does a single flag check"""
+        self._is_mock = not self._enabled or self._provider == "mock"
+        self._is_resend = not self._is_mock and self._provider == "resend"
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Get the pooled HTTP client used for provider API calls"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=RESEND_API_URL,
+                headers={"Authorization": f"Bearer {self._resend_api_key}"},
+                timeout=httpx.Timeout(10.0),
+                limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+            )
+        return self._client
+    
+    def enqueue(self, send: Awaitable[bool]) -> asyncio.Task:
+        """
+        Run an email send in the background without awaiting it
+        
+        Use for emails that do not affect the HTTP response, e.g.
+        ``email_service.enqueue(email_service.send_welcome_email(...))``.
+        Failures are logged instead of propagated.
+        """
+        task = asyncio.create_task(send)
+        self._pending_sends.add(task)
+        task.add_done_callback(self._on_send_done)
+        return task
+    
+    def _on_send_done(self, task: asyncio.Task):
+        """Forget a finished background send and report failures"""
+        self._pending_sends.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"❌ Background email send failed: {task.exception()}")
+    
+    async def aclose(self):
+        """Wait for background sends and close the pooled HTTP client (call on application shutdown)"""
+        if self._pending_sends:
+            await asyncio.gather(*self._pending_sends, return_exceptions=True)
+        
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
     async def send_email(
         self,
         to: str,
@@ -52,21 +141,17 @@ class EmailService:
         Returns:
             True if email sent successfully
         """
-        if not self.enabled or self.provider == "mock":
-            # Mock: Just log to console
-            print("\n" + "="*80)
-            print(f"📧 MOCK EMAIL")
-            print("="*80)
-            print(f"To: {to}")
-            print(f"From: {self.from_email}")
-            print(f"Subject: {subject}")
-            print("-"*80)
-            print(html_body)
-            print("="*80 + "\n")
+        if self._is_mock:
+            # Mock: log instead of sending; the body is only formatted at DEBUG
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "Mock email to=%s from=%s subject=%s\n%s",
+                    to, self.from_email, subject, html_body
+                )
             return True
         
         # Send via Resend
-        if self.provider == "resend":
+        if self._is_resend:
             try:
                 params = {
                     "from": f"{self.from_name} <{self.from_email}>",
@@ -78,7 +163,9 @@ class EmailService:
                 if text_body:
                     params["text"] = text_body
                 
-                email = resend.Emails.send(params)
+                response = await self._get_client().post("/emails", json=params)
+                response.raise_for_status()
+                email = response.json()
                 print(f"✅ Email sent via Resend to {to} - ID: {email.get('id', 'unknown')}")
                 return True
                 
@@ -92,51 +179,7 @@ class EmailService:
         """Send welcome email to new user"""
         subject = "Welcome to NotesHub! 🎉"
         
-        html_body = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
-                .content {{ background: #f9fafb; padding: 30px; border-radius: 0 0 10px 10px; }}
-                .button {{ display: inline-block; padding: 12px 30px; background: #667eea; color: white; text-decoration: none; border-radius: 5px; margin: 20px 0; }}
-                .footer {{ text-align: center; margin-top: 30px; color: #6b7280; font-size: 14px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>Welcome to NotesHub!</h1>
-                </div>
-                <div class="content">
-                    <h2>Hi {user_name}! 👋</h2>
-                    <p>Thank you for joining NotesHub - your collaborative platform for sharing academic notes.</p>
-                    
-                    <h3>Get Started:</h3>
-                    <ul>
-                        <li>📤 Upload your notes to share with classmates</li>
-                        <li>📥 Download notes from your department</li>
-                        <li>🤝 Collaborate in real-time with drawing tools</li>
-                        <li>🎯 Track your contributions and engagement</li>
-                    </ul>
-                    
-                    <div style="text-align: center;">
-                        <a href="http://localhost:3000" class="button">Start Exploring</a>
-                    </div>
-                    
-                    <p>If you have any questions, feel free to reach out to our support team.</p>
-                    
-                    <p>Happy learning!<br>The NotesHub Team</p>
-                </div>
-                <div class="footer">
-                    <p>© 2025 NotesHub. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        html_body = WELCOME_TEMPLATE.render(user_name=escape(user_name))
         
         return await self.send_email(user_email, subject, html_body)
     
@@ -149,52 +192,11 @@ class EmailService:
         """Send password reset email"""
         subject = "Reset Your NotesHub Password 🔐"
         
-        html_body = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: #ef4444; color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
-                .content {{ background: #f9fafb; padding: 30px; border-radius: 0 0 10px 10px; }}
-                .button {{ display: inline-block; padding: 12px 30px; background: #ef4444; color: white; text-decoration: none; border-radius: 5px; margin: 20px 0; }}
-                .warning {{ background: #fef2f2; border-left: 4px solid #ef4444; padding: 15px; margin: 20px 0; }}
-                .footer {{ text-align: center; margin-top: 30px; color: #6b7280; font-size: 14px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>Password Reset Request</h1>
-                </div>
-                <div class="content">
-                    <h2>Hi {user_name},</h2>
-                    <p>We received a request to reset your NotesHub password.</p>
-                    
-                    <div style="text-align: center;">
-                        <a href="{reset_link}" class="button">Reset Password</a>
-                    </div>
-                    
-                    <p>This link will expire in 1 hour for security reasons.</p>
-                    
-                    <div class="warning">
-                        <strong>⚠️ Security Note:</strong><br>
-                        If you didn't request this password reset, please ignore this email. Your password will remain unchanged.
-                    </div>
-                    
-                    <p>For security reasons, this link can only be used once.</p>
-                    
-                    <p>Best regards,<br>The NotesHub Team</p>
-                </div>
-                <div class="footer">
-                    <p>© 2025 NotesHub. All rights reserved.</p>
-                    <p style="font-size: 12px;">If the button doesn't work, copy and paste this link:<br>{reset_link}</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        # Escape once up front; the link is rendered twice in the template
+        html_body = PASSWORD_RESET_TEMPLATE.render(
+            user_name=escape(user_name),
+            reset_link=escape(reset_link)
+        )
         
         return await self.send_email(user_email, subject, html_body)
     
@@ -207,56 +209,53 @@ class EmailService:
         subject_name: str
     ) -> bool:
         """Notify users about new note uploads in their department"""
-        subject = f"New Note Available: {note_title}"
+        subject = NOTE_UPLOAD_SUBJECT % (note_title,)
         
-        html_body = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: #10b981; color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
-                .content {{ background: #f9fafb; padding: 30px; border-radius: 0 0 10px 10px; }}
-                .note-info {{ background: white; padding: 20px; border-radius: 8px; margin: 20px 0; border-left: 4px solid #10b981; }}
-                .button {{ display: inline-block; padding: 12px 30px; background: #10b981; color: white; text-decoration: none; border-radius: 5px; margin: 20px 0; }}
-                .footer {{ text-align: center; margin-top: 30px; color: #6b7280; font-size: 14px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>📚 New Note Available!</h1>
-                </div>
-                <div class="content">
-                    <p>A new note has been uploaded to your department:</p>
-                    
-                    <div class="note-info">
-                        <h3>{note_title}</h3>
-                        <p><strong>Subject:</strong> {subject_name}</p>
-                        <p><strong>Department:</strong> {department}</p>
-                        <p><strong>Uploaded by:</strong> {uploader_name}</p>
-                    </div>
-                    
-                    <div style="text-align: center;">
-                        <a href="http://localhost:3000/find-notes" class="button">View Note</a>
-                    </div>
-                    
-                    <p style="color: #6b7280; font-size: 14px; margin-top: 30px;">
-                        You're receiving this email because you have note notifications enabled. 
-                        You can change your notification preferences in your account settings.
-                    </p>
-                </div>
-                <div class="footer">
-                    <p>© 2025 NotesHub. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        html_body = NOTE_UPLOAD_TEMPLATE.render(
+            note_title=escape(note_title),
+            subject_name=escape(subject_name),
+            department=escape(department),
+            uploader_name=escape(uploader_name)
+        )
         
         return await self.send_email(recipient_email, subject, html_body)
     
+    async def send_note_upload_notifications_bulk(
+        self,
+        recipient_emails: List[str],
+        uploader_name: str,
+        note_title: str,
+        department: str,
+        subject_name: str
+    ) -> List[bool]:
+        """
+        Notify many users about a new note upload
+        
+        Renders the email once and sends concurrently, bounded by
+        EMAIL_CONCURRENCY in-flight requests.
+        
+        Returns:
+            One result per recipient, in order (False if that send failed)
+        """
+        subject = NOTE_UPLOAD_SUBJECT % (note_title,)
+        
+        html_body = NOTE_UPLOAD_TEMPLATE.render(
+            note_title=escape(note_title),
+            subject_name=escape(subject_name),
+            department=escape(department),
+            uploader_name=escape(uploader_name)
+        )
+        
+        async def _send_one(recipient_email: str) -> bool:
+            async with self._send_semaphore:
+                return await self.send_email(recipient_email, subject, html_body)
+        
+        results = await asyncio.gather(
+            *(_send_one(recipient) for recipient in recipient_emails),
+            return_exceptions=True
+        )
+        return [result is True for result in results]
+    
     async def send_download_notification(
         self,
         uploader_email: str,
@@ -264,52 +263,12 @@ class EmailService:
         downloader_name: str
     ) -> bool:
         """Notify note uploader when someone downloads their note"""
-        subject = f"Your note '{note_title}' was downloaded"
+        subject = DOWNLOAD_SUBJECT % (note_title,)
         
-        html_body = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: #3b82f6; color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
-                .content {{ background: #f9fafb; padding: 30px; border-radius: 0 0 10px 10px; }}
-                .stats {{ background: white; padding: 20px; border-radius: 8px; margin: 20px 0; text-align: center; }}
-                .button {{ display: inline-block; padding: 12px 30px; background: #3b82f6; color: white; text-decoration: none; border-radius: 5px; margin: 20px 0; }}
-                .footer {{ text-align: center; margin-top: 30px; color: #6b7280; font-size: 14px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>📥 Note Downloaded!</h1>
-                </div>
-                <div class="content">
-                    <p>Great news! Your note is helping other students.</p>
-                    
-                    <div class="stats">
-                        <h3>{note_title}</h3>
-                        <p>Downloaded by: <strong>{downloader_name}</strong></p>
-                        <p style="color: #6b7280; margin-top: 10px;">🎉 Keep sharing valuable content!</p>
-                    </div>
-                    
-                    <div style="text-align: center;">
-                        <a href="http://localhost:3000/profile" class="button">View Your Stats</a>
-                    </div>
-                    
-                    <p style="color: #6b7280; font-size: 14px; margin-top: 30px;">
-                        You're receiving this email because you have download notifications enabled. 
-                        You can change your notification preferences in your account settings.
-                    </p>
-                </div>
-                <div class="footer">
-                    <p>© 2025 NotesHub. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        html_body = DOWNLOAD_TEMPLATE.render(
+            note_title=escape(note_title),
+            downloader_name=escape(downloader_name)
+        )
         
         return await self.send_email(uploader_email, subject, html_body)
 
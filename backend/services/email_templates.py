@@ -0,0 +1,224 @@
+"""
+Email Templates
+Pre-compiled Jinja2 templates for transactional emails
+"""
+from jinja2 import BaseLoader, DictLoader, Environment
+
+# Shared skeleton: CSS, header and footer live here once; each email
+# only fills in its accent colour, heading and content blocks.
+_BASE_SRC = """\
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+        .container { max-width: 600px; margin: 0 auto; padding: 20px; }
+        .header { background: {% block header_background %}{{ self.accent() }}{% endblock %}; color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }
+        .content { background: #f9fafb; padding: 30px; border-radius: 0 0 10px 10px; }
+        .button { display: inline-block; padding: 12px 30px; background: {% block accent %}#667eea{% endblock %}; color: white; text-decoration: none; border-radius: 5px; margin: 20px 0; }
+        .footer { text-align: center; margin-top: 30px; color: #6b7280; font-size: 14px; }
+{% block styles %}{% endblock %}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>{% block heading %}{% endblock %}</h1>
+        </div>
+        <div class="content">
+{% block content %}{% endblock %}
+        </div>
+        <div class="footer">
+            <p>© 2025 NotesHub. All rights reserved.</p>
+{% block footer_extra %}{% endblock %}
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+_WELCOME_SRC = """\
+{% extends "_base.html" %}
+{% block accent %}#667eea{% endblock %}
+{% block header_background %}linear-gradient(135deg, #667eea 0%, #764ba2 100%){% endblock %}
+{% block heading %}Welcome to NotesHub!{% endblock %}
+{% block content %}
+            <h2>Hi {{ user_name }}! 👋</h2>
+            <p>Thank you for joining NotesHub - your collaborative platform for sharing academic notes.</p>
+            
+            <h3>Get Started:</h3>
+            <ul>
+                <li>📤 Upload your notes to share with classmates</li>
+                <li>📥 Download notes from your department</li>
+                <li>🤝 Collaborate in real-time with drawing tools</li>
+                <li>🎯 Track your contributions and engagement</li>
+            </ul>
+            
+            <div style="text-align: center;">
+                <a href="http://localhost:3000" class="button">Start Exploring</a>
+            </div>
+            
+            <p>If you have any questions, feel free to reach out to our support team.</p>
+            
+            <p>Happy learning!<br>The NotesHub Team</p>
+{% endblock %}
+"""
+
+_PASSWORD_RESET_SRC = """\
+{% extends "_base.html" %}
+{% block accent %}#ef4444{% endblock %}
+{% block styles %}
+        .warning { background: #fef2f2; border-left: 4px solid #ef4444; padding: 15px; margin: 20px 0; }
+{% endblock %}
+{% block heading %}Password Reset Request{% endblock %}
+{% block content %}
+            <h2>Hi {{ user_name }},</h2>
+            <p>We received a request to reset your NotesHub password.</p>
+            
+            <div style="text-align: center;">
+                <a href="{{ reset_link }}" class="button">Reset Password</a>
+            </div>
+            
+            <p>This link will expire in 1 hour for security reasons.</p>
+            
+            <div class="warning">
+                <strong>⚠️ Security Note:</strong><br>
+                If you didn't request this password reset, please ignore this email. Your password will remain unchanged.
+            </div>
+            
+            <p>For security reasons, this link can only be used once.</p>
+            
+            <p>Best regards,<br>The NotesHub Team</p>
+{% endblock %}
+{% block footer_extra %}
+            <p style="font-size: 12px;">If the button doesn't work, copy and paste this link:<br>{{ reset_link }}</p>
+{% endblock %}
+"""
+
+_NOTE_UPLOAD_SRC = """\
+{% extends "_base.html" %}
+{% block accent %}#10b981{% endblock %}
+{% block styles %}
+        .note-info { background: white; padding: 20px; border-radius: 8px; margin: 20px 0; border-left: 4px solid #10b981; }
+{% endblock %}
+{% block heading %}📚 New Note Available!{% endblock %}
+{% block content %}
+            <p>A new note has been uploaded to your department:</p>
+            
+            <div class="note-info">
+                <h3>{{ note_title }}</h3>
+                <p><strong>Subject:</strong> {{ subject_name }}</p>
+                <p><strong>Department:</strong> {{ department }}</p>
+                <p><strong>Uploaded by:</strong> {{ uploader_name }}</p>
+            </div>
+            
+            <div style="text-align: center;">
+                <a href="http://localhost:3000/find-notes" class="button">View Note</a>
+            </div>
+            
+            <p style="color: #6b7280; font-size: 14px; margin-top: 30px;">
+                You're receiving this email because you have note notifications enabled. 
+                You can change your notification preferences in your account settings.
+            </p>
+{% endblock %}
+"""
+
+_DOWNLOAD_SRC = """\
+{% extends "_base.html" %}
+{% block accent %}#3b82f6{% endblock %}
+{% block styles %}
+        .stats { background: white; padding: 20px; border-radius: 8px; margin: 20px 0; text-align: center; }
+{% endblock %}
+{% block heading %}📥 Note Downloaded!{% endblock %}
+{% block content %}
+            <p>Great news! Your note is helping other students.</p>
+            
+            <div class="stats">
+                <h3>{{ note_title }}</h3>
+                <p>Downloaded by: <strong>{{ downloader_name }}</strong></p>
+                <p style="color: #6b7280; margin-top: 10px;">🎉 Keep sharing valuable content!</p>
+            </div>
+            
+            <div style="text-align: center;">
+                <a href="http://localhost:3000/profile" class="button">View Your Stats</a>
+            </div>
+            
+            <p style="color: #6b7280; font-size: 14px; margin-top: 30px;">
+                You're receiving this email because you have download notifications enabled. 
+                You can change your notification preferences in your account settings.
+            </p>
+{% endblock %}
+"""
+
+_VERIFICATION_SRC = """\
+{% extends "_base.html" %}
+{% block accent %}#667eea{% endblock %}
+{% block header_background %}linear-gradient(135deg, #667eea 0%, #764ba2 100%){% endblock %}
+{% block styles %}
+        .warning { background: #fef2f2; border-left: 4px solid #ef4444; padding: 15px; margin: 20px 0; }
+{% endblock %}
+{% block heading %}✉️ Verify Your Email{% endblock %}
+{% block content %}
+            <h2>Hi {{ user_name }}!</h2>
+            <p>Thank you for registering with NotesHub. To complete your registration, please verify your email address.</p>
+            
+            <div style="text-align: center;">
+                <a href="{{ verification_link }}" class="button">Verify Email Address</a>
+            </div>
+            
+            <p>This verification link will expire in 24 hours for security reasons.</p>
+            
+            <div class="warning">
+                <strong>⚠️ Security Note:</strong><br>
+                If you didn't create an account with NotesHub, please ignore this email.
+            </div>
+            
+            <p>For security reasons, this link can only be used once.</p>
+            
+            <p>Best regards,<br>The NotesHub Team</p>
+{% endblock %}
+{% block footer_extra %}
+            <p style="font-size: 12px;">If the button doesn't work, copy and paste this link:<br>{{ verification_link }}</p>
+{% endblock %}
+"""
+
+_VERIFICATION_TEXT_SRC = """\
+Hi {{ user_name }},
+
+Thank you for registering with NotesHub. Please verify your email address by visiting:
+{{ verification_link }}
+
+This link will expire in 24 hours.
+
+Best regards,
+The NotesHub Team
+"""
+
+# Templates are parsed and compiled once at import and rendered per send
+_env = Environment(
+    loader=DictLoader({
+        "_base.html": _BASE_SRC,
+        "welcome.html": _WELCOME_SRC,
+        "password_reset.html": _PASSWORD_RESET_SRC,
+        "note_upload.html": _NOTE_UPLOAD_SRC,
+        "download.html": _DOWNLOAD_SRC,
+        "verification.html": _VERIFICATION_SRC,
+    }),
+    autoescape=True,
+    auto_reload=False
+)
+# Plain-text bodies must not be HTML-escaped
+_text_env = Environment(
+    loader=BaseLoader(),
+    autoescape=False,
+    auto_reload=False,
+    keep_trailing_newline=True
+)
+
+
+WELCOME_TEMPLATE = _env.get_template("welcome.html")
+PASSWORD_RESET_TEMPLATE = _env.get_template("password_reset.html")
+NOTE_UPLOAD_TEMPLATE = _env.get_template("note_upload.html")
+DOWNLOAD_TEMPLATE = _env.get_template("download.html")
+VERIFICATION_TEMPLATE = _env.get_template("verification.html")
+VERIFICATION_TEXT_TEMPLATE = _text_env.from_string(_VERIFICATION_TEXT_SRC)
@@ -1,8 +1,12 @@
 import secrets
 from datetime import datetime, timedelta
 from typing import Optional
+from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from markupsafe import escape
 from services.email_service import email_service
+from services.email_templates import VERIFICATION_TEMPLATE, VERIFICATION_TEXT_TEMPLATE
 import os
 
 
@@ -23,11 +27,10 @@ class EmailVerificationService:
         """
         Create and store a verification token for a user
         """
-        token = self.generate_verification_token()
+        token = secrets.token_urlsafe(32)
         expiry = datetime.utcnow() + timedelta(hours=self.verification_expiry_hours)
         
         # Store token in database
-        from bson import ObjectId
         await db.users.update_one(
             {"_id": ObjectId(user_id)},
             {"$set": {
@@ -47,63 +50,16 @@ class EmailVerificationService:
         
         subject = "Verify Your NotesHub Email Address"
         
-        html_body = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
-                .content {{ background: #f9fafb; padding: 30px; border-radius: 0 0 10px 10px; }}
-                .button {{ display: inline-block; padding: 12px 30px; background: #667eea; color: white; text-decoration: none; border-radius: 5px; margin: 20px 0; }}
-                .footer {{ text-align: center; margin-top: 30px; color: #6b7280; font-size: 14px; }}
-                .warning {{ background: #fef2f2; border-left: 4px solid #ef4444; padding: 15px; margin: 20px 0; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>✉️ Verify Your Email</h1>
-                </div>
-                <div class="content">
-                    <h2>Hi {user_name}!</h2>
-                    <p>Thank you for registering with NotesHub. To complete your registration, please verify your email address.</p>
-                    
-                    <div style="text-align: center;">
-                        <a href="{verification_link}" class="button">Verify Email Address</a>
-                    </div>
-                    
-                    <p>This verification link will expire in 24 hours for security reasons.</p>
-                    
-                    <div class="warning">
-                        <strong>⚠️ Security Note:</strong><br>
-                        If you didn't create an account with NotesHub, please ignore this email.
-                    </div>
-                    
-                    <p>For security reasons, this link can only be used once.</p>
-                    
-                    <p>Best regards,<br>The NotesHub Team</p>
-                </div>
-                <div class="footer">
-                    <p>© 2025 NotesHub. All rights reserved.</p>
-                    <p style="font-size: 12px;">If the button doesn't work, copy and paste this link:<br>{verification_link}</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        text_body = f"""Hi {user_name},
+        # Escape once up front; the link is rendered twice in the template
+        html_body = VERIFICATION_TEMPLATE.render(
+            user_name=escape(user_name),
+            verification_link=escape(verification_link)
+        )
         
-Thank you for registering with NotesHub. Please verify your email address by visiting:
-{verification_link}
-
-This link will expire in 24 hours.
-
-Best regards,
-The NotesHub Team
-        """
+        text_body = VERIFICATION_TEXT_TEMPLATE.render(
+            user_name=user_name,
+            verification_link=verification_link
+        )
         
         return await email_service.send_email(user_email, subject, html_body, text_body)
     
@@ -112,33 +68,34 @@ The NotesHub Team
         Verify email token and mark email as verified.
         Returns user_id if successful, None otherwise.
         """
-        user = await db.users.find_one({
-            "email_verification_token": token,
-            "email_verification_expiry": {"$gt": datetime.utcnow()}
-        })
-        
-        if not user:
-            return None
-        
-        # Mark email as verified and clear token
-        from bson import ObjectId
-        await db.users.update_one(
-            {"_id": user["_id"]},
+        # Match and consume the token in a single round trip
+        user = await db.users.find_one_and_update(
+            {
+                "email_verification_token": token,
+                "email_verification_expiry": {"$gt": datetime.utcnow()}
+            },
             {"$set": {
                 "email_verified": True,
                 "email_verification_token": None,
                 "email_verification_expiry": None
-            }}
+            }},
+            projection={"_id": 1},
+            return_document=ReturnDocument.BEFORE
         )
         
+        if not user:
+            return None
+        
         return str(user["_id"])
     
     async def resend_verification_email(self, db: AsyncIOMotorDatabase, user_id: str) -> bool:
         """
         Resend verification email to user
         """
-        from bson import ObjectId
-        user = await db.users.find_one({"_id": ObjectId(user_id)})
+        user = await db.users.find_one(
+            {"_id": ObjectId(user_id)},
+            projection={"email": 1, "usn": 1, "email_verified": 1}
+        )
         
         if not user:
             return False
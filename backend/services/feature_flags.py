@@ -3,7 +3,11 @@ Feature Flags Service
 Database-backed feature toggles for controlled rollouts
 """
 import os
-from typing import Optional, Dict, List, Any
+import asyncio
+import hashlib
+import time
+from collections import defaultdict
+from typing import Optional, Dict, List, Any, Tuple
 from datetime import datetime
 from enum import Enum
 import logging
@@ -11,6 +15,28 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+# Fields needed to evaluate a flag; metadata and timestamps are never cached
+_EVAL_PROJECTION = {
+    "_id": 0,
+    "name": 1,
+    "status": 1,
+    "rollout_percentage": 1,
+    "whitelist_users": 1,
+    "whitelist_roles": 1,
+}
+
+
+def _rollout_bucket(user_id: str) -> int:
+    """
+    Map a user ID to a stable rollout bucket (0-99)
+    
+    Unlike the builtin hash(), this does not change between processes
+    or restarts, so a user stays on the same side of a rollout.
+    """
+    digest = hashlib.blake2b(user_id.encode(), digest_size=4).digest()
+    return int.from_bytes(digest, "little") % 100
+
+
 class FeatureFlagStatus(str, Enum):
     """Feature flag status"""
     ENABLED = "enabled"
@@ -25,13 +51,27 @@ class FeatureFlagService:
     """
     
     def __init__(self, database=None):
+        self._flags = None
         self.db = database
-        self.cache = {}  # In-memory cache for performance
+        # In-memory cache for performance: flag name -> (flag, monotonic expiry).
+        # A cached None records that the flag does not exist.
+        self.cache: Dict[str, Tuple[Optional[Dict[str, Any]], float]] = {}
         self.cache_ttl = 60  # Cache TTL in seconds
-        self.last_cache_update = {}
+        # Per-flag locks so concurrent cache misses share one database fetch
+        self._fetch_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
         
         logger.info("Feature flags service initialized")
     
+    @property
+    def db(self):
+        return self._db
+    
+    @db.setter
+    def db(self, database):
+        """Attach the database and bind the feature_flags collection once"""
+        self._db = database
+        self._flags = database.feature_flags if database is not None else None
+    
     async def is_enabled(
         self,
         flag_name: str,
@@ -52,35 +92,123 @@ class FeatureFlagService:
             True if feature is enabled
         """
         # Check cache first
-        if flag_name in self.cache:
-            cache_age = datetime.utcnow().timestamp() - self.last_cache_update.get(flag_name, 0)
-            if cache_age < self.cache_ttl:
-                flag = self.cache[flag_name]
-                return self._evaluate_flag(flag, user_id, user_role)
-        
-        # Fetch from database
-        if self.db:
+        entry = self.cache.get(flag_name)
+        if entry and entry[1] > time.monotonic():
+            flag = entry[0]
+        elif self.db:
+            flag = await self._fetch_flag(flag_name)
+        else:
+            flag = None
+        
+        # Return default if not found
+        if not flag:
+            return default
+        
+        # Globally on/off flags need no targeting work
+        status = flag.get("status")
+        if status == FeatureFlagStatus.ENABLED:
+            return True
+        if status == FeatureFlagStatus.DISABLED:
+            return False
+        
+        return self._evaluate_flag(flag, user_id, user_role)
+    
+    async def _fetch_flag(self, flag_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Load a flag from the database into the cache
+        
+        Concurrent callers for the same flag wait on one query instead of
+        each hitting the database after the cache entry expires.
+        """
+        async with self._fetch_locks[flag_name]:
+            # Another coroutine may have refilled the cache while we waited
+            entry = self.cache.get(flag_name)
+            if entry and entry[1] > time.monotonic():
+                return entry[0]
+            
             try:
-                flag = await self.db.feature_flags.find_one({"name": flag_name})
+                flag = await self._flags.find_one({"name": flag_name}, projection=_EVAL_PROJECTION)
                 
+                # Update cache (missing flags are cached too)
                 if flag:
-                    # Update cache
-                    self.cache[flag_name] = flag
-                    self.last_cache_update[flag_name] = datetime.utcnow().timestamp()
-                    
-                    return self._evaluate_flag(flag, user_id, user_role)
+                    self._prepare_flag(flag)
+                self.cache[flag_name] = (flag, time.monotonic() + self.cache_ttl)
+                return flag
             
             except Exception as e:
                 logger.error(f"Error fetching feature flag {flag_name}: {str(e)}")
+                return None
+    
+    async def bulk_is_enabled(
+        self,
+        flag_names: List[str],
+        user_id: Optional[str] = None,
+        user_role: Optional[str] = None,
+        default: bool = False
+    ) -> Dict[str, bool]:
+        """
+        Check several feature flags for one user in a single pass
         
-        # Return default if not found
-        return default
+        Cache misses are fetched with one query, and the user's rollout
+        bucket is computed once for all flags.
+        
+        Args:
+            flag_names: Names of the feature flags
+            user_id: Optional user ID for targeting
+            user_role: Optional user role for targeting
+            default: Default value for flags that are not found
+        
+        Returns:
+            Mapping of flag name to enabled state
+        """
+        now = time.monotonic()
+        flags: Dict[str, Optional[Dict[str, Any]]] = {}
+        missing = []
+        
+        for name in flag_names:
+            entry = self.cache.get(name)
+            if entry and entry[1] > now:
+                flags[name] = entry[0]
+            else:
+                missing.append(name)
+        
+        if missing and self.db:
+            try:
+                fetched = {}
+                async for flag in self._flags.find({"name": {"$in": missing}}, projection=_EVAL_PROJECTION):
+                    fetched[flag["name"]] = self._prepare_flag(flag)
+                
+                expiry = now + self.cache_ttl
+                for name in missing:
+                    flag = fetched.get(name)
+                    self.cache[name] = (flag, expiry)
+                    flags[name] = flag
+            
+            except Exception as e:
+                logger.error(f"Error fetching feature flags {missing}: {str(e)}")
+        
+        user_bucket = _rollout_bucket(user_id) if user_id else None
+        
+        return {
+            name: (
+                self._evaluate_flag(flags[name], user_id, user_role, user_bucket)
+                if flags.get(name) else default
+            )
+            for name in flag_names
+        }
+    
+    def _prepare_flag(self, flag: Dict[str, Any]) -> Dict[str, Any]:
+        """Precompute whitelist sets on a flag before it is cached"""
+        flag["_whitelist_users_set"] = frozenset(flag.get("whitelist_users") or ())
+        flag["_whitelist_roles_set"] = frozenset(flag.get("whitelist_roles") or ())
+        return flag
     
     def _evaluate_flag(
         self,
         flag: Dict[str, Any],
         user_id: Optional[str] = None,
-        user_role: Optional[str] = None
+        user_role: Optional[str] = None,
+        user_bucket: Optional[int] = None
     ) -> bool:
         """
         Evaluate if flag is enabled for specific user/role
@@ -89,6 +217,7 @@ class FeatureFlagService:
             flag: Feature flag document
             user_id: Optional user ID
             user_role: Optional user role
+            user_bucket: Precomputed rollout bucket for user_id
         
         Returns:
             True if enabled for this context
@@ -103,20 +232,24 @@ class FeatureFlagService:
         
         # Rollout mode - check targeting rules
         if flag.get("status") == FeatureFlagStatus.ROLLOUT:
+            if "_whitelist_users_set" not in flag:
+                self._prepare_flag(flag)
+            
             # Check user whitelist
-            if user_id and user_id in flag.get("whitelist_users", []):
+            if user_id and user_id in flag["_whitelist_users_set"]:
                 return True
             
             # Check role whitelist
-            if user_role and user_role in flag.get("whitelist_roles", []):
+            if user_role and user_role in flag["_whitelist_roles_set"]:
                 return True
             
             # Check percentage rollout
             rollout_percentage = flag.get("rollout_percentage", 0)
             if rollout_percentage > 0 and user_id:
-                # Use hash of user_id for consistent assignment
-                user_hash = hash(user_id) % 100
-                return user_hash < rollout_percentage
+                # Use stable hash of user_id for consistent assignment
+                if user_bucket is None:
+                    user_bucket = _rollout_bucket(user_id)
+                return user_bucket < rollout_percentage
         
         return False
     
@@ -149,7 +282,7 @@ class FeatureFlagService:
             raise Exception("Database not configured")
         
         # Check if flag already exists
-        existing = await self.db.feature_flags.find_one({"name": name})
+        existing = await self._flags.find_one({"name": name})
         if existing:
             raise Exception(f"Feature flag '{name}' already exists")
         
@@ -165,7 +298,7 @@ class FeatureFlagService:
             "updated_at": datetime.utcnow(),
         }
         
-        result = await self.db.feature_flags.insert_one(flag_doc)
+        result = await self._flags.insert_one(flag_doc)
         flag_doc["id"] = str(result.inserted_id)
         del flag_doc["_id"]
         
@@ -218,7 +351,7 @@ class FeatureFlagService:
         if metadata is not None:
             update_data["metadata"] = metadata
         
-        result = await self.db.feature_flags.find_one_and_update(
+        result = await self._flags.find_one_and_update(
             {"name": name},
             {"$set": update_data},
             return_document=True
@@ -249,7 +382,7 @@ class FeatureFlagService:
         if not self.db:
             raise Exception("Database not configured")
         
-        result = await self.db.feature_flags.delete_one({"name": name})
+        result = await self._flags.delete_one({"name": name})
         
         # Clear cache
         self.cache.pop(name, None)
@@ -260,17 +393,21 @@ class FeatureFlagService:
         
         return False
     
-    async def list_flags(self) -> List[Dict[str, Any]]:
+    async def list_flags(self, include_metadata: bool = False) -> List[Dict[str, Any]]:
         """
         List all feature flags
         
+        Args:
+            include_metadata: Also return each flag's metadata document
+        
         Returns:
             List of all feature flags
         """
         if not self.db:
             return []
         
-        cursor = self.db.feature_flags.find({})
+        projection = None if include_metadata else {"metadata": 0}
+        cursor = self._flags.find({}, projection=projection)
         flags = await cursor.to_list(length=1000)
         
         for flag in flags:
@@ -292,7 +429,7 @@ class FeatureFlagService:
         if not self.db:
             return None
         
-        flag = await self.db.feature_flags.find_one({"name": name})
+        flag = await self._flags.find_one({"name": name})
         
         if flag:
             flag["id"] = str(flag["_id"])
@@ -303,7 +440,6 @@ class FeatureFlagService:
     def clear_cache(self):
         """Clear the feature flag cache"""
         self.cache.clear()
-        self.last_cache_update.clear()
         logger.info("Feature flag cache cleared")
 
 
@@ -7,6 +7,8 @@ import os
 import secrets
 from pathlib import Path
 from typing import Tuple, Optional
+import aiofiles
+import aiofiles.os
 from fastapi import UploadFile
 
 from exceptions import FileUploadError, ValidationError
@@ -15,8 +17,14 @@ from exceptions import FileUploadError, ValidationError
 class FileService:
     """Service for file-related operations"""
     
-    ALLOWED_EXTENSIONS = {'.pdf', '.doc', '.docx', '.ppt', '.pptx', '.txt', '.md'}
+    ALLOWED_EXTENSIONS = frozenset({'.pdf', '.doc', '.docx', '.ppt', '.pptx', '.txt', '.md'})
     MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+    CHUNK_SIZE = 1024 * 1024  # 1MB read/write chunks for uploads
+    
+    # Error-message values, computed once
+    _ALLOWED_LIST = sorted(ALLOWED_EXTENSIONS)
+    _ALLOWED_STR = ', '.join(_ALLOWED_LIST)
+    _MAX_MB = MAX_FILE_SIZE / 1024 / 1024
     
     def __init__(self, upload_dir: str = "uploads/notes"):
         self.upload_dir = upload_dir
@@ -30,8 +38,8 @@ class FileService:
         file_ext = Path(file.filename).suffix.lower()
         if file_ext not in self.ALLOWED_EXTENSIONS:
             raise FileUploadError(
-                f"Invalid file type. Allowed: {', '.join(self.ALLOWED_EXTENSIONS)}",
-                details={"allowed_types": list(self.ALLOWED_EXTENSIONS)}
+                f"Invalid file type. Allowed: {self._ALLOWED_STR}",
+                details={"allowed_types": list(self._ALLOWED_LIST)}
             )
     
     async def save_file(self, file: UploadFile) -> Tuple[str, str]:
@@ -50,30 +58,41 @@ class FileService:
         # Validate file type
         self.validate_file(file)
         
-        # Read file content
-        contents = await file.read()
-        
-        # Check file size
-        if len(contents) > self.MAX_FILE_SIZE:
-            raise FileUploadError(
-                f"File too large. Maximum size: {self.MAX_FILE_SIZE / 1024 / 1024}MB",
-                details={"max_size_mb": self.MAX_FILE_SIZE / 1024 / 1024}
-            )
-        
         # Generate unique filename
         file_ext = Path(file.filename).suffix.lower()
         unique_filename = f"{secrets.token_urlsafe(16)}{file_ext}"
         file_path = os.path.join(self.upload_dir, unique_filename)
         
-        # Save file
+        # Stream to disk in chunks so the whole upload is never held in memory
+        total = 0
         try:
-            with open(file_path, "wb") as f:
-                f.write(contents)
+            async with aiofiles.open(file_path, "wb") as f:
+                while chunk := await file.read(self.CHUNK_SIZE):
+                    total += len(chunk)
+                    if total > self.MAX_FILE_SIZE:
+                        break
+                    await f.write(chunk)
         except Exception as e:
+            await self._remove_partial(file_path)
             raise FileUploadError(f"Failed to save file: {str(e)}")
         
+        # Check file size
+        if total > self.MAX_FILE_SIZE:
+            await self._remove_partial(file_path)
+            raise FileUploadError(
+                f"File too large. Maximum size: {self._MAX_MB}MB",
+                details={"max_size_mb": self._MAX_MB}
+            )
+        
         return unique_filename, file.filename
     
+    async def _remove_partial(self, file_path: str) -> None:
+        """Remove a partially written upload"""
+        try:
+            await aiofiles.os.remove(file_path)
+        except FileNotFoundError:
+            pass
+    
     def get_file_path(self, filename: str) -> str:
         """Get full path to a file"""
         return os.path.join(self.upload_dir, filename)
@@ -89,11 +108,11 @@ class FileService:
         Returns:
             True if file was deleted, False if file didn't exist
         """
-        file_path = self.get_file_path(filename)
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        try:
+            os.unlink(self.get_file_path(filename))
             return True
-        return False
+        except FileNotFoundError:
+            return False
 
 
 # Singleton instance
@@ -3,21 +3,188 @@ Log Aggregation Service
 Centralized logging with rotation, filtering, and search capabilities
 """
 import os
+import atexit
+import copy
 import json
 import logging
-from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
+import queue
+import struct
+import time
+from collections import deque
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    TimedRotatingFileHandler,
+)
 from datetime import datetime
-from typing import Optional, Dict, List, Any
+from functools import lru_cache
+from typing import Optional, Dict, List, Any, Iterator
 from pathlib import Path
 import re
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _json_default(value: Any) -> str:
+    """Serialize values the JSON encoder does not handle natively"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+if ORJSON_AVAILABLE:
+    def _dumps(data: Dict[str, Any]) -> str:
+        # orjson writes naive datetimes in the same ISO format as isoformat()
+        return orjson.dumps(data, default=str).decode()
+    
+    _loads = orjson.loads
+else:
+    def _dumps(data: Dict[str, Any]) -> str:
+        return json.dumps(data, default=_json_default)
+    
+    _loads = json.loads
+
+try:
+    import msgspec
+    MSGSPEC_AVAILABLE = True
+except ImportError:
+    MSGSPEC_AVAILABLE = False
+
+# MessagePack log files hold 4-byte big-endian length-prefixed frames
+MSGPACK_SUFFIX = ".mpk"
+_FRAME_HEADER = struct.Struct(">I")
+
+
+def _iter_msgpack_frames(path: Path) -> Iterator[Dict[str, Any]]:
+    """Yield decoded entries from a length-prefixed MessagePack log file"""
+    decoder = msgspec.msgpack.Decoder()
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(_FRAME_HEADER.size)
+            if len(header) < _FRAME_HEADER.size:
+                return
+            (size,) = _FRAME_HEADER.unpack(header)
+            frame = f.read(size)
+            if len(frame) < size:
+                # Truncated final frame (writer still appending)
+                return
+            yield decoder.decode(frame)
+
+
+# Standard LogRecord attributes; anything else on a record is an "extra"
+_LOGRECORD_STD = frozenset({
+    'name', 'msg', 'args', 'created', 'filename', 'funcName',
+    'levelname', 'levelno', 'lineno', 'module', 'msecs',
+    'message', 'pathname', 'process', 'processName',
+    'relativeCreated', 'thread', 'threadName', 'exc_info',
+    'exc_text', 'stack_info', 'taskName',
+})
+
+@lru_cache(maxsize=256)
+def _compile_search_pattern(pattern: str) -> re.Pattern:
+    """Compile a search_logs pattern, reusing it for repeated queries"""
+    return re.compile(pattern)
+
+
+# (epoch second, formatted "YYYY-MM-DDTHH:MM:SS") of the last timestamp;
+# one tuple so concurrent formatters never see a mismatched pair
+_timestamp_cache = (-1, "")
+
+
+def _format_timestamp(created: float) -> str:
+    """
+    Format a record's epoch time as naive UTC ISO 8601 with microseconds
+    
+    The date/time part is reused while records arrive within the same
+    second, so most calls only format the fraction.
+    """
+    global _timestamp_cache
+    second = int(created)
+    cached_second, prefix = _timestamp_cache
+    if second != cached_second:
+        prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+        _timestamp_cache = (second, prefix)
+    return f"{prefix}.{int((created - second) * 1_000_000):06d}"
+
+
+def _tail_lines(path: Path, block_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    Yield the lines of a file from last to first
+    
+    Reads fixed-size blocks backwards from the end, so callers that only
+    need the newest entries never touch the rest of the file.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        offset = os.fstat(fd).st_size
+        remainder = b""
+        
+        while offset > 0:
+            read_size = min(block_size, offset)
+            offset -= read_size
+            lines = (os.pread(fd, read_size, offset) + remainder).split(b"\n")
+            # The first piece may be the tail of a line from an earlier block
+            remainder = lines[0]
+            for line in reversed(lines[1:]):
+                if line:
+                    yield line
+        
+        if remainder:
+            yield remainder
+    finally:
+        os.close(fd)
+
+
+def _seek_json_log(f, start_time: datetime, min_span: int = 4096) -> None:
+    """
+    Position a binary JSON-lines log near the first entry at/after start_time
+    
+    Entries are appended in time order, so the offset is found by
+    bisecting on the timestamp of the first whole line after each probe.
+    The final position is a line start at or before the target; callers
+    still apply the time filter while scanning forward from it.
+    """
+    lo, hi = 0, f.seek(0, os.SEEK_END)
+    
+    while hi - lo > min_span:
+        mid = (lo + hi) // 2
+        f.seek(mid)
+        f.readline()  # skip the partial line
+        pos = f.tell()
+        line = f.readline()
+        if not line:
+            hi = mid
+            continue
+        try:
+            entry_time = datetime.fromisoformat(_loads(line)["timestamp"])
+        except Exception:
+            # Unparseable line: give up on bisecting and scan everything
+            lo = 0
+            break
+        if entry_time < start_time:
+            lo = pos
+        else:
+            hi = mid
+    
+    f.seek(lo)
+
 
 class JSONFormatter(logging.Formatter):
     """Custom JSON formatter for structured logging"""
     
     def format(self, record: logging.LogRecord) -> str:
+        return _dumps(self._log_data(record))
+    
+    def _log_data(self, record: logging.LogRecord) -> Dict[str, Any]:
+        """Build the structured entry for a record"""
         log_data = {
-            "timestamp": datetime.utcnow().isoformat(),
+            # Record creation time, not format time (records may be queued)
+            "timestamp": _format_timestamp(record.created),
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
@@ -42,14 +209,47 @@ class JSONFormatter(logging.Formatter):
         
         # Add extra attributes
         for key, value in record.__dict__.items():
-            if key not in ['name', 'msg', 'args', 'created', 'filename', 'funcName',
-                          'levelname', 'levelno', 'lineno', 'module', 'msecs',
-                          'message', 'pathname', 'process', 'processName',
-                          'relativeCreated', 'thread', 'threadName', 'exc_info',
-                          'exc_text', 'stack_info']:
+            if key not in _LOGRECORD_STD:
                 log_data[key] = value
         
-        return json.dumps(log_data)
+        return log_data
+
+
+class MsgpackFormatter(JSONFormatter):
+    """Formatter emitting the JSONFormatter fields as length-prefixed MessagePack frames"""
+    
+    def __init__(self):
+        super().__init__()
+        self._encoder = msgspec.msgpack.Encoder(enc_hook=str)
+    
+    def format(self, record: logging.LogRecord) -> bytes:
+        frame = self._encoder.encode(self._log_data(record))
+        return _FRAME_HEADER.pack(len(frame)) + frame
+
+
+class MsgpackRotatingFileHandler(RotatingFileHandler):
+    """Size-rotating handler writing MsgpackFormatter frames in binary mode"""
+    
+    terminator = b""
+    
+    def _open(self):
+        return open(self.baseFilename, "ab")
+
+
+class _LocalQueueHandler(QueueHandler):
+    """
+    Queue handler feeding an in-process listener
+    
+    The stock prepare() pre-formats the record and drops exc_info, which
+    would bake tracebacks into the message. Here only the message args
+    are merged; the record is otherwise passed to the listener intact.
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
 
 
 class LogAggregationService:
@@ -61,9 +261,16 @@ class LogAggregationService:
         self.log_dir = os.getenv("LOG_DIR", "/app/logs")
         self.log_level = os.getenv("LOG_LEVEL", "INFO").upper()
         self.json_logging = os.getenv("JSON_LOGGING", "true").lower() == "true"
+        # Opt-in binary format for app/error logs: LOG_FORMAT=msgpack
+        self.msgpack_logging = os.getenv("LOG_FORMAT", "json").lower() == "msgpack"
+        if self.msgpack_logging and not MSGSPEC_AVAILABLE:
+            print("⚠ LOG_FORMAT=msgpack requires msgspec, using JSON logs")
+            self.msgpack_logging = False
+        
+        self._bind_log_paths()
         
         # Create log directory
-        Path(self.log_dir).mkdir(parents=True, exist_ok=True)
+        self._log_dir_path.mkdir(parents=True, exist_ok=True)
         
         # Initialize loggers
         self._setup_logging()
@@ -71,6 +278,21 @@ class LogAggregationService:
         self.logger = logging.getLogger(__name__)
         self.logger.info("Log aggregation service initialized")
     
+    def _bind_log_paths(self):
+        """Build the log directory and per-file paths once"""
+        self._log_dir_path = Path(self.log_dir)
+        self._known_paths: Dict[str, Path] = {
+            name: self._log_dir_path / name
+            for name in (
+                "app.log", "error.log", "access.log", "security.log",
+                f"app{MSGPACK_SUFFIX}", f"error{MSGPACK_SUFFIX}",
+            )
+        }
+    
+    def _log_path(self, log_file: str) -> Path:
+        """Path of a file in the log directory"""
+        return self._known_paths.get(log_file) or self._log_dir_path / log_file
+    
     def _setup_logging(self):
         """Setup logging configuration with multiple handlers"""
         
@@ -80,6 +302,7 @@ class LogAggregationService:
         
         # Clear existing handlers
         root_logger.handlers.clear()
+        handlers: List[logging.Handler] = []
         
         # Console handler
         console_handler = logging.StreamHandler()
@@ -91,44 +314,60 @@ class LogAggregationService:
                 '%(asctime)s [%(levelname)s] %(name)s: %(message)s',
                 datefmt='%Y-%m-%d %H:%M:%S'
             ))
-        root_logger.addHandler(console_handler)
+        handlers.append(console_handler)
         
         # Application log (rotating by size)
-        app_log_path = Path(self.log_dir) / "app.log"
-        app_handler = RotatingFileHandler(
-            app_log_path,
-            maxBytes=10 * 1024 * 1024,  # 10MB
-            backupCount=10
-        )
+        if self.msgpack_logging:
+            app_handler = MsgpackRotatingFileHandler(
+                self._log_path(f"app{MSGPACK_SUFFIX}"),
+                maxBytes=10 * 1024 * 1024,  # 10MB
+                backupCount=10
+            )
+        else:
+            app_handler = RotatingFileHandler(
+                self._log_path("app.log"),
+                maxBytes=10 * 1024 * 1024,  # 10MB
+                backupCount=10
+            )
         app_handler.setLevel(logging.INFO)
-        if self.json_logging:
+        if self.msgpack_logging:
+            app_handler.setFormatter(MsgpackFormatter())
+        elif self.json_logging:
             app_handler.setFormatter(JSONFormatter())
         else:
             app_handler.setFormatter(logging.Formatter(
                 '%(asctime)s [%(levelname)s] %(name)s: %(message)s',
                 datefmt='%Y-%m-%d %H:%M:%S'
             ))
-        root_logger.addHandler(app_handler)
+        handlers.append(app_handler)
         
         # Error log (only errors and critical)
-        error_log_path = Path(self.log_dir) / "error.log"
-        error_handler = RotatingFileHandler(
-            error_log_path,
-            maxBytes=10 * 1024 * 1024,  # 10MB
-            backupCount=5
-        )
+        if self.msgpack_logging:
+            error_handler = MsgpackRotatingFileHandler(
+                self._log_path(f"error{MSGPACK_SUFFIX}"),
+                maxBytes=10 * 1024 * 1024,  # 10MB
+                backupCount=5
+            )
+        else:
+            error_handler = RotatingFileHandler(
+                self._log_path("error.log"),
+                maxBytes=10 * 1024 * 1024,  # 10MB
+                backupCount=5
+            )
         error_handler.setLevel(logging.ERROR)
-        if self.json_logging:
+        if self.msgpack_logging:
+            error_handler.setFormatter(MsgpackFormatter())
+        elif self.json_logging:
             error_handler.setFormatter(JSONFormatter())
         else:
             error_handler.setFormatter(logging.Formatter(
                 '%(asctime)s [%(levelname)s] %(name)s: %(message)s\n%(pathname)s:%(lineno)d\n%(message)s\n',
                 datefmt='%Y-%m-%d %H:%M:%S'
             ))
-        root_logger.addHandler(error_handler)
+        handlers.append(error_handler)
         
         # Access log (time-based rotation - daily)
-        access_log_path = Path(self.log_dir) / "access.log"
+        access_log_path = self._log_path("access.log")
         access_handler = TimedRotatingFileHandler(
             access_log_path,
             when='midnight',
@@ -144,10 +383,10 @@ class LogAggregationService:
                 '%(asctime)s %(message)s',
                 datefmt='%Y-%m-%d %H:%M:%S'
             ))
-        root_logger.addHandler(access_handler)
+        handlers.append(access_handler)
         
         # Security log (authentication, authorization events)
-        security_log_path = Path(self.log_dir) / "security.log"
+        security_log_path = self._log_path("security.log")
         security_handler = TimedRotatingFileHandler(
             security_log_path,
             when='midnight',
@@ -163,7 +402,27 @@ class LogAggregationService:
                 '%(asctime)s [%(levelname)s] %(message)s',
                 datefmt='%Y-%m-%d %H:%M:%S'
             ))
-        root_logger.addHandler(security_handler)
+        handlers.append(security_handler)
+        
+        # Request code only enqueues records; formatting and file I/O
+        # happen on the listener's background thread
+        self._log_queue: queue.Queue = queue.Queue(-1)
+        self._log_listener = QueueListener(
+            self._log_queue,
+            *handlers,
+            respect_handler_level=True
+        )
+        self._log_listener.start()
+        atexit.register(self.shutdown)
+        
+        root_logger.addHandler(_LocalQueueHandler(self._log_queue))
+    
+    def shutdown(self):
+        """Flush queued log records and stop the listener thread"""
+        listener = getattr(self, "_log_listener", None)
+        if listener is not None:
+            self._log_listener = None
+            listener.stop()
     
     def search_logs(
         self,
@@ -188,43 +447,40 @@ class LogAggregationService:
         Returns:
             List of matching log entries
         """
-        log_path = Path(self.log_dir) / log_file
+        log_path = self._log_path(log_file)
         
         if not log_path.exists():
             return []
         
         results = []
-        pattern_regex = re.compile(pattern) if pattern else None
+        pattern_regex = _compile_search_pattern(pattern) if pattern else None
         
         try:
-            with open(log_path, 'r') as f:
+            if MSGPACK_SUFFIX in log_path.suffixes:
+                for log_entry in _iter_msgpack_frames(log_path):
+                    if self._entry_matches(log_entry, level, pattern_regex, start_time, end_time):
+                        results.append(log_entry)
+                        if len(results) >= limit:
+                            break
+                return results
+            
+            # JSON lines are parsed straight from bytes, skipping a decode pass
+            with open(log_path, 'rb' if self.json_logging else 'r') as f:
+                if self.json_logging and start_time:
+                    _seek_json_log(f, start_time)
+                
                 for line in f:
                     # Parse JSON logs
                     if self.json_logging:
                         try:
-                            log_entry = json.loads(line)
-                            
-                            # Apply filters
-                            if level and log_entry.get("level") != level:
-                                continue
-                            
-                            if pattern_regex and not pattern_regex.search(log_entry.get("message", "")):
-                                continue
-                            
-                            if start_time:
-                                entry_time = datetime.fromisoformat(log_entry.get("timestamp"))
-                                if entry_time < start_time:
-                                    continue
-                            
-                            if end_time:
-                                entry_time = datetime.fromisoformat(log_entry.get("timestamp"))
-                                if entry_time > end_time:
-                                    continue
-                            
-                            results.append(log_entry)
-                            
+                            log_entry = _loads(line)
                         except json.JSONDecodeError:
                             continue
+                        
+                        if not self._entry_matches(log_entry, level, pattern_regex, start_time, end_time):
+                            continue
+                        
+                        results.append(log_entry)
                     else:
                         # Parse plain text logs
                         if pattern_regex and not pattern_regex.search(line):
@@ -243,6 +499,32 @@ class LogAggregationService:
         
         return results
     
+    @staticmethod
+    def _entry_matches(
+        log_entry: Dict[str, Any],
+        level: Optional[str],
+        pattern_regex: Optional[re.Pattern],
+        start_time: Optional[datetime],
+        end_time: Optional[datetime]
+    ) -> bool:
+        """Apply search_logs filters to a structured (JSON/MessagePack) entry"""
+        if level and log_entry.get("level") != level:
+            return False
+        
+        if pattern_regex and not pattern_regex.search(log_entry.get("message", "")):
+            return False
+        
+        if start_time or end_time:
+            entry_time = datetime.fromisoformat(log_entry.get("timestamp"))
+            
+            if start_time and entry_time < start_time:
+                return False
+            
+            if end_time and entry_time > end_time:
+                return False
+        
+        return True
+    
     def get_log_stats(self) -> Dict[str, Any]:
         """
         Get statistics about log files
@@ -255,23 +537,27 @@ class LogAggregationService:
             "files": []
         }
         
-        log_dir = Path(self.log_dir)
-        
-        if not log_dir.exists():
+        if not os.path.isdir(self.log_dir):
             return stats
         
         total_size = 0
         
-        for log_file in log_dir.glob("*.log*"):
-            if log_file.is_file():
-                size = log_file.stat().st_size
-                total_size += size
+        # One stat per file: scandir entries carry their own stat result
+        with os.scandir(self.log_dir) as entries:
+            for entry in entries:
+                if ".log" not in entry.name and MSGPACK_SUFFIX not in entry.name:
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                
+                st = entry.stat(follow_symlinks=False)
+                total_size += st.st_size
                 
                 stats["files"].append({
-                    "name": log_file.name,
-                    "size_bytes": size,
-                    "size_mb": round(size / (1024 * 1024), 2),
-                    "modified": datetime.fromtimestamp(log_file.stat().st_mtime).isoformat()
+                    "name": entry.name,
+                    "size_bytes": st.st_size,
+                    "size_mb": round(st.st_size / (1024 * 1024), 2),
+                    "modified": datetime.fromtimestamp(st.st_mtime).isoformat()
                 })
         
         stats["total_size_mb"] = round(total_size / (1024 * 1024), 2)
@@ -287,13 +573,62 @@ class LogAggregationService:
             count: Number of recent errors to retrieve
         
         Returns:
-            List of recent error entries
+            List of the newest error entries, oldest first
         """
-        return self.search_logs(
-            log_file="error.log",
-            level="ERROR",
-            limit=count
-        )
+        if self.msgpack_logging:
+            return self._recent_msgpack_errors(count)
+        
+        log_path = self._log_path("error.log")
+        
+        if not log_path.exists():
+            return []
+        
+        errors = []
+        
+        try:
+            for line in _tail_lines(log_path):
+                if self.json_logging:
+                    try:
+                        log_entry = _loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    
+                    if log_entry.get("level") != "ERROR":
+                        continue
+                    
+                    errors.append(log_entry)
+                else:
+                    if b"[ERROR]" not in line:
+                        continue
+                    
+                    errors.append({"raw": line.decode(errors="replace").strip()})
+                
+                if len(errors) >= count:
+                    break
+        
+        except Exception as e:
+            self.logger.error(f"Error reading recent errors: {str(e)}")
+        
+        errors.reverse()
+        return errors
+    
+    def _recent_msgpack_errors(self, count: int) -> List[Dict[str, Any]]:
+        """Newest ERROR entries from error.mpk (frames can only be read forwards)"""
+        log_path = self._log_path(f"error{MSGPACK_SUFFIX}")
+        
+        if not log_path.exists():
+            return []
+        
+        errors: deque = deque(maxlen=count)
+        
+        try:
+            for log_entry in _iter_msgpack_frames(log_path):
+                if log_entry.get("level") == "ERROR":
+                    errors.append(log_entry)
+        except Exception as e:
+            self.logger.error(f"Error reading recent errors: {str(e)}")
+        
+        return list(errors)
     
     def cleanup_old_logs(self, days: int = 30) -> Dict[str, Any]:
         """
@@ -305,23 +640,24 @@ class LogAggregationService:
         Returns:
             Dictionary with cleanup results
         """
-        from datetime import timedelta
-        
-        cutoff_time = datetime.utcnow() - timedelta(days=days)
+        # Compare epoch seconds directly, as st_mtime is
+        cutoff_time = time.time() - days * 24 * 60 * 60
         deleted_count = 0
         freed_space = 0
         
-        log_dir = Path(self.log_dir)
-        
-        for log_file in log_dir.glob("*.log.*"):
-            if log_file.is_file():
-                modified_time = datetime.fromtimestamp(log_file.stat().st_mtime)
+        # Only rotated files (app.log.1, error.mpk.2, ...) are removed
+        with os.scandir(self.log_dir) as entries:
+            for entry in entries:
+                if ".log." not in entry.name and f"{MSGPACK_SUFFIX}." not in entry.name:
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
                 
-                if modified_time < cutoff_time:
-                    size = log_file.stat().st_size
-                    log_file.unlink()
+                st = entry.stat(follow_symlinks=False)
+                if st.st_mtime < cutoff_time:
+                    os.unlink(entry.path)
                     deleted_count += 1
-                    freed_space += size
+                    freed_space += st.st_size
         
         return {
             "deleted_count": deleted_count,
@@ -329,13 +665,22 @@ class LogAggregationService:
         }
 
 
+def _record_message(record: logging.LogRecord) -> str:
+    """record.getMessage() without the %-interpolation when there are no args"""
+    # Queued records already have their args merged into msg
+    return record.getMessage() if record.args else str(record.msg)
+
+
 class AccessLogFilter(logging.Filter):
     """Filter to only allow access log messages"""
     
+    HTTP_METHODS = ['GET', 'POST', 'PUT', 'DELETE', 'PATCH']
+    # One compiled scan instead of a substring check per method
+    _METHOD_RE = re.compile(r'\b(?:' + '|'.join(HTTP_METHODS) + r')\b')
+    
     def filter(self, record: logging.LogRecord) -> bool:
         # Only log messages containing HTTP method and path
-        message = record.getMessage()
-        return any(method in message for method in ['GET', 'POST', 'PUT', 'DELETE', 'PATCH'])
+        return self._METHOD_RE.search(_record_message(record)) is not None
 
 
 class SecurityLogFilter(logging.Filter):
@@ -346,10 +691,11 @@ class SecurityLogFilter(logging.Filter):
         'password', 'token', 'permission', 'access denied',
         'unauthorized', 'forbidden', 'security', 'failed attempt'
     ]
+    # All keywords matched in a single pass over the message
+    _KEYWORD_RE = re.compile('|'.join(map(re.escape, SECURITY_KEYWORDS)), re.IGNORECASE)
     
     def filter(self, record: logging.LogRecord) -> bool:
-        message = record.getMessage().lower()
-        return any(keyword in message for keyword in self.SECURITY_KEYWORDS)
+        return self._KEYWORD_RE.search(_record_message(record)) is not None
 
 
 # Global log aggregation service instance
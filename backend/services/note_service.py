@@ -3,20 +3,42 @@ Note Service
 Business logic for note operations
 """
 
+from collections import Counter
 from datetime import datetime
 from typing import List, Dict, Any, Optional
+import asyncio
+import re
 import uuid
 
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
 from repositories.note_repository import get_note_repository
+from services.search_service import build_search_ngrams, file_extension
 from exceptions import NotFoundError, ValidationError
 
 
 class NoteService:
     """Service for note-related operations"""
     
+    # Shorter queries are matched as title/subject prefixes; the text index
+    # only matches whole (stemmed) words, which is unhelpful while typing
+    MIN_TEXT_SEARCH_LENGTH = 3
+    # Moderation fields are left out of list/search pages; use
+    # get_note_by_id for the full document
+    LIST_PROJECTION = {
+        "flag_reason": 0, "reviewed_at": 0, "is_flagged": 0, "is_approved": 0, "search_ngrams": 0
+    }
+    # Seconds view/download increments are buffered before one bulk write
+    COUNTER_FLUSH_INTERVAL = 0.5
+    
     def __init__(self, database):
         self.db = database
         self.repository = get_note_repository(database)
+        # Pending counter increments per note id, flushed in the background
+        self._view_counts: Counter = Counter()
+        self._download_counts: Counter = Counter()
+        self._flush_task: Optional[asyncio.Task] = None
     
     async def create_note(self, note_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new note"""
@@ -32,13 +54,15 @@ class NoteService:
             "subject": note_data["subject"],
             "filename": note_data["filename"],
             "original_filename": note_data["original_filename"],
+            "file_extension": file_extension(note_data["original_filename"]),
             "uploaded_at": datetime.utcnow(),
             "is_flagged": False,
             "flag_reason": None,
             "reviewed_at": None,
             "is_approved": True,
             "download_count": 0,
-            "view_count": 0
+            "view_count": 0,
+            "search_ngrams": build_search_ngrams(note_data["title"], note_data["subject"])
         }
         
         await self.db.notes.insert_one(note_doc)
@@ -50,9 +74,10 @@ class NoteService:
         subject: Optional[str] = None,
         year: Optional[int] = None,
         skip: int = 0,
-        limit: int = 100
+        limit: int = 100,
+        projection: Optional[Dict[str, Any]] = LIST_PROJECTION
     ) -> List[Dict[str, Any]]:
-        """Get notes with optional filters and pagination"""
+        """Get notes with optional filters and pagination (pass projection=None for full documents)"""
         query = {"is_approved": True}
         
         if department:
@@ -62,7 +87,7 @@ class NoteService:
         if year:
             query["year"] = year
         
-        cursor = self.db.notes.find(query).sort("uploaded_at", -1).skip(skip).limit(limit)
+        cursor = self.db.notes.find(query, projection).sort("uploaded_at", -1).skip(skip).limit(limit)
         return await cursor.to_list(length=limit)
     
     async def get_note_by_id(self, note_id: str) -> Optional[Dict[str, Any]]:
@@ -70,20 +95,77 @@ class NoteService:
         return await self.db.notes.find_one({"id": note_id})
     
     async def increment_download_count(self, note_id: str) -> bool:
-        """Increment note download count"""
-        result = await self.db.notes.update_one(
-            {"id": note_id},
-            {"$inc": {"download_count": 1}}
-        )
-        return result.modified_count > 0
+        """Increment note download count (buffered, written within COUNTER_FLUSH_INTERVAL)"""
+        self._download_counts[note_id] += 1
+        self._schedule_counter_flush()
+        return True
     
     async def increment_view_count(self, note_id: str) -> bool:
-        """Increment note view count"""
-        result = await self.db.notes.update_one(
-            {"id": note_id},
-            {"$inc": {"view_count": 1}}
-        )
-        return result.modified_count > 0
+        """Increment note view count (buffered, written within COUNTER_FLUSH_INTERVAL)"""
+        self._view_counts[note_id] += 1
+        self._schedule_counter_flush()
+        return True
+    
+    def _schedule_counter_flush(self) -> None:
+        """Start the background flusher if it is not already running"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_counters_loop())
+    
+    async def _flush_counters_loop(self) -> None:
+        """Flush buffered increments until no more arrive"""
+        while self._view_counts or self._download_counts:
+            await asyncio.sleep(self.COUNTER_FLUSH_INTERVAL)
+            await self.flush_counters()
+    
+    async def flush_counters(self) -> int:
+        """
+        Write buffered view/download increments in one bulk write
+        
+        Increments that fail to write are put back in the buffers for the
+        next flush. The app does not create a NoteService instance, so
+        there is nothing to flush in the lifespan shutdown; whoever
+        creates one must await flush_counters before closing the database.
+        
+        Returns:
+            Number of notes updated
+        """
+        views, self._view_counts = self._view_counts, Counter()
+        downloads, self._download_counts = self._download_counts, Counter()
+        
+        note_ids = list(views.keys() | downloads.keys())
+        operations = []
+        for note_id in note_ids:
+            inc = {}
+            if views[note_id]:
+                inc["view_count"] = views[note_id]
+            if downloads[note_id]:
+                inc["download_count"] = downloads[note_id]
+            operations.append(UpdateOne({"id": note_id}, {"$inc": inc}))
+        
+        if not operations:
+            return 0
+        
+        try:
+            result = await self.db.notes.bulk_write(operations, ordered=False)
+            return result.modified_count
+        except BulkWriteError as e:
+            # Unordered: only the reported operations failed, the rest were applied
+            failed = {note_ids[error["index"]] for error in e.details.get("writeErrors", [])}
+            self._restore_counters(
+                Counter({note_id: views[note_id] for note_id in failed}),
+                Counter({note_id: downloads[note_id] for note_id in failed})
+            )
+            print(f"Note counter flush error: {e}")
+            return e.details.get("nModified", 0)
+        except Exception as e:
+            self._restore_counters(views, downloads)
+            print(f"Note counter flush error: {e}")
+            return 0
+    
+    def _restore_counters(self, views: Counter, downloads: Counter) -> None:
+        """Merge unwritten increments back into the live buffers"""
+        self._view_counts.update(views)
+        self._download_counts.update(downloads)
     
     async def flag_note(self, note_id: str, reason: str) -> bool:
         """Flag a note for review"""
@@ -124,23 +206,34 @@ class NoteService:
         department: Optional[str] = None,
         year: Optional[int] = None,
         skip: int = 0,
-        limit: int = 50
+        limit: int = 50,
+        projection: Optional[Dict[str, Any]] = LIST_PROJECTION
     ) -> List[Dict[str, Any]]:
-        """Search notes by title or subject"""
-        query = {
-            "is_approved": True,
-            "$or": [
-                {"title": {"$regex": search_text, "$options": "i"}},
-                {"subject": {"$regex": search_text, "$options": "i"}}
-            ]
-        }
+        """
+        Search notes by title or subject
+        
+        Uses notes_text_index, created at startup by
+        SearchService.ensure_text_indexes (best matches first); queries shorter
+        than MIN_TEXT_SEARCH_LENGTH fall back to a prefix match. Pass
+        projection=None for full documents.
+        """
+        search_text = search_text.strip()
+        query: Dict[str, Any] = {"is_approved": True}
+        
+        if len(search_text) >= self.MIN_TEXT_SEARCH_LENGTH:
+            query["$text"] = {"$search": search_text}
+            sort = [("score", {"$meta": "textScore"}), ("uploaded_at", -1)]
+        else:
+            prefix = {"$regex": f"^{re.escape(search_text)}", "$options": "i"}
+            query["$or"] = [{"title": prefix}, {"subject": prefix}]
+            sort = [("uploaded_at", -1)]
         
         if department:
             query["department"] = department
         if year:
             query["year"] = year
         
-        cursor = self.db.notes.find(query).sort("uploaded_at", -1).skip(skip).limit(limit)
+        cursor = self.db.notes.find(query, projection).sort(sort).skip(skip).limit(limit)
         return await cursor.to_list(length=limit)
     
     async def get_note_count(self, filters: Optional[Dict[str, Any]] = None) -> int:
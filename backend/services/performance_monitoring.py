@@ -3,15 +3,21 @@ Enhanced Performance Monitoring Service
 Extends Sentry with custom metrics and database query tracking
 """
 import os
+import asyncio
+import math
 import time
-from typing import Optional, Dict, List, Any, Callable
-from datetime import datetime, timedelta
+from bisect import bisect_right
+from array import array
+from typing import Optional, Dict, List, Any, Callable, Tuple
 from functools import wraps
 import logging
-from collections import defaultdict
+from collections import defaultdict, deque
+
+import numpy as np
 
 try:
     import sentry_sdk
+    import sentry_sdk.metrics
     SENTRY_AVAILABLE = True
 except ImportError:
     SENTRY_AVAILABLE = False
@@ -19,20 +25,123 @@ except ImportError:
 logger = logging.getLogger(__name__)
 
 
+def _select_percentiles(durations: np.ndarray, quantiles: List[float]) -> List[float]:
+    """
+    Pick percentile values without fully sorting the samples
+    
+    Uses nearest-rank indexes (``int(n * q)``) and partitions around
+    them in O(n) instead of sorting.
+    """
+    n = len(durations)
+    indexes = [min(int(n * q), n - 1) for q in quantiles]
+    selected = np.partition(durations, indexes)
+    return [float(selected[i]) for i in indexes]
+
+
+# Latency histogram: log-spaced buckets from 0.1ms to 60s
+HISTOGRAM_BUCKETS = 1024
+HISTOGRAM_MIN_MS = 0.1
+HISTOGRAM_MAX_MS = 60_000.0
+_HISTOGRAM_SCALE = (HISTOGRAM_BUCKETS - 1) / math.log(HISTOGRAM_MAX_MS / HISTOGRAM_MIN_MS)
+
+
+def _histogram_bucket(duration_ms: float) -> int:
+    """Map a duration to its histogram bucket (clamped to the range)"""
+    if duration_ms <= HISTOGRAM_MIN_MS:
+        return 0
+    return min(HISTOGRAM_BUCKETS - 1, int(math.log(duration_ms / HISTOGRAM_MIN_MS) * _HISTOGRAM_SCALE))
+
+
+def _histogram_percentiles(histogram: np.ndarray, quantiles: List[float]) -> List[float]:
+    """
+    Approximate percentiles from a latency histogram
+    
+    Each result is the geometric midpoint of the bucket holding the
+    nearest-rank sample, i.e. within ~0.7% of the true value.
+    """
+    cumulative = histogram.cumsum()
+    total = int(cumulative[-1])
+    results = []
+    for q in quantiles:
+        rank = min(int(total * q), total - 1)
+        bucket = int(np.searchsorted(cumulative, rank, side="right"))
+        results.append(HISTOGRAM_MIN_MS * math.exp((bucket + 0.5) / _HISTOGRAM_SCALE))
+    return results
+
+
+class _EndpointSeries:
+    """Column-oriented samples for one endpoint (parallel arrays)"""
+    __slots__ = ("durations", "status_codes", "timestamps", "user_ids", "histogram")
+    
+    def __init__(self):
+        self.durations = array("d")
+        self.status_codes = array("H")
+        self.timestamps = array("d")  # time.monotonic() seconds
+        self.user_ids: List[Optional[str]] = []
+        # Counts every sample since reset, including ones trimmed from the columns
+        self.histogram = np.zeros(HISTOGRAM_BUCKETS, dtype=np.uint32)
+    
+    def __len__(self) -> int:
+        return len(self.durations)
+    
+    def trim(self, keep: int):
+        """Drop the oldest samples, keeping the newest ``keep``"""
+        drop = len(self.durations) - keep
+        if drop > 0:
+            del self.durations[:drop]
+            del self.status_codes[:drop]
+            del self.timestamps[:drop]
+            del self.user_ids[:drop]
+
+
+class _QuerySeries:
+    """Column-oriented samples for one collection operation (parallel arrays)"""
+    __slots__ = ("durations", "timestamps", "queries")
+    
+    def __init__(self):
+        self.durations = array("d")
+        self.timestamps = array("d")  # time.monotonic() seconds
+        self.queries: List[Optional[str]] = []
+    
+    def __len__(self) -> int:
+        return len(self.durations)
+    
+    def trim(self, keep: int):
+        """Drop the oldest samples, keeping the newest ``keep``"""
+        drop = len(self.durations) - keep
+        if drop > 0:
+            del self.durations[:drop]
+            del self.timestamps[:drop]
+            del self.queries[:drop]
+
+
 class PerformanceMonitoringService:
     """
     Enhanced performance monitoring with custom metrics
     """
     
+    # Seconds custom metric values are buffered before being sent to Sentry
+    MEASUREMENT_FLUSH_INTERVAL = 1.0
+    
     def __init__(self):
         self.enabled = os.getenv("PERFORMANCE_MONITORING_ENABLED", "true").lower() == "true"
         self.slow_query_threshold = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "100"))
         self.slow_endpoint_threshold = float(os.getenv("SLOW_ENDPOINT_THRESHOLD_MS", "1000"))
+        # Only every Nth slow endpoint/query event is sent to Sentry
+        self.slow_event_sample_every = max(1, int(os.getenv("SLOW_EVENT_SENTRY_SAMPLE", "10")))
+        self._slow_event_count = 0
         
-        # Metrics storage
-        self.endpoint_metrics = defaultdict(list)
-        self.query_metrics = defaultdict(list)
-        self.custom_metrics = defaultdict(list)
+        # Samples retained per metric key; older samples are evicted
+        self.max_samples = max(1, int(os.getenv("METRIC_BUFFER_SIZE", "10000")))
+        # Series are trimmed in batches once they grow a quarter past the limit
+        self._trim_at = self.max_samples + max(1, self.max_samples // 4)
+        
+        # Metrics storage (endpoint and query samples are kept as columns)
+        self.endpoint_metrics: Dict[str, _EndpointSeries] = defaultdict(_EndpointSeries)
+        self.query_metrics: Dict[str, _QuerySeries] = defaultdict(_QuerySeries)
+        self.custom_metrics: Dict[str, deque] = defaultdict(
+            lambda: deque(maxlen=self.max_samples)
+        )
         
         # Alert thresholds
         self.alert_thresholds = {
@@ -41,8 +150,22 @@ class PerformanceMonitoringService:
             "memory_usage_percent": 90,
         }
         
+        # Custom metric values waiting to be sent to Sentry in aggregate
+        self._pending_measurements: Dict[str, List[float]] = defaultdict(list)
+        self._measurement_flush_task: Optional[asyncio.Task] = None
+        
+        # Short-lived cache of computed stats: (kind, filter, minutes) -> (computed at, stats)
+        self._stats_cache: Dict[Tuple[str, Optional[str], int], Tuple[float, Dict[str, Any]]] = {}
+        self.stats_cache_ttl = float(os.getenv("METRIC_STATS_CACHE_TTL", "5"))
+        
         logger.info(f"Performance monitoring initialized (enabled: {self.enabled})")
     
+    def _sample_slow_event(self) -> bool:
+        """Decide whether a slow event is reported to Sentry (first of every N)"""
+        report = self._slow_event_count % self.slow_event_sample_every == 0
+        self._slow_event_count += 1
+        return report
+    
     def track_endpoint(
         self,
         method: str,
@@ -63,25 +186,28 @@ class PerformanceMonitoringService:
         """
         endpoint_key = f"{method} {path}"
         
-        self.endpoint_metrics[endpoint_key].append({
-            "duration_ms": duration_ms,
-            "status_code": status_code,
-            "timestamp": datetime.utcnow(),
-            "user_id": user_id
-        })
+        series = self.endpoint_metrics[endpoint_key]
+        series.durations.append(duration_ms)
+        series.status_codes.append(status_code)
+        series.timestamps.append(time.monotonic())
+        series.user_ids.append(user_id)
+        series.histogram[_histogram_bucket(duration_ms)] += 1
+        if len(series) >= self._trim_at:
+            series.trim(self.max_samples)
         
         # Check for slow endpoints
         if duration_ms > self.slow_endpoint_threshold:
-            logger.warning(
-                f"Slow endpoint detected: {endpoint_key} took {duration_ms}ms",
-                extra={
-                    "endpoint": endpoint_key,
-                    "duration_ms": duration_ms,
-                    "status_code": status_code
-                }
-            )
+            if logger.isEnabledFor(logging.WARNING):
+                logger.warning(
+                    "Slow endpoint detected: %s took %sms", endpoint_key, duration_ms,
+                    extra={
+                        "endpoint": endpoint_key,
+                        "duration_ms": duration_ms,
+                        "status_code": status_code
+                    }
+                )
             
-            if SENTRY_AVAILABLE and self.enabled:
+            if SENTRY_AVAILABLE and self.enabled and self._sample_slow_event():
                 sentry_sdk.capture_message(
                     f"Slow endpoint: {endpoint_key}",
                     level="warning",
@@ -91,9 +217,10 @@ class PerformanceMonitoringService:
                     }
                 )
         
-        # Send to Sentry if available
+        # Annotate the request's transaction (opened by the Sentry ASGI integration)
         if SENTRY_AVAILABLE and self.enabled:
-            with sentry_sdk.start_transaction(op="http.server", name=endpoint_key) as transaction:
+            transaction = sentry_sdk.get_current_scope().transaction
+            if transaction is not None:
                 transaction.set_measurement("duration", duration_ms, "millisecond")
                 transaction.set_tag("status_code", status_code)
                 if user_id:
@@ -117,31 +244,35 @@ class PerformanceMonitoringService:
         """
         query_key = f"{collection}.{operation}"
         
-        self.query_metrics[query_key].append({
-            "duration_ms": duration_ms,
-            "timestamp": datetime.utcnow(),
-            "query": str(query) if query else None
-        })
+        query_text = str(query) if query else None
+        
+        series = self.query_metrics[query_key]
+        series.durations.append(duration_ms)
+        series.timestamps.append(time.monotonic())
+        series.queries.append(query_text)
+        if len(series) >= self._trim_at:
+            series.trim(self.max_samples)
         
         # Check for slow queries
         if duration_ms > self.slow_query_threshold:
-            logger.warning(
-                f"Slow query detected: {query_key} took {duration_ms}ms",
-                extra={
-                    "query": query_key,
-                    "duration_ms": duration_ms,
-                    "query_details": str(query)[:200] if query else None
-                }
-            )
+            if logger.isEnabledFor(logging.WARNING):
+                logger.warning(
+                    "Slow query detected: %s took %sms", query_key, duration_ms,
+                    extra={
+                        "query": query_key,
+                        "duration_ms": duration_ms,
+                        "query_details": query_text[:200] if query_text else None
+                    }
+                )
             
-            if SENTRY_AVAILABLE and self.enabled:
+            if SENTRY_AVAILABLE and self.enabled and self._sample_slow_event():
                 sentry_sdk.capture_message(
                     f"Slow database query: {query_key}",
                     level="warning",
                     extras={
                         "duration_ms": duration_ms,
                         "threshold_ms": self.slow_query_threshold,
-                        "query": str(query)[:500] if query else None
+                        "query": query_text[:500] if query_text else None
                     }
                 )
     
@@ -161,13 +292,59 @@ class PerformanceMonitoringService:
         """
         self.custom_metrics[metric_name].append({
             "value": value,
-            "timestamp": datetime.utcnow(),
+            "timestamp": time.monotonic(),
             "tags": tags or {}
         })
         
-        # Send to Sentry if available
+        # Sent to Sentry in aggregate by the background flusher
         if SENTRY_AVAILABLE and self.enabled:
-            sentry_sdk.set_measurement(metric_name, value)
+            self._pending_measurements[metric_name].append(value)
+            self._schedule_measurement_flush()
+    
+    def _schedule_measurement_flush(self) -> None:
+        """Start the background flusher if it is not already running"""
+        if self._measurement_flush_task is None or self._measurement_flush_task.done():
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                # No running event loop (sync caller); send right away
+                self.flush_measurements()
+                return
+            self._measurement_flush_task = loop.create_task(self._flush_measurements_loop())
+    
+    async def _flush_measurements_loop(self) -> None:
+        """Flush buffered custom metric values until no more arrive"""
+        while self._pending_measurements:
+            await asyncio.sleep(self.MEASUREMENT_FLUSH_INTERVAL)
+            self.flush_measurements()
+    
+    def flush_measurements(self) -> int:
+        """
+        Send buffered custom metric values to Sentry as count/avg/min/max
+        
+        The aggregates are sent as Sentry metrics (gauges), not as
+        measurements: the flush runs outside any request, so there is no
+        transaction they belong to.
+        
+        Returns:
+            Number of metrics flushed
+        """
+        pending, self._pending_measurements = self._pending_measurements, defaultdict(list)
+        
+        for metric_name, values in pending.items():
+            sentry_sdk.metrics.gauge(f"{metric_name}.count", len(values))
+            sentry_sdk.metrics.gauge(f"{metric_name}.avg", sum(values) / len(values))
+            sentry_sdk.metrics.gauge(f"{metric_name}.min", min(values))
+            sentry_sdk.metrics.gauge(f"{metric_name}.max", max(values))
+        
+        return len(pending)
+    
+    def _cache_stats(self, cache_key: Tuple[str, Optional[str], int], stats: Dict[str, Any]):
+        """Remember computed stats for stats_cache_ttl seconds"""
+        if len(self._stats_cache) >= 256:
+            # Filters come from request parameters; don't let stale keys pile up
+            self._stats_cache.clear()
+        self._stats_cache[cache_key] = (time.monotonic(), stats)
     
     def get_endpoint_stats(
         self,
@@ -184,38 +361,82 @@ class PerformanceMonitoringService:
         Returns:
             Dictionary with performance statistics
         """
-        cutoff_time = datetime.utcnow() - timedelta(minutes=minutes)
+        cache_key = ("endpoint", endpoint, minutes)
+        cached = self._stats_cache.get(cache_key)
+        if cached and time.monotonic() - cached[0] < self.stats_cache_ttl:
+            return cached[1]
+        
+        cutoff_time = time.monotonic() - minutes * 60
         stats = {}
         
         endpoints = [endpoint] if endpoint else self.endpoint_metrics.keys()
         
         for ep in endpoints:
-            metrics = self.endpoint_metrics.get(ep, [])
+            series = self.endpoint_metrics.get(ep)
+            if not series:
+                continue
             
-            # Filter by time window
-            recent_metrics = [
-                m for m in metrics
-                if m["timestamp"] > cutoff_time
-            ]
+            # Samples are appended in time order, so the window is a suffix
+            start = bisect_right(series.timestamps, cutoff_time)
+            durations = np.frombuffer(series.durations, dtype=np.float64)[start:]
+            count = len(durations)
             
-            if not recent_metrics:
+            if not count:
                 continue
             
-            durations = [m["duration_ms"] for m in recent_metrics]
-            durations.sort()
+            p50, p95, p99 = _select_percentiles(durations, [0.5, 0.95, 0.99])
             
-            error_count = sum(1 for m in recent_metrics if m["status_code"] >= 400)
+            status_codes = np.frombuffer(series.status_codes, dtype=np.uint16)[start:]
+            error_count = int(np.count_nonzero(status_codes >= 400))
             
             stats[ep] = {
-                "count": len(recent_metrics),
-                "avg_duration_ms": sum(durations) / len(durations),
-                "p50_duration_ms": durations[len(durations) // 2],
-                "p95_duration_ms": durations[int(len(durations) * 0.95)],
-                "p99_duration_ms": durations[int(len(durations) * 0.99)],
-                "min_duration_ms": min(durations),
-                "max_duration_ms": max(durations),
+                "count": count,
+                "avg_duration_ms": float(durations.mean()),
+                "p50_duration_ms": p50,
+                "p95_duration_ms": p95,
+                "p99_duration_ms": p99,
+                "min_duration_ms": float(durations.min()),
+                "max_duration_ms": float(durations.max()),
                 "error_count": error_count,
-                "error_rate": error_count / len(recent_metrics) if recent_metrics else 0
+                "error_rate": error_count / count
+            }
+        
+        self._cache_stats(cache_key, stats)
+        return stats
+    
+    def get_latency_histogram_stats(self, endpoint: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get approximate endpoint latency percentiles since the last reset
+        
+        Unlike get_endpoint_stats, this covers every request, not just the
+        retained samples, and costs O(buckets) regardless of traffic.
+        
+        Args:
+            endpoint: Optional specific endpoint
+        
+        Returns:
+            Dictionary with request count and approximate percentiles
+        """
+        stats = {}
+        
+        endpoints = [endpoint] if endpoint else self.endpoint_metrics.keys()
+        
+        for ep in endpoints:
+            series = self.endpoint_metrics.get(ep)
+            if series is None:
+                continue
+            
+            total = int(series.histogram.sum())
+            if not total:
+                continue
+            
+            p50, p95, p99 = _histogram_percentiles(series.histogram, [0.5, 0.95, 0.99])
+            
+            stats[ep] = {
+                "count": total,
+                "p50_duration_ms": p50,
+                "p95_duration_ms": p95,
+                "p99_duration_ms": p99
             }
         
         return stats
@@ -235,7 +456,12 @@ class PerformanceMonitoringService:
         Returns:
             Dictionary with query statistics
         """
-        cutoff_time = datetime.utcnow() - timedelta(minutes=minutes)
+        cache_key = ("query", collection, minutes)
+        cached = self._stats_cache.get(cache_key)
+        if cached and time.monotonic() - cached[0] < self.stats_cache_ttl:
+            return cached[1]
+        
+        cutoff_time = time.monotonic() - minutes * 60
         stats = {}
         
         queries = self.query_metrics.keys()
@@ -243,28 +469,29 @@ class PerformanceMonitoringService:
             queries = [q for q in queries if q.startswith(f"{collection}.")]
         
         for query in queries:
-            metrics = self.query_metrics.get(query, [])
+            series = self.query_metrics.get(query)
+            if not series:
+                continue
             
-            # Filter by time window
-            recent_metrics = [
-                m for m in metrics
-                if m["timestamp"] > cutoff_time
-            ]
+            # Samples are appended in time order, so the window is a suffix
+            start = bisect_right(series.timestamps, cutoff_time)
+            durations = np.frombuffer(series.durations, dtype=np.float64)[start:]
+            count = len(durations)
             
-            if not recent_metrics:
+            if not count:
                 continue
             
-            durations = [m["duration_ms"] for m in recent_metrics]
-            durations.sort()
+            p95, = _select_percentiles(durations, [0.95])
             
             stats[query] = {
-                "count": len(recent_metrics),
-                "avg_duration_ms": sum(durations) / len(durations),
-                "p95_duration_ms": durations[int(len(durations) * 0.95)],
-                "max_duration_ms": max(durations),
-                "slow_query_count": sum(1 for d in durations if d > self.slow_query_threshold)
+                "count": count,
+                "avg_duration_ms": float(durations.mean()),
+                "p95_duration_ms": p95,
+                "max_duration_ms": float(durations.max()),
+                "slow_query_count": int(np.count_nonzero(durations > self.slow_query_threshold))
             }
         
+        self._cache_stats(cache_key, stats)
         return stats
     
     def check_alerts(self) -> List[Dict[str, Any]]:
@@ -314,6 +541,8 @@ class PerformanceMonitoringService:
         self.endpoint_metrics.clear()
         self.query_metrics.clear()
         self.custom_metrics.clear()
+        self._pending_measurements.clear()
+        self._stats_cache.clear()
         logger.info("Performance metrics reset")
 
 
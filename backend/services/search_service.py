@@ -9,27 +9,130 @@ Provides advanced search capabilities:
 - Saved searches
 """
 
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+import os
+import time
 import uuid
 import re
 
+from pymongo.errors import OperationFailure
+
+
+# The single notes text index (MongoDB allows one per collection), used by
+# $text queries here and in NoteService.search_notes
+NOTES_TEXT_INDEX = "notes_text_index"
+NOTES_TEXT_INDEX_KEYS = [("title", "text"), ("subject", "text"), ("department", "text")]
+
+# Fuzzy search matches notes sharing at least this fraction of the query's trigrams
+FUZZY_MIN_OVERLAP = 0.5
+
+# Fields left out of search results: Mongo's _id, the fuzzy-search lookup
+# field and moderation state (matches NoteService.LIST_PROJECTION)
+RESULT_PROJECTION = {
+    "_id": 0,
+    "search_ngrams": 0,
+    "flag_reason": 0,
+    "reviewed_at": 0,
+    "is_flagged": 0,
+    "is_approved": 0,
+}
+
+# Case-insensitive collation shared by autocomplete queries and their indexes
+AUTOCOMPLETE_COLLATION = {"locale": "en", "strength": 2}
+
+# Search history entries kept per user; older entries also expire after
+# 30 days via the TTL index on search_history.timestamp
+MAX_HISTORY_PER_USER = 50
+# The per-user cap is enforced on every Nth save rather than on each one
+HISTORY_TRIM_EVERY = 20
+
+# In-process cache for autocomplete and popular searches (not user-specific)
+RESULT_CACHE_SIZE = 1024
+RESULT_CACHE_TTL = 30  # seconds
+
+
+def _trigrams(text: str) -> set:
+    """Lowercase, whitespace-normalized character trigrams of text"""
+    text = " ".join(text.lower().split())
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def build_search_ngrams(*texts: Optional[str]) -> List[str]:
+    """
+    Build the indexed ``search_ngrams`` field for a note
+    
+    Store the result on the note document (from its title and subject)
+    so fuzzy_search can find it through the multikey index.
+    """
+    ngrams = set()
+    for text in texts:
+        if text:
+            ngrams |= _trigrams(text)
+    return sorted(ngrams)
+
+
+def file_extension(filename: Optional[str]) -> str:
+    """
+    Lowercase extension without the dot ("Notes.PDF" -> "pdf")
+    
+    Stored on notes as ``file_extension`` so file type filters are an
+    indexed equality match.
+    """
+    return os.path.splitext(filename or "")[1].lstrip(".").lower()
+
 
 class SearchService:
     """Service for advanced search functionality"""
     
     def __init__(self, database):
         self.db = database
+        self._history_saves = 0
+        # LRU of key -> (monotonic expiry, result)
+        self._result_cache: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+    
+    def _cache_get(self, key: Tuple) -> Optional[Any]:
+        """Return a fresh cached result, or None"""
+        entry = self._result_cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._result_cache[key]
+            return None
+        self._result_cache.move_to_end(key)
+        return entry[1]
+    
+    def _cache_put(self, key: Tuple, result: Any):
+        """Cache a result for RESULT_CACHE_TTL seconds, evicting the least recently used"""
+        self._result_cache[key] = (time.monotonic() + RESULT_CACHE_TTL, result)
+        self._result_cache.move_to_end(key)
+        if len(self._result_cache) > RESULT_CACHE_SIZE:
+            self._result_cache.popitem(last=False)
     
     async def ensure_text_indexes(self):
-        """Create text indexes for full-text search"""
+        """
+        Create the notes text index for full-text search
+        
+        This is the only place the notes text index is declared; both
+        SearchService and NoteService $text queries rely on it. MongoDB
+        allows one text index per collection, so a text index left over
+        under another name is replaced.
+        """
         try:
-            # Create text index on notes
-            await self.db.notes.create_index([
-                ("title", "text"),
-                ("subject", "text"),
-                ("department", "text")
-            ], name="notes_text_index")
+            try:
+                await self.db.notes.create_index(NOTES_TEXT_INDEX_KEYS, name=NOTES_TEXT_INDEX)
+            except OperationFailure:
+                indexes = await self.db.notes.index_information()
+                stale = [
+                    name for name, info in indexes.items()
+                    if name != NOTES_TEXT_INDEX and any(kind == "text" for _, kind in info["key"])
+                ]
+                if not stale:
+                    raise
+                for name in stale:
+                    await self.db.notes.drop_index(name)
+                await self.db.notes.create_index(NOTES_TEXT_INDEX_KEYS, name=NOTES_TEXT_INDEX)
             
             print("Text indexes created successfully")
         except Exception as e:
@@ -73,8 +176,7 @@ class SearchService:
         if year:
             search_query["year"] = year
         if file_type:
-            # Extract file extension from filename
-            search_query["original_filename"] = {"$regex": f"\\.{file_type}$", "$options": "i"}
+            search_query["file_extension"] = file_type.lstrip(".").lower()
         if date_from or date_to:
             date_filter = {}
             if date_from:
@@ -84,9 +186,9 @@ class SearchService:
             search_query["uploaded_at"] = date_filter
         
         # Build projection to include text score for relevance sorting
-        projection = None
+        projection = RESULT_PROJECTION
         if query and sort_by == "relevance":
-            projection = {"score": {"$meta": "textScore"}}
+            projection = {**RESULT_PROJECTION, "score": {"$meta": "textScore"}}
         
         # Execute search
         cursor = self.db.notes.find(search_query, projection)
@@ -108,39 +210,54 @@ class SearchService:
         
         # Serialize documents
         for note in notes:
-            if "_id" in note:
-                if "id" not in note:
-                    note["id"] = str(uuid.uuid4())
-                del note["_id"]
+            if "id" not in note:
+                note["id"] = str(uuid.uuid4())
             # Remove text score from results
-            if "score" in note:
-                del note["score"]
+            note.pop("score", None)
         
         return notes
     
     async def fuzzy_search(self, query: str, limit: int = 10) -> List[Dict]:
-        """Fuzzy search with typo tolerance"""
-        
-        # Create regex pattern for fuzzy matching
-        # Allow 1 character difference per 3 characters
-        fuzzy_pattern = ".*".join(query)
-        
-        search_query = {
-            "is_approved": True,
-            "$or": [
-                {"title": {"$regex": fuzzy_pattern, "$options": "i"}},
-                {"subject": {"$regex": fuzzy_pattern, "$options": "i"}}
+        """
+        Fuzzy search with typo tolerance
+        
+        Notes match when their title/subject share at least
+        FUZZY_MIN_OVERLAP of the query's trigrams, ranked by overlap. The
+        lookup uses the search_ngrams index; queries too short to have a
+        trigram fall back to a subsequence regex.
+        """
+        query_ngrams = sorted(_trigrams(query))
+        
+        if query_ngrams:
+            min_shared = max(1, int(len(query_ngrams) * FUZZY_MIN_OVERLAP + 0.5))
+            pipeline = [
+                {"$match": {"search_ngrams": {"$in": query_ngrams}, "is_approved": True}},
+                {"$addFields": {
+                    "_shared": {"$size": {"$setIntersection": ["$search_ngrams", query_ngrams]}}
+                }},
+                {"$match": {"_shared": {"$gte": min_shared}}},
+                {"$sort": {"_shared": -1}},
+                {"$limit": limit},
+                {"$project": {**RESULT_PROJECTION, "_shared": 0}}
             ]
-        }
-        
-        notes = await self.db.notes.find(search_query).limit(limit).to_list(length=limit)
+            notes = await self.db.notes.aggregate(pipeline).to_list(length=limit)
+        else:
+            fuzzy_pattern = ".*".join(re.escape(char) for char in query)
+            search_query = {
+                "is_approved": True,
+                "$or": [
+                    {"title": {"$regex": fuzzy_pattern, "$options": "i"}},
+                    {"subject": {"$regex": fuzzy_pattern, "$options": "i"}}
+                ]
+            }
+            notes = await self.db.notes.find(
+                search_query, RESULT_PROJECTION
+            ).limit(limit).to_list(length=limit)
         
         # Serialize
         for note in notes:
-            if "_id" in note:
-                if "id" not in note:
-                    note["id"] = str(uuid.uuid4())
-                del note["_id"]
+            if "id" not in note:
+                note["id"] = str(uuid.uuid4())
         
         return notes
     
@@ -155,42 +272,73 @@ class SearchService:
         if len(query) < 2:
             return []
         
-        # Create case-insensitive regex
-        regex_pattern = f"^{re.escape(query)}"
+        cache_key = ("autocomplete", query, field, limit)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
         
-        # Get distinct values matching the pattern
-        pipeline = [
-            {
-                "$match": {
-                    field: {"$regex": regex_pattern, "$options": "i"},
-                    "is_approved": True
-                }
-            },
-            {"$group": {"_id": f"${field}"}},
-            {"$limit": limit}
-        ]
+        # Prefix as a range: under the case-insensitive collation this is an
+        # index seek, whereas a regex with the "i" option scans every key.
+        # U+FFFF sorts after every other character in the collation.
+        prefix = {"$gte": query, "$lt": query + "\uffff"}
         
-        results = await self.db.notes.aggregate(pipeline).to_list(length=limit)
-        suggestions = [r["_id"] for r in results if r["_id"]]
-        
-        # Also include subject and department suggestions
         if field == "title":
-            # Get subject suggestions
-            subject_pipeline = [
+            # Title and subject suggestions in one round trip
+            pipeline = [
                 {
                     "$match": {
-                        "subject": {"$regex": regex_pattern, "$options": "i"},
+                        "is_approved": True,
+                        "$or": [{"title": prefix}, {"subject": prefix}]
+                    }
+                },
+                {
+                    "$facet": {
+                        "titles": [
+                            {"$match": {"title": prefix}},
+                            {"$group": {"_id": "$title"}},
+                            {"$limit": limit}
+                        ],
+                        "subjects": [
+                            {"$match": {"subject": prefix}},
+                            {"$group": {"_id": "$subject"}},
+                            {"$limit": 5}
+                        ]
+                    }
+                }
+            ]
+            facets = await self.db.notes.aggregate(
+                pipeline, collation=AUTOCOMPLETE_COLLATION
+            ).to_list(length=1)
+            results = facets[0]["titles"] + facets[0]["subjects"] if facets else []
+        else:
+            # Get distinct values matching the pattern
+            pipeline = [
+                {
+                    "$match": {
+                        field: prefix,
                         "is_approved": True
                     }
                 },
-                {"$group": {"_id": "$subject"}},
-                {"$limit": 5}
+                {"$group": {"_id": f"${field}"}},
+                {"$limit": limit}
             ]
-            subject_results = await self.db.notes.aggregate(subject_pipeline).to_list(length=5)
-            suggestions.extend([r["_id"] for r in subject_results if r["_id"]])
+            results = await self.db.notes.aggregate(
+                pipeline, collation=AUTOCOMPLETE_COLLATION
+            ).to_list(length=limit)
         
         # Remove duplicates and limit
-        return list(dict.fromkeys(suggestions))[:limit]
+        seen = set()
+        suggestions = []
+        for r in results:
+            value = r["_id"]
+            if value and value not in seen:
+                seen.add(value)
+                suggestions.append(value)
+                if len(suggestions) == limit:
+                    break
+        
+        self._cache_put(cache_key, suggestions)
+        return suggestions
     
     async def save_search_history(
         self,
@@ -208,21 +356,33 @@ class SearchService:
             "timestamp": datetime.utcnow()
         }
         
-        # Check if this exact search already exists in recent history
-        existing = await self.db.search_history.find_one({
-            "user_id": user_id,
-            "query": query,
-            "timestamp": {"$gte": datetime.utcnow() - timedelta(hours=24)}
-        })
+        # Insert unless this exact search is already in the last 24 hours of
+        # history; one upsert instead of a find_one followed by insert_one
+        result = await self.db.search_history.update_one(
+            {
+                "user_id": user_id,
+                "query": query,
+                "timestamp": {"$gte": datetime.utcnow() - timedelta(hours=24)}
+            },
+            {"$setOnInsert": search_entry},
+            upsert=True
+        )
         
-        if not existing:
-            await self.db.search_history.insert_one(search_entry)
+        if result.upserted_id is None:
+            return
         
-        # Cleanup old history (keep last 50 searches per user)
+        # Cap the user's history now and then; the TTL index expires the rest
+        self._history_saves += 1
+        if self._history_saves % HISTORY_TRIM_EVERY == 0:
+            await self._trim_search_history(user_id)
+    
+    async def _trim_search_history(self, user_id: str):
+        """Delete a user's history beyond the newest MAX_HISTORY_PER_USER entries"""
         pipeline = [
             {"$match": {"user_id": user_id}},
             {"$sort": {"timestamp": -1}},
-            {"$skip": 50}
+            {"$skip": MAX_HISTORY_PER_USER},
+            {"$project": {"_id": 1}}
         ]
         
         old_searches = await self.db.search_history.aggregate(pipeline).to_list(length=None)
@@ -303,6 +463,11 @@ class SearchService:
     async def get_popular_searches(self, limit: int = 10) -> List[Dict]:
         """Get most popular search queries"""
         
+        cache_key = ("popular", limit)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+        
         pipeline = [
             {"$group": {
                 "_id": "$query",
@@ -315,7 +480,7 @@ class SearchService:
         
         popular = await self.db.search_history.aggregate(pipeline).to_list(length=limit)
         
-        return [
+        result = [
             {
                 "query": p["_id"],
                 "count": p["count"],
@@ -323,6 +488,8 @@ class SearchService:
             }
             for p in popular
         ]
+        self._cache_put(cache_key, result)
+        return result
 
 
 search_service: Optional[SearchService] = None
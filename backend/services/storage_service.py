@@ -2,12 +2,32 @@
 Cloud Storage Service using Supabase Storage
 Handles file uploads with security and validation
 """
-from typing import Optional, Dict, BinaryIO
+from typing import Optional, Dict, BinaryIO, List, Tuple, Union, AsyncIterator
+import asyncio
 import os
+import re
 import secrets
+import shutil
+import tempfile
 from pathlib import Path
 import mimetypes
 
+import aiofiles
+import filetype
+
+# Load the system mime database now rather than on the first upload
+mimetypes.init()
+
+
+_ALLOWED_NOTE_EXTS = frozenset({'.pdf', '.doc', '.docx', '.ppt', '.pptx', '.txt', '.md'})
+_ALLOWED_IMAGE_EXTS = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.webp'})
+
+
+def _extension(filename: str) -> str:
+    """Lowercased extension including the dot ('' if there is none)"""
+    dot = filename.rfind('.')
+    return filename[dot:].lower() if dot != -1 else ''
+
 
 class StorageService:
     """
@@ -15,10 +35,34 @@ class StorageService:
     Falls back to local storage if Supabase is not configured
     """
     
-    ALLOWED_EXTENSIONS = {'.pdf', '.doc', '.docx', '.ppt', '.pptx', '.txt', '.md'}
-    ALLOWED_IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
+    ALLOWED_EXTENSIONS = _ALLOWED_NOTE_EXTS
+    ALLOWED_IMAGE_EXTENSIONS = _ALLOWED_IMAGE_EXTS
+    # Path separators or parent-directory references in a filename
+    _BAD_PATH_RE = re.compile(r'[\\/]|\.\.')
+    # Types content sniffing may report for each extension; None means the
+    # format has no reliable signature (plain text, legacy OLE documents)
+    _SNIFFED_MIMES = {
+        '.pdf': frozenset({'application/pdf'}),
+        '.doc': frozenset({'application/msword', None}),
+        '.docx': frozenset({'application/vnd.openxmlformats-officedocument.wordprocessingml.document'}),
+        '.ppt': frozenset({'application/vnd.ms-powerpoint', None}),
+        '.pptx': frozenset({'application/vnd.openxmlformats-officedocument.presentationml.presentation'}),
+        '.txt': frozenset({None}),
+        '.md': frozenset({None}),
+        '.jpg': frozenset({'image/jpeg'}),
+        '.jpeg': frozenset({'image/jpeg'}),
+        '.png': frozenset({'image/png'}),
+        '.gif': frozenset({'image/gif'}),
+        '.webp': frozenset({'image/webp'}),
+    }
+    # OOXML detection looks past the zip header, so sniff more than 512 bytes
+    _SNIFF_BYTES = 8192
+    # Extension -> guessed mime type (None when unknown), filled lazily
+    _MIME_CACHE: Dict[str, Optional[str]] = {}
     MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
     MAX_IMAGE_SIZE = 5 * 1024 * 1024  # 5MB
+    # (bucket_name, public) pairs created at startup by ensure_buckets
+    BUCKETS = (("notes", False), ("profile-pictures", True))
     
     def __init__(self):
         self.supabase_url = os.getenv("SUPABASE_URL")
@@ -45,11 +89,21 @@ class StorageService:
             print(f"⚠ Supabase initialization failed: {e}, using local storage")
             self.storage_enabled = False
     
+    async def ensure_buckets(self):
+        """Create the storage buckets (run once at application startup)"""
+        if not (self.storage_enabled and self.client):
+            return
+        for bucket_name, public in self.BUCKETS:
+            try:
+                await asyncio.to_thread(self.client.storage.create_bucket, bucket_name, {"public": public})
+            except Exception:
+                pass  # Bucket likely already exists
+    
     def validate_file(
         self,
         filename: str,
         file_size: int,
-        allowed_extensions: set = None,
+        allowed_extensions: frozenset = None,
         max_size: int = None
     ) -> tuple[bool, Optional[str]]:
         """
@@ -59,13 +113,13 @@ class StorageService:
             (is_valid, error_message)
         """
         if allowed_extensions is None:
-            allowed_extensions = self.ALLOWED_EXTENSIONS
+            allowed_extensions = _ALLOWED_NOTE_EXTS
         
         if max_size is None:
             max_size = self.MAX_FILE_SIZE
         
         # Check extension
-        file_ext = Path(filename).suffix.lower()
+        file_ext = _extension(filename)
         if file_ext not in allowed_extensions:
             return False, f"File type not allowed. Allowed types: {', '.join(allowed_extensions)}"
         
@@ -75,148 +129,319 @@ class StorageService:
             return False, f"File too large. Maximum size: {max_size_mb}MB"
         
         # Check for suspicious patterns in filename
-        if '..' in filename or '/' in filename or '\\' in filename:
+        if self._BAD_PATH_RE.search(filename):
             return False, "Invalid filename"
         
         return True, None
     
+    def _guess_mime(self, filename: str, default: str) -> str:
+        """Guess a file's content type from its extension, cached per extension"""
+        file_ext = _extension(filename)
+        try:
+            mime = self._MIME_CACHE[file_ext]
+        except KeyError:
+            mime = mimetypes.guess_type(f"file{file_ext}")[0]
+            self._MIME_CACHE[file_ext] = mime
+        return mime or default
+    
+    def _sniff_mime(self, header: bytes, filename: str) -> tuple[bool, Optional[str]]:
+        """
+        Detect a file's type from its magic bytes
+        
+        Returns:
+            (matches_extension, sniffed_mime_or_None)
+        """
+        sniffed = filetype.guess_mime(header)
+        return sniffed in self._SNIFFED_MIMES.get(_extension(filename), ()), sniffed
+    
     def generate_unique_filename(self, original_filename: str) -> str:
         """Generate a unique filename"""
-        file_ext = Path(original_filename).suffix.lower()
-        unique_id = secrets.token_urlsafe(16)
-        return f"{unique_id}{file_ext}"
+        return secrets.token_hex(16) + _extension(original_filename)
     
     async def upload_note(
         self,
-        file_content: bytes,
+        file_content: Union[bytes, AsyncIterator[bytes]],
         original_filename: str,
         user_id: str
     ) -> tuple[bool, Optional[str], Optional[str]]:
         """
         Upload a note file
         
+        Args:
+            file_content: File bytes, or an async iterator of chunks to
+                stream without holding the whole file in memory
+        
         Returns:
             (success, file_path_or_url, error_message)
         """
-        # Validate file
-        is_valid, error = self.validate_file(
+        unique_filename = self.generate_unique_filename(original_filename)
+        return await self._upload(
+            file_content,
             original_filename,
-            len(file_content),
-            self.ALLOWED_EXTENSIONS,
-            self.MAX_FILE_SIZE
+            user_id,
+            unique_filename,
+            _ALLOWED_NOTE_EXTS,
+            self.MAX_FILE_SIZE,
+            bucket_name="notes",
+            local_dir="uploads/notes",
+            content_type=self._guess_mime(original_filename, "application/octet-stream")
         )
+    
+    async def upload_notes_batch(
+        self,
+        files: List[Tuple[bytes, str]],
+        user_id: str,
+        scanner=None,
+        scan_workers: int = 4,
+        upload_workers: int = 4
+    ) -> List[tuple[bool, Optional[str], Optional[str]]]:
+        """
+        Virus-scan and upload several note files
         
-        if not is_valid:
-            return False, None, error
+        Scan workers feed files that passed the scan into a queue drained
+        by upload workers, so one file's upload overlaps the next file's
+        scan. Files that fail validation or the scan never reach storage.
         
-        unique_filename = self.generate_unique_filename(original_filename)
+        Args:
+            files: (file_content, original_filename) pairs
+            user_id: Owner of the uploads
+            scanner: VirusScanner to use (defaults to the global instance)
+            scan_workers: Concurrent scans
+            upload_workers: Cap on uploads in flight
         
-        if self.storage_enabled and self.client:
-            try:
-                # Upload to Supabase Storage
-                bucket_name = "notes"
-                file_path = f"{user_id}/{unique_filename}"
-                
-                # Create bucket if it doesn't exist
-                try:
-                    self.client.storage.create_bucket(bucket_name, {"public": False})
-                except:
-                    pass  # Bucket likely already exists
-                
-                # Upload file
-                result = self.client.storage.from_(bucket_name).upload(
-                    file_path,
-                    file_content,
-                    {"content-type": mimetypes.guess_type(original_filename)[0] or "application/octet-stream"}
-                )
-                
-                # Get public URL (for signed URLs in production)
-                file_url = self.client.storage.from_(bucket_name).get_public_url(file_path)
-                
-                return True, file_url, None
-                
-            except Exception as e:
-                print(f"Supabase upload failed: {e}, falling back to local storage")
-                # Fall back to local storage
+        Returns:
+            One (success, file_path_or_url, error_message) per file, in input order
+        """
+        if scanner is None:
+            from services.virus_scanner import virus_scanner as scanner
+        
+        results: list = [None] * len(files)
+        pending: asyncio.Queue = asyncio.Queue()
+        scanned: asyncio.Queue = asyncio.Queue()
+        for index, (file_content, original_filename) in enumerate(files):
+            pending.put_nowait((index, file_content, original_filename))
+        
+        async def scan_worker():
+            while not pending.empty():
+                index, file_content, original_filename = pending.get_nowait()
+                error = await self._scan_upload(scanner, file_content, original_filename)
+                if error:
+                    results[index] = (False, None, error)
+                else:
+                    await scanned.put((index, file_content, original_filename))
         
-        # Local storage fallback
+        async def upload_worker():
+            while (item := await scanned.get()) is not None:
+                index, file_content, original_filename = item
+                results[index] = await self.upload_note(file_content, original_filename, user_id)
+        
+        uploaders = [asyncio.create_task(upload_worker()) for _ in range(upload_workers)]
         try:
-            local_path = f"uploads/notes/{unique_filename}"
-            os.makedirs("uploads/notes", exist_ok=True)
-            
-            with open(local_path, "wb") as f:
-                f.write(file_content)
-            
-            return True, unique_filename, None
-            
-        except Exception as e:
-            return False, None, f"Upload failed: {str(e)}"
+            await asyncio.gather(*(scan_worker() for _ in range(scan_workers)))
+        finally:
+            for _ in uploaders:
+                scanned.put_nowait(None)
+            await asyncio.gather(*uploaders)
+        
+        return results
+    
+    async def _scan_upload(self, scanner, file_content: bytes, original_filename: str) -> Optional[str]:
+        """
+        Validate and virus-scan an upload before it is stored
+        
+        Returns:
+            Error message, or None if the file is safe to upload
+        """
+        is_valid, error = self.validate_file(original_filename, len(file_content))
+        if not is_valid:
+            return error
+        
+        # The scanner works on paths (and quarantines what it flags)
+        fd, temp_path = tempfile.mkstemp(suffix=Path(original_filename).suffix.lower())
+        os.close(fd)
+        try:
+            async with aiofiles.open(temp_path, "wb") as f:
+                await f.write(file_content)
+            scan_result = await scanner.scan_file(temp_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        
+        if not scan_result.get("safe"):
+            return scan_result.get("message") or scan_result.get("error") or "File failed virus scan"
+        return None
     
     async def upload_profile_picture(
         self,
-        file_content: bytes,
+        file_content: Union[bytes, AsyncIterator[bytes]],
         original_filename: str,
         user_id: str
     ) -> tuple[bool, Optional[str], Optional[str]]:
         """
         Upload a profile picture
         
+        Args:
+            file_content: File bytes, or an async iterator of chunks
+        
         Returns:
             (success, file_path_or_url, error_message)
         """
-        # Validate file
+        unique_filename = f"profile_{secrets.token_urlsafe(16)}{Path(original_filename).suffix}"
+        return await self._upload(
+            file_content,
+            original_filename,
+            user_id,
+            unique_filename,
+            _ALLOWED_IMAGE_EXTS,
+            self.MAX_IMAGE_SIZE,
+            bucket_name="profile-pictures",
+            local_dir="uploads/profile",
+            content_type=self._guess_mime(original_filename, "image/jpeg")
+        )
+    
+    async def _upload(
+        self,
+        file_content: Union[bytes, AsyncIterator[bytes]],
+        original_filename: str,
+        user_id: str,
+        unique_filename: str,
+        allowed_extensions: frozenset,
+        max_size: int,
+        bucket_name: str,
+        local_dir: str,
+        content_type: str
+    ) -> tuple[bool, Optional[str], Optional[str]]:
+        """
+        Validate and store an upload in Supabase, or locally as a fallback
+        
+        Streamed uploads are spooled to a temp file chunk by chunk and the
+        file (not its bytes) is handed to Supabase or moved into place.
+        
+        Returns:
+            (success, file_path_or_url, error_message)
+        """
+        streaming = not isinstance(file_content, (bytes, bytearray))
+        
+        # Validate file (a stream's size is checked while spooling)
         is_valid, error = self.validate_file(
             original_filename,
-            len(file_content),
-            self.ALLOWED_IMAGE_EXTENSIONS,
-            self.MAX_IMAGE_SIZE
+            0 if streaming else len(file_content),
+            allowed_extensions,
+            max_size
         )
         
         if not is_valid:
             return False, None, error
         
-        unique_filename = f"profile_{secrets.token_urlsafe(16)}{Path(original_filename).suffix}"
+        spool_path = None
+        if streaming:
+            spool_path, error = await self._spool_upload(
+                file_content, original_filename, allowed_extensions, max_size
+            )
+            if error:
+                return False, None, error
         
-        if self.storage_enabled and self.client:
-            try:
-                # Upload to Supabase Storage
-                bucket_name = "profile-pictures"
-                file_path = f"{user_id}/{unique_filename}"
-                
-                # Create bucket if it doesn't exist
+        try:
+            # Reject content that is not what the (user-supplied) extension claims
+            if spool_path:
+                async with aiofiles.open(spool_path, "rb") as f:
+                    header = await f.read(self._SNIFF_BYTES)
+            else:
+                header = file_content[:self._SNIFF_BYTES]
+            
+            matches, sniffed = self._sniff_mime(header, original_filename)
+            if not matches:
+                return False, None, "File content does not match its type"
+            content_type = sniffed or content_type
+            
+            if self.storage_enabled and self.client:
                 try:
-                    self.client.storage.create_bucket(bucket_name, {"public": True})
-                except:
-                    pass  # Bucket likely already exists
-                
-                # Upload file
-                result = self.client.storage.from_(bucket_name).upload(
-                    file_path,
-                    file_content,
-                    {"content-type": mimetypes.guess_type(original_filename)[0] or "image/jpeg"}
-                )
+                    # Upload to Supabase Storage
+                    file_path = f"{user_id}/{unique_filename}"
+                    
+                    # Upload file (off the event loop so batch scans keep running)
+                    await asyncio.to_thread(
+                        self._supabase_upload,
+                        bucket_name,
+                        file_path,
+                        spool_path or file_content,
+                        content_type
+                    )
+                    
+                    # Get public URL (for signed URLs in production)
+                    file_url = self.client.storage.from_(bucket_name).get_public_url(file_path)
+                    
+                    return True, file_url, None
+                    
+                except Exception as e:
+                    print(f"Supabase upload failed: {e}, falling back to local storage")
+                    # Fall back to local storage
+            
+            # Local storage fallback
+            try:
+                local_path = f"{local_dir}/{unique_filename}"
+                await asyncio.to_thread(os.makedirs, local_dir, exist_ok=True)
                 
-                # Get public URL
-                file_url = self.client.storage.from_(bucket_name).get_public_url(file_path)
+                if spool_path:
+                    await asyncio.to_thread(shutil.move, spool_path, local_path)
+                else:
+                    async with aiofiles.open(local_path, "wb") as f:
+                        await f.write(file_content)
                 
-                return True, file_url, None
+                return True, unique_filename, None
                 
             except Exception as e:
-                print(f"Supabase upload failed: {e}, falling back to local storage")
-                # Fall back to local storage
+                return False, None, f"Upload failed: {str(e)}"
+        finally:
+            if spool_path and os.path.exists(spool_path):
+                os.remove(spool_path)
+    
+    async def _spool_upload(
+        self,
+        file_stream: AsyncIterator[bytes],
+        original_filename: str,
+        allowed_extensions: frozenset,
+        max_size: int
+    ) -> tuple[Optional[str], Optional[str]]:
+        """
+        Write an upload stream to a temp file
+        
+        Stops reading once the stream passes max_size, so memory use is
+        bounded by the chunk size rather than the file size.
         
-        # Local storage fallback
+        Returns:
+            (temp_path, error_message)
+        """
+        fd, temp_path = tempfile.mkstemp(suffix=Path(original_filename).suffix.lower())
+        os.close(fd)
+        size = 0
         try:
-            local_path = f"uploads/profile/{unique_filename}"
-            os.makedirs("uploads/profile", exist_ok=True)
-            
-            with open(local_path, "wb") as f:
-                f.write(file_content)
-            
-            return True, unique_filename, None
-            
+            async with aiofiles.open(temp_path, "wb") as f:
+                async for chunk in file_stream:
+                    size += len(chunk)
+                    if size > max_size:
+                        break
+                    await f.write(chunk)
         except Exception as e:
-            return False, None, f"Upload failed: {str(e)}"
+            os.remove(temp_path)
+            return None, f"Upload failed: {str(e)}"
+        
+        is_valid, error = self.validate_file(original_filename, size, allowed_extensions, max_size)
+        if not is_valid:
+            os.remove(temp_path)
+            return None, error
+        
+        return temp_path, None
+    
+    def _supabase_upload(self, bucket_name: str, file_path: str, payload, content_type: str):
+        """Upload bytes, or the spooled file at a local path, to a bucket"""
+        bucket = self.client.storage.from_(bucket_name)
+        if isinstance(payload, str):
+            # httpx streams the multipart body from the open file
+            with open(payload, "rb") as f:
+                bucket.upload(file_path, f, {"content-type": content_type})
+        else:
+            bucket.upload(file_path, payload, {"content-type": content_type})
     
     async def delete_file(self, file_path: str, bucket: str = "notes") -> bool:
         """Delete a file from storage"""
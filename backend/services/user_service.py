@@ -3,6 +3,7 @@ User Service
 Business logic for user operations
 """
 
+import asyncio
 from datetime import datetime
 from typing import Optional, Dict, Any
 import uuid
@@ -19,6 +20,8 @@ class UserService:
     async def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new user"""
         user_id = str(uuid.uuid4())
+        # bcrypt is deliberately slow; keep it off the event loop
+        password_hash = await asyncio.to_thread(get_password_hash, user_data["password"])
         
         user_doc = {
             "id": user_id,
@@ -27,7 +30,7 @@ class UserService:
             "department": user_data["department"],
             "college": user_data["college"],
             "year": user_data["year"],
-            "password_hash": get_password_hash(user_data["password"]),
+            "password_hash": password_hash,
             "profile_picture": None,
             "notify_new_notes": True,
             "notify_downloads": False,
@@ -43,17 +46,29 @@ class UserService:
         await self.db.users.insert_one(user_doc)
         return user_doc
     
-    async def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
-        """Get user by ID"""
-        return await self.db.users.find_one({"id": user_id})
+    async def get_user_by_id(
+        self,
+        user_id: str,
+        projection: Optional[Dict[str, int]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Get user by ID, optionally limited to the projected fields"""
+        return await self.db.users.find_one({"id": user_id}, projection)
     
-    async def get_user_by_usn(self, usn: str) -> Optional[Dict[str, Any]]:
-        """Get user by USN"""
-        return await self.db.users.find_one({"usn": usn.upper()})
+    async def get_user_by_usn(
+        self,
+        usn: str,
+        projection: Optional[Dict[str, int]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Get user by USN, optionally limited to the projected fields"""
+        return await self.db.users.find_one({"usn": usn.upper()}, projection)
     
-    async def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
-        """Get user by email"""
-        return await self.db.users.find_one({"email": email})
+    async def get_user_by_email(
+        self,
+        email: str,
+        projection: Optional[Dict[str, int]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Get user by email, optionally limited to the projected fields"""
+        return await self.db.users.find_one({"email": email}, projection)
     
     async def update_user(self, user_id: str, update_data: Dict[str, Any]) -> bool:
         """Update user data"""
@@ -65,38 +80,43 @@ class UserService:
     
     async def update_password(self, user_id: str, new_password: str) -> bool:
         """Update user password"""
-        hashed_password = get_password_hash(new_password)
+        hashed_password = await asyncio.to_thread(get_password_hash, new_password)
         return await self.update_user(user_id, {"password_hash": hashed_password})
     
     async def verify_user_password(self, user: Dict[str, Any], password: str) -> bool:
         """Verify user password"""
-        return verify_password(password, user["password_hash"])
+        return await asyncio.to_thread(verify_password, password, user["password_hash"])
     
     async def get_user_stats(self, user_id: str) -> Dict[str, Any]:
         """Get user statistics"""
-        user = await self.get_user_by_id(user_id)
+        # Upload count and download/view totals in one notes round-trip,
+        # fetched alongside the user
+        pipeline = [
+            {"$match": {"userId": user_id}},
+            {"$facet": {
+                "count": [{"$count": "n"}],
+                "sums": [{"$group": {
+                    "_id": None,
+                    "total_downloads": {"$sum": "$download_count"},
+                    "total_views": {"$sum": "$view_count"}
+                }}]
+            }}
+        ]
+        
+        user, result = await asyncio.gather(
+            self.get_user_by_id(user_id, {"_id": 0, "created_at": 1}),
+            self.db.notes.aggregate(pipeline).to_list(1)
+        )
         if not user:
             return {}
         
-        # Count user's uploads using 'userId' field
-        upload_count = await self.db.notes.count_documents({"userId": user_id})
+        facets = result[0] if result else {}
+        upload_count = facets["count"][0]["n"] if facets.get("count") else 0
+        stats = facets["sums"][0] if facets.get("sums") else {"total_downloads": 0, "total_views": 0}
         
         # Calculate days since joined
         days_since_joined = (datetime.utcnow() - user["created_at"]).days
         
-        # Get total downloads and views for user's notes
-        pipeline = [
-            {"$match": {"userId": user_id}},
-            {"$group": {
-                "_id": None,
-                "total_downloads": {"$sum": "$download_count"},
-                "total_views": {"$sum": "$view_count"}
-            }}
-        ]
-        
-        result = await self.db.notes.aggregate(pipeline).to_list(1)
-        stats = result[0] if result else {"total_downloads": 0, "total_views": 0}
-        
         return {
             "uploadCount": upload_count,
             "downloadCount": stats.get("total_downloads", 0),
@@ -4,18 +4,23 @@ Pytest configuration and fixtures for backend tests
 
 import pytest
 import asyncio
+import functools
+from contextlib import asynccontextmanager
+import os
 from typing import AsyncGenerator
 from httpx import AsyncClient, ASGITransport
 from motor.motor_asyncio import AsyncIOMotorClient
+from passlib.context import CryptContext
 import uuid
 
-# Import app
 import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from server import app
-from database import db
+# The app (server.py, every router) is imported inside the HTTP fixtures, so
+# model/service unit tests that never request them don't pay for it
+from auth import get_password_hash
+from database import Database, db
 
 
 @pytest.fixture(scope="session")
@@ -26,33 +31,112 @@ def event_loop():
     loop.close()
 
 
-@pytest.fixture(scope="function")
-async def test_db():
-    """Create a test database"""
-    # Use a separate test database
-    test_db_name = "noteshub_test"
+# Each pytest-xdist worker gets its own database, so tests running in
+# parallel never see each other's users or notes
+_XDIST_WORKER = os.environ.get("PYTEST_XDIST_WORKER")
+TEST_DB_NAME = f"noteshub_test_{_XDIST_WORKER}" if _XDIST_WORKER else "noteshub_test"
+
+
+@pytest.fixture(scope="session")
+def test_db_name() -> str:
+    """Name of this worker's test database"""
+    return TEST_DB_NAME
+
+
+@pytest.fixture(scope="session")
+async def mongo_client():
+    """Connect to MongoDB once for the whole test session"""
     client = AsyncIOMotorClient("mongodb://localhost:27017")
-    test_database = client[test_db_name]
     
-    yield test_database
+    yield client
     
-    # Cleanup: Drop test database after tests
-    await client.drop_database(test_db_name)
+    # Cleanup: Drop test database after the session
+    await client.drop_database(TEST_DB_NAME)
     client.close()
 
 
+@pytest.fixture(scope="session")
+async def conn_db_readonly(mongo_client):
+    """Test database shared by the whole session, indexes built once"""
+    database = Database()
+    database.client = mongo_client
+    database.db = mongo_client[TEST_DB_NAME]
+    await database.create_indexes()
+    
+    return database.db
+
+
 @pytest.fixture(scope="function")
-async def client(test_db) -> AsyncGenerator[AsyncClient, None]:
-    """Create an async HTTP client for testing"""
-    # Override database to use test database
-    db.db = test_db
+async def conn_db_readwrite(conn_db_readonly):
+    """Test database for a test that writes, emptied afterwards"""
+    yield conn_db_readonly
+    
+    # Cleanup: Empty collections but keep them (and their indexes) for the next test
+    collection_names = await conn_db_readonly.list_collection_names()
+    await asyncio.gather(*(conn_db_readonly[name].delete_many({}) for name in collection_names))
+
+
+@pytest.fixture(scope="function")
+async def test_db(conn_db_readwrite):
+    """Provide the test database, emptied after each test"""
+    return conn_db_readwrite
+
+
+@pytest.fixture(scope="session")
+async def http_client() -> AsyncGenerator[AsyncClient, None]:
+    """One HTTP client over the ASGI app for the whole test session"""
+    from server import app
     
+    # ASGITransport never runs the app's lifespan, so startup hooks stay off
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
         yield ac
+
+
+@asynccontextmanager
+async def _client_on(http_client: AsyncClient, test_database):
+    """Point the app at test_database for one test, then reset per-test state"""
+    # Override database to use test database
+    db.db = test_database
     
-    # Clean up
-    db.db = None
+    try:
+        yield http_client
+    finally:
+        # Clean up per-test state on the shared client and app
+        http_client.cookies.clear()
+        http_client.headers.pop("Authorization", None)
+        from server import app
+        app.dependency_overrides.clear()
+        db.db = None
+
+
+@pytest.fixture(scope="function")
+async def client(http_client, conn_db_readwrite) -> AsyncGenerator[AsyncClient, None]:
+    """Provide the shared HTTP client wired to the test database"""
+    async with _client_on(http_client, conn_db_readwrite) as ac:
+        yield ac
+
+
+@pytest.fixture(scope="function")
+async def readonly_client(http_client, conn_db_readonly) -> AsyncGenerator[AsyncClient, None]:
+    """Shared HTTP client for tests that only read (no per-test DB cleanup)"""
+    async with _client_on(http_client, conn_db_readonly) as ac:
+        yield ac
+
+
+@pytest.fixture(autouse=True)
+def fast_password_hashing(monkeypatch):
+    """Swap bcrypt (deliberately slow) for plaintext hashing in tests"""
+    monkeypatch.setattr("auth.pwd_context", CryptContext(schemes=["plaintext"], deprecated="auto"))
+
+
+TEST_USER_PASSWORD = "TestPassword123!"
+
+
+@functools.cache
+def hashed_test_password() -> str:
+    """Hash of TEST_USER_PASSWORD, computed once per session"""
+    return get_password_hash(TEST_USER_PASSWORD)
 
 
 @pytest.fixture
@@ -61,8 +145,8 @@ async def test_user(client: AsyncClient, test_db):
     user_data = {
         "usn": "1RV21CS001",
         "email": "test@example.com",
-        "password": "TestPassword123!",
-        "confirmPassword": "TestPassword123!",
+        "password": TEST_USER_PASSWORD,
+        "confirmPassword": TEST_USER_PASSWORD,
         "department": "CSE",  # Valid department
         "college": "Test College",
         "year": 3
@@ -73,13 +157,12 @@ async def test_user(client: AsyncClient, test_db):
         return response.json()
     else:
         # Fallback: create user directly in database
-        from auth import hash_password
         user_id = str(uuid.uuid4())
         await test_db.users.insert_one({
             "_id": user_id,
             "usn": user_data["usn"],
             "email": user_data["email"],
-            "password": hash_password(user_data["password"]),
+            "password": hashed_test_password(),
             "department": user_data["department"],
             "college": user_data["college"],
             "year": user_data["year"],
@@ -88,12 +171,43 @@ async def test_user(client: AsyncClient, test_db):
         return {"id": user_id, "usn": user_data["usn"], "email": user_data["email"]}
 
 
+@pytest.fixture
+async def seeded_notes(test_db, test_user):
+    """Insert 20 notes from the test user's class directly, without uploads"""
+    notes = [
+        {
+            "id": str(uuid.uuid4()),
+            "title": f"Seeded Note {i}",
+            "subject": "Mathematics",
+            "department": test_user.get("department", "CSE"),
+            "college": test_user.get("college", "Test College"),
+            "year": test_user.get("year", 3),
+            "usn": test_user["usn"],
+            "userId": test_user["id"],
+            "filename": f"seeded{i}.pdf",
+            "originalFilename": f"seeded{i}.pdf",
+            "file_extension": "pdf",
+            "uploadedAt": f"2025-01-01T00:00:{i:02d}",
+            "viewCount": 0,
+            "downloadCount": 0,
+            "isFlagged": False,
+            "_seed": True
+        }
+        for i in range(20)
+    ]
+    await test_db.notes.insert_many(notes)
+    
+    yield notes
+    
+    await test_db.notes.delete_many({"_seed": True})
+
+
 @pytest.fixture
 async def auth_token(client: AsyncClient, test_user):
     """Get authentication token for test user"""
     login_data = {
         "usn": "1RV21CS001",
-        "password": "TestPassword123!"
+        "password": TEST_USER_PASSWORD
     }
     
     response = await client.post("/api/login", json=login_data)
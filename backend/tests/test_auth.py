@@ -7,9 +7,9 @@ from httpx import AsyncClient
 
 
 @pytest.mark.asyncio
-async def test_health_check(client: AsyncClient):
+async def test_health_check(readonly_client: AsyncClient):
     """Test health check endpoint"""
-    response = await client.get("/api/health")
+    response = await readonly_client.get("/api/health")
     assert response.status_code == 200
     data = response.json()
     assert data["status"] == "ok"
@@ -39,33 +39,19 @@ async def test_register_user(client: AsyncClient):
 
 
 @pytest.mark.asyncio
-async def test_register_invalid_department(client: AsyncClient):
-    """Test registration with invalid department"""
+@pytest.mark.parametrize("overrides", [
+    {"usn": "1RV21CS888", "email": "invalid@example.com", "department": "INVALID"},
+    {"usn": "1RV21CS777", "email": "mismatch@example.com", "confirmPassword": "DifferentPass123!"},
+], ids=["invalid_department", "password_mismatch"])
+async def test_register_validation_errors(client: AsyncClient, overrides):
+    """Test registration rejects invalid departments and mismatched passwords"""
     user_data = {
-        "usn": "1RV21CS888",
-        "email": "invalid@example.com",
         "password": "SecurePass123!",
         "confirmPassword": "SecurePass123!",
-        "department": "INVALID",  # Invalid department
-        "college": "Test College",
-        "year": 2
-    }
-    
-    response = await client.post("/api/register", json=user_data)
-    assert response.status_code == 422  # Validation error
-
-
-@pytest.mark.asyncio
-async def test_register_password_mismatch(client: AsyncClient):
-    """Test registration with password mismatch"""
-    user_data = {
-        "usn": "1RV21CS777",
-        "email": "mismatch@example.com",
-        "password": "SecurePass123!",
-        "confirmPassword": "DifferentPass123!",
         "department": "CSE",
         "college": "Test College",
-        "year": 2
+        "year": 2,
+        **overrides
     }
     
     response = await client.post("/api/register", json=user_data)
@@ -90,27 +76,19 @@ async def test_login_success(client: AsyncClient, test_user):
 
 
 @pytest.mark.asyncio
-async def test_login_invalid_usn(client: AsyncClient):
-    """Test login with non-existent USN"""
-    login_data = {
-        "usn": "1RV21CS000",
-        "password": "SomePassword123!"
-    }
-    
-    response = await client.post("/api/login", json=login_data)
-    assert response.status_code in [401, 404]  # Unauthorized or not found
-
-
-@pytest.mark.asyncio
-async def test_login_wrong_password(client: AsyncClient, test_user):
-    """Test login with wrong password"""
+@pytest.mark.parametrize("usn,password,expected", [
+    ("1RV21CS000", "SomePassword123!", (401, 404)),  # Unauthorized or not found
+    ("1RV21CS001", "WrongPassword123!", (401,)),
+], ids=["invalid_usn", "wrong_password"])
+async def test_login_rejected(client: AsyncClient, test_user, usn, password, expected):
+    """Test login with a non-existent USN or a wrong password"""
     login_data = {
-        "usn": "1RV21CS001",
-        "password": "WrongPassword123!"
+        "usn": usn,
+        "password": password
     }
     
     response = await client.post("/api/login", json=login_data)
-    assert response.status_code == 401  # Unauthorized
+    assert response.status_code in expected
 
 
 @pytest.mark.asyncio
@@ -2,24 +2,36 @@
 Database Connection Tests
 """
 
+import os
+
 import pytest
 from database import Database
 
 
+@pytest.fixture
+def worker_mongo_url(monkeypatch, test_db_name):
+    """Point MONGO_URL at this worker's test database"""
+    mongo_url = os.getenv("MONGO_URL", "mongodb://localhost:27017/noteshub")
+    base, _, path = mongo_url.rpartition("/")
+    query = path.partition("?")[2]
+    monkeypatch.setenv("MONGO_URL", f"{base}/{test_db_name}" + (f"?{query}" if query else ""))
+
+
 @pytest.mark.asyncio
-async def test_database_connection():
+async def test_database_connection(worker_mongo_url, test_db_name):
     """Test database connection"""
     db = Database()
     await db.connect_to_database()
     
     assert db.client is not None
     assert db.db is not None
+    assert db.db.name == test_db_name
     
     await db.close_database_connection()
 
 
 @pytest.mark.asyncio
-async def test_database_indexes_created():
+async def test_database_indexes_created(worker_mongo_url):
     """Test that database indexes are created"""
     db = Database()
     await db.connect_to_database()
@@ -2,8 +2,11 @@
 Quick tests to boost coverage
 """
 
+import asyncio
+
 import pytest
 from httpx import AsyncClient
+from passlib.context import CryptContext
 from auth import get_password_hash, verify_password, create_access_token
 from models import TokenData, UserResponse
 from exceptions import BaseAPIException
@@ -11,12 +14,15 @@ import uuid
 
 
 # Auth utility tests
-def test_password_hashing():
+def test_password_hashing(monkeypatch):
     """Test password hashing and verification"""
+    # conftest swaps in plaintext hashing; check the real bcrypt scheme here
+    monkeypatch.setattr("auth.pwd_context", CryptContext(schemes=["bcrypt"], deprecated="auto"))
     password = "TestPassword123!"
     hashed = get_password_hash(password)
     
     assert hashed != password
+    assert hashed.startswith("$2b$")
     assert verify_password(password, hashed) is True
     assert verify_password("wrong", hashed) is False
 
@@ -67,7 +73,7 @@ def test_base_exception():
 
 # More integration tests
 @pytest.mark.asyncio
-async def test_various_note_queries(client: AsyncClient):
+async def test_various_note_queries(readonly_client: AsyncClient):
     """Test various note query combinations"""
     queries = [
         "/api/notes?skip=0",
@@ -78,40 +84,39 @@ async def test_various_note_queries(client: AsyncClient):
         "/api/notes?department=CSE&year=2",
     ]
     
-    for query in queries:
-        response = await client.get(query)
-        assert response.status_code == 200
+    responses = await asyncio.gather(*(readonly_client.get(query) for query in queries))
+    assert all(response.status_code == 200 for response in responses)
 
 
 @pytest.mark.asyncio
-async def test_http_methods_on_endpoints(client: AsyncClient):
+async def test_http_methods_on_endpoints(readonly_client: AsyncClient):
     """Test different HTTP methods on endpoints"""
     # GET on health
-    response = await client.get("/api/health")
+    response = await readonly_client.get("/api/health")
     assert response.status_code == 200
     
     # OPTIONS (for CORS)
-    response = await client.options("/api/health")
+    response = await readonly_client.options("/api/health")
     assert response.status_code in [200, 405]
 
 
 @pytest.mark.asyncio
-async def test_query_parameter_validation(client: AsyncClient):
+async def test_query_parameter_validation(readonly_client: AsyncClient):
     """Test query parameter validation"""
     # Valid pagination
-    response = await client.get("/api/notes?skip=0&limit=10")
+    response = await readonly_client.get("/api/notes?skip=0&limit=10")
     assert response.status_code == 200
     
     # Invalid pagination values (should handle gracefully)
-    response = await client.get("/api/notes?skip=abc&limit=xyz")
+    response = await readonly_client.get("/api/notes?skip=abc&limit=xyz")
     assert response.status_code in [200, 400, 422]
 
 
 @pytest.mark.asyncio
-async def test_empty_responses(client: AsyncClient):
+async def test_empty_responses(readonly_client: AsyncClient):
     """Test empty response handling"""
     # Get notes with non-existent filter combination
-    response = await client.get("/api/notes?department=NONEXISTENT&year=99")
+    response = await readonly_client.get("/api/notes?department=NONEXISTENT&year=99")
     assert response.status_code == 200
     data = response.json()
     # Should return empty list or empty result
@@ -129,19 +134,19 @@ async def test_content_type_headers(client: AsyncClient):
 
 
 @pytest.mark.asyncio
-async def test_large_pagination_values(client: AsyncClient):
+async def test_large_pagination_values(readonly_client: AsyncClient):
     """Test pagination with large values"""
     # Very large skip
-    response = await client.get("/api/notes?skip=10000&limit=100")
+    response = await readonly_client.get("/api/notes?skip=10000&limit=100")
     assert response.status_code == 200
     
     # Very large limit
-    response = await client.get("/api/notes?skip=0&limit=1000")
+    response = await readonly_client.get("/api/notes?skip=0&limit=1000")
     assert response.status_code == 200
 
 
 @pytest.mark.asyncio
-async def test_multiple_filter_combinations(client: AsyncClient):
+async def test_multiple_filter_combinations(readonly_client: AsyncClient):
     """Test multiple filter combinations"""
     filters = [
         "?department=CSE&year=2&subject=Math",
@@ -149,6 +154,5 @@ async def test_multiple_filter_combinations(client: AsyncClient):
         "?year=1&subject=Physics",
     ]
     
-    for f in filters:
-        response = await client.get(f"/api/notes{f}")
-        assert response.status_code == 200
+    responses = await asyncio.gather(*(readonly_client.get(f"/api/notes{f}") for f in filters))
+    assert all(response.status_code == 200 for response in responses)
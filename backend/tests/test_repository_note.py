@@ -10,7 +10,10 @@ import sys
 from pathlib import Path as PathLib
 sys.path.insert(0, str(PathLib(__file__).parent.parent))
 
-from repositories.note_repository import NoteRepository, get_note_repository
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from repositories.note_repository import NoteRepository, get_note_repository, _oid
 
 
 @pytest.mark.asyncio
@@ -244,3 +247,15 @@ class TestNoteRepository:
         
         assert isinstance(repo, NoteRepository)
         assert repo.db == test_db
+
+
+def test_oid_conversion_is_memoized():
+    """Test note ID conversion returns a cached ObjectId and rejects invalid IDs"""
+    note_id = str(ObjectId())
+    
+    first = _oid(note_id)
+    
+    assert first == ObjectId(note_id)
+    assert _oid(note_id) is first
+    with pytest.raises(InvalidId):
+        _oid("not-an-object-id")
@@ -158,6 +158,47 @@ class TestCacheServiceAdvanced:
         
         if cached:
             assert cached[0]["title"] == "Result 1"
+    
+    async def test_set_raw_and_plain_strings(self):
+        """Test pre-serialized payloads are opt-in and plain strings still round-trip"""
+        from services.cache_service import CacheService
+        
+        cache = CacheService()
+        cache.redis_client = None  # Exercise the in-memory backend
+        
+        assert await cache.set("plain:1", "hello") is True
+        assert await cache.get("plain:1") == "hello"
+        
+        assert await cache.set("raw:1", '{"data": "raw"}', raw=True) is True
+        assert await cache.get("raw:1") == {"data": "raw"}
+        
+        assert await cache.set("raw:2", b'[1, 2]', raw=True) is True
+        assert await cache.get("raw:2") == [1, 2]
+    
+    async def test_set_nx_in_memory(self):
+        """Test write-once semantics on the in-memory backend"""
+        from services.cache_service import CacheService
+        
+        cache = CacheService()
+        cache.redis_client = None
+        
+        assert await cache.set("once:1", {"v": 1}, nx=True) is True
+        assert await cache.set("once:1", {"v": 2}, nx=True) is False
+        assert await cache.get("once:1") == {"v": 1}
+    
+    async def test_set_nx_uses_single_redis_command(self):
+        """Test nx=True issues SET NX EX instead of SETEX"""
+        from services.cache_service import CacheService
+        
+        cache = CacheService()
+        cache.redis_client = AsyncMock()
+        cache.redis_client.set.return_value = None  # Key already existed
+        
+        result = await cache.set("once:2", {"v": 1}, ttl=30, nx=True)
+        
+        assert result is False
+        cache.redis_client.set.assert_awaited_once_with("once:2", '{"v": 1}', ex=30, nx=True)
+        cache.redis_client.setex.assert_not_called()
 
 
 class TestFileServiceAdvanced:
@@ -176,10 +217,11 @@ class TestFileServiceAdvanced:
         # Create mock file
         mock_file = Mock()
         mock_file.filename = "test.pdf"
-        mock_file.read = AsyncMock(return_value=b"test content")
+        mock_file.read = AsyncMock(side_effect=[b"test ", b"content", b""])
         
         unique_name, original_name = await service.save_file(mock_file)
         
         assert original_name == "test.pdf"
         assert unique_name.endswith(".pdf")
         assert service.file_exists(unique_name)
+        assert (upload_dir / unique_name).read_bytes() == b"test content"
@@ -0,0 +1,94 @@
+"""
+Backup Service Unit Tests
+"""
+
+import hashlib
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from services.backup_service import BackupService
+
+
+@pytest.fixture
+def backup_service(tmp_path, monkeypatch):
+    """Create a BackupService writing into a temporary directory"""
+    monkeypatch.setenv("BACKUP_DIR", str(tmp_path))
+    return BackupService()
+
+
+def test_compute_checksum_matches_sha256(backup_service, tmp_path):
+    """Test archive checksum matches hashlib.sha256 over the same bytes"""
+    data = b"noteshub backup" * 10000
+    archive = tmp_path / "backup.tar.gz"
+    archive.write_bytes(data)
+
+    assert backup_service._compute_checksum(archive) == hashlib.sha256(data).hexdigest()
+
+
+def test_checksum_manifest_round_trip(backup_service, tmp_path):
+    """Test checksum is persisted next to the archive and reported by list_backups"""
+    archive = tmp_path / "noteshub_backup_1.tar.gz"
+    archive.write_bytes(b"archive")
+    checksum = backup_service._compute_checksum(archive)
+
+    backup_service._write_checksum(archive, checksum)
+
+    assert (tmp_path / "noteshub_backup_1.tar.gz.sha256").exists()
+    assert backup_service._read_checksum(archive) == checksum
+    backups = backup_service.list_backups()
+    assert len(backups) == 1
+    assert backups[0]["sha256"] == checksum
+
+
+def test_restore_rejects_checksum_mismatch(backup_service, tmp_path):
+    """Test restore refuses a tampered archive before extracting it"""
+    archive = tmp_path / "noteshub_backup_2.tar.gz"
+    archive.write_bytes(b"original")
+    backup_service._write_checksum(archive, backup_service._compute_checksum(archive))
+    archive.write_bytes(b"tampered")
+
+    with patch.object(backup_service, "_extract_tarball") as extract:
+        result = backup_service.restore_backup("noteshub_backup_2")
+
+    assert result == {"success": False, "error": "Backup checksum mismatch"}
+    extract.assert_not_called()
+
+
+def test_upload_to_cloud_sends_checksum(backup_service, tmp_path):
+    """Test S3 upload requests server-side SHA-256 validation"""
+    archive = tmp_path / "noteshub_backup_3.tar.gz"
+    archive.write_bytes(b"archive")
+    backup_service.cloud_enabled = True
+    backup_service.s3_bucket = "backups-bucket"
+    backup_service._transfer_manager = MagicMock()
+
+    assert backup_service._upload_to_cloud(archive, "abc123") is True
+
+    backup_service._transfer_manager.upload.assert_called_once_with(
+        str(archive),
+        "backups-bucket",
+        "backups/noteshub_backup_3.tar.gz",
+        extra_args={"ChecksumAlgorithm": "SHA256", "Metadata": {"sha256": "abc123"}}
+    )
+
+
+def test_transfer_manager_is_shared(backup_service):
+    """Test the S3 client and transfer pool are built once and reused"""
+    boto3 = MagicMock()
+    transfer = MagicMock()
+    botocore_client = MagicMock()
+    with patch.dict(sys.modules, {
+        "boto3": boto3,
+        "boto3.s3": MagicMock(transfer=transfer),
+        "boto3.s3.transfer": transfer,
+        "botocore": MagicMock(client=botocore_client),
+        "botocore.client": botocore_client,
+    }):
+        first = backup_service._get_transfer_manager()
+        second = backup_service._get_transfer_manager()
+
+    assert first is second
+    boto3.client.assert_called_once()
+    transfer.create_transfer_manager.assert_called_once()
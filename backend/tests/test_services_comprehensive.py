@@ -191,7 +191,21 @@ class TestEmailService:
         )
         
         assert result is True
-    
+
+    async def test_mock_email_logged_at_debug(self, caplog):
+        """Test mock sends log the body only when DEBUG is enabled"""
+        service = EmailService()
+        service.provider = "mock"
+
+        with caplog.at_level("INFO", logger="services.email_service"):
+            await service.send_email("test@example.com", "Quiet", "<p>hidden</p>")
+        assert "hidden" not in caplog.text
+
+        with caplog.at_level("DEBUG", logger="services.email_service"):
+            await service.send_email("test@example.com", "Loud", "<p>shown</p>")
+        assert "subject=Loud" in caplog.text
+        assert "<p>shown</p>" in caplog.text
+
     async def test_send_welcome_email(self):
         """Test sending welcome email"""
         service = EmailService()
@@ -234,6 +248,102 @@ class TestEmailService:
         )
         
         assert result is True
+    
+    async def test_email_values_are_html_escaped_once(self):
+        """Test untrusted values are escaped exactly once in rendered HTML"""
+        service = EmailService()
+        service.send_email = AsyncMock(return_value=True)
+        
+        await service.send_password_reset_email(
+            user_email="user@example.com",
+            user_name="<script>alert(1)</script>",
+            reset_link="http://example.com/reset?token=abc&next=/"
+        )
+        
+        html_body = service.send_email.await_args.args[2]
+        assert "<script>" not in html_body
+        assert "&lt;script&gt;" in html_body
+        assert html_body.count("token=abc&amp;next=/") == 2
+        assert "&amp;amp;" not in html_body
+    
+    async def test_send_note_upload_notifications_bulk(self):
+        """Test bulk notifications render once and report per-recipient results"""
+        service = EmailService()
+        service.send_email = AsyncMock(side_effect=[True, Exception("provider down"), True])
+        
+        results = await service.send_note_upload_notifications_bulk(
+            recipient_emails=["a@example.com", "b@example.com", "c@example.com"],
+            uploader_name="John Doe",
+            note_title="CS101 Notes",
+            department="CSE",
+            subject_name="Computer Science"
+        )
+        
+        assert results == [True, False, True]
+        assert service.send_email.await_count == 3
+        bodies = {call.args[2] for call in service.send_email.await_args_list}
+        assert len(bodies) == 1
+    
+    async def test_resend_reuses_http_client(self):
+        """Test Resend sends share one pooled HTTP client"""
+        import httpx
+        
+        requests_seen = []
+        
+        def handler(request):
+            requests_seen.append(request)
+            return httpx.Response(200, json={"id": f"email-{len(requests_seen)}"})
+        
+        service = EmailService()
+        service.provider = "resend"
+        service.enabled = True
+        service._resend_api_key = "re_test"
+        service._client = httpx.AsyncClient(
+            base_url="https://api.resend.com",
+            headers={"Authorization": "Bearer re_test"},
+            transport=httpx.MockTransport(handler)
+        )
+        client = service._get_client()
+        
+        assert await service.send_email("a@example.com", "Hi", "<p>1</p>") is True
+        assert await service.send_email("b@example.com", "Hi", "<p>2</p>") is True
+        
+        assert service._get_client() is client
+        assert [r.url.path for r in requests_seen] == ["/emails", "/emails"]
+        assert requests_seen[0].headers["Authorization"] == "Bearer re_test"
+        
+        await service.aclose()
+        assert service._client is None
+    
+    async def test_enqueue_runs_send_in_background(self):
+        """Test enqueued sends run without being awaited and are drained on close"""
+        service = EmailService()
+        service.send_email = AsyncMock(side_effect=[True, Exception("provider down")])
+        
+        ok = service.enqueue(service.send_welcome_email("new@example.com", "Test User"))
+        failed = service.enqueue(service.send_welcome_email("bad@example.com", "Test User"))
+        assert len(service._pending_sends) == 2
+        
+        await service.aclose()
+        
+        assert ok.result() is True
+        assert isinstance(failed.exception(), Exception)
+        assert not service._pending_sends
+
+    def test_mode_recomputed_on_config_change(self):
+        """Test the precomputed send mode follows provider/enabled changes"""
+        service = EmailService()
+        service.provider = "resend"
+        service.enabled = False
+        assert service._is_mock is True
+
+        service.enabled = True
+        assert service._is_mock is False
+        assert service._is_resend is True
+
+        service.provider = "mock"
+        assert service._is_mock is True
+        assert service._is_resend is False
 
 
 class TestFileService:
@@ -329,9 +439,13 @@ class TestFileService:
         # Create mock file that's too large
         mock_file = Mock()
         mock_file.filename = "large.pdf"
-        mock_file.read = AsyncMock(return_value=b"a" * (15 * 1024 * 1024))  # 15MB
+        chunks = [b"a" * (1024 * 1024)] * 15  # 15MB
+        mock_file.read = AsyncMock(side_effect=chunks + [b""])
         
         with pytest.raises(FileUploadError) as exc_info:
             await service.save_file(mock_file)
         
         assert "too large" in str(exc_info.value).lower()
+        # Reading stops at the limit and the partial file is removed
+        assert mock_file.read.await_count == 11
+        assert list(upload_dir.iterdir()) == []
@@ -0,0 +1,155 @@
+"""
+Feature Flag Service Unit Tests
+"""
+
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from services.feature_flags import (
+    FeatureFlagService,
+    FeatureFlagStatus,
+    _EVAL_PROJECTION,
+    _rollout_bucket,
+)
+
+
+@pytest.fixture
+def flag_service():
+    """Create a FeatureFlagService instance with mocked database"""
+    return FeatureFlagService(MagicMock())
+
+
+@pytest.mark.asyncio
+async def test_is_enabled_caches_flag(flag_service):
+    """Test a fetched flag is served from cache until it expires"""
+    flag_service.db.feature_flags.find_one = AsyncMock(return_value={
+        "name": "new_ui",
+        "status": FeatureFlagStatus.ENABLED
+    })
+
+    assert await flag_service.is_enabled("new_ui") is True
+    assert await flag_service.is_enabled("new_ui") is True
+    assert flag_service.db.feature_flags.find_one.await_count == 1
+    flag_service.db.feature_flags.find_one.assert_awaited_with(
+        {"name": "new_ui"}, projection=_EVAL_PROJECTION
+    )
+
+    # Force expiry
+    flag, _ = flag_service.cache["new_ui"]
+    flag_service.cache["new_ui"] = (flag, 0.0)
+
+    assert await flag_service.is_enabled("new_ui") is True
+    assert flag_service.db.feature_flags.find_one.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_is_enabled_returns_default_without_database():
+    """Test the default is returned when no database is configured"""
+    service = FeatureFlagService()
+
+    assert await service.is_enabled("missing", default=True) is True
+
+
+def test_rollout_bucket_is_stable():
+    """Test rollout buckets are deterministic and in range"""
+    assert _rollout_bucket("user-123") == _rollout_bucket("user-123")
+    assert all(0 <= _rollout_bucket(f"user-{i}") < 100 for i in range(500))
+
+
+def test_rollout_percentage_boundaries(flag_service):
+    """Test 0% and 100% rollouts include nobody and everybody"""
+    flag = {"status": FeatureFlagStatus.ROLLOUT, "rollout_percentage": 100}
+    assert all(flag_service._evaluate_flag(flag, f"user-{i}") for i in range(50))
+
+    flag["rollout_percentage"] = 0
+    assert not any(flag_service._evaluate_flag(flag, f"user-{i}") for i in range(50))
+
+
+def test_whitelists_are_checked_as_sets(flag_service):
+    """Test user and role whitelists grant access during rollout"""
+    flag = flag_service._prepare_flag({
+        "status": FeatureFlagStatus.ROLLOUT,
+        "rollout_percentage": 0,
+        "whitelist_users": ["user-1"],
+        "whitelist_roles": ["admin"]
+    })
+
+    assert flag["_whitelist_users_set"] == frozenset({"user-1"})
+    assert flag_service._evaluate_flag(flag, "user-1") is True
+    assert flag_service._evaluate_flag(flag, "user-2", "admin") is True
+    assert flag_service._evaluate_flag(flag, "user-2", "student") is False
+
+
+@pytest.mark.asyncio
+async def test_missing_flag_is_negatively_cached(flag_service):
+    """Test an undefined flag hits the database once per TTL window"""
+    flag_service.db.feature_flags.find_one = AsyncMock(return_value=None)
+
+    assert await flag_service.is_enabled("undefined", default=True) is True
+    assert await flag_service.is_enabled("undefined", default=False) is False
+    assert flag_service.db.feature_flags.find_one.await_count == 1
+
+
+class _AsyncCursor:
+    """Minimal async iterator standing in for a Motor cursor"""
+
+    def __init__(self, docs):
+        self._docs = iter(docs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._docs)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+@pytest.mark.asyncio
+async def test_bulk_is_enabled_single_query(flag_service):
+    """Test bulk evaluation fetches all cache misses with one query"""
+    flag_service.db.feature_flags.find = MagicMock(return_value=_AsyncCursor([
+        {"name": "on", "status": FeatureFlagStatus.ENABLED},
+        {"name": "off", "status": FeatureFlagStatus.DISABLED},
+    ]))
+
+    result = await flag_service.bulk_is_enabled(["on", "off", "absent"], user_id="user-1", default=True)
+
+    assert result == {"on": True, "off": False, "absent": True}
+    flag_service.db.feature_flags.find.assert_called_once_with(
+        {"name": {"$in": ["on", "off", "absent"]}}, projection=_EVAL_PROJECTION
+    )
+
+    # Everything, including the missing flag, is now cached
+    result = await flag_service.bulk_is_enabled(["on", "absent"], default=False)
+    assert result == {"on": True, "absent": False}
+    assert flag_service.db.feature_flags.find.call_count == 1
+
+
+def test_collection_bound_when_db_assigned():
+    """Test assigning db binds the feature_flags collection once"""
+    service = FeatureFlagService()
+    assert service._flags is None
+
+    database = MagicMock()
+    service.db = database
+
+    assert service._flags is database.feature_flags
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_fetch(flag_service):
+    """Test concurrent checks of an uncached flag issue a single query"""
+    async def slow_find_one(*args, **kwargs):
+        await asyncio.sleep(0.01)
+        return {"name": "beta", "status": FeatureFlagStatus.ENABLED}
+
+    flag_service.db.feature_flags.find_one = AsyncMock(side_effect=slow_find_one)
+
+    results = await asyncio.gather(*(flag_service.is_enabled("beta") for _ in range(20)))
+
+    assert all(results)
+    assert flag_service.db.feature_flags.find_one.await_count == 1
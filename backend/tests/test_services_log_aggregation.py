@@ -0,0 +1,194 @@
+"""
+Log Aggregation Service Unit Tests
+"""
+
+import json
+import logging
+import os
+import queue
+import sys
+import time
+from datetime import datetime
+
+import pytest
+
+from services.log_aggregation import (
+    AccessLogFilter,
+    JSONFormatter,
+    LogAggregationService,
+    MsgpackFormatter,
+    MsgpackRotatingFileHandler,
+    SecurityLogFilter,
+    _LocalQueueHandler,
+    _format_timestamp,
+    _seek_json_log,
+    _tail_lines,
+)
+
+
+@pytest.fixture
+def log_service(tmp_path):
+    """Create a LogAggregationService over a temp dir without touching root handlers"""
+    service = LogAggregationService.__new__(LogAggregationService)
+    service.log_dir = str(tmp_path)
+    service._bind_log_paths()
+    service.json_logging = True
+    service.msgpack_logging = False
+    service.logger = logging.getLogger("test_log_aggregation")
+    return service
+
+
+def _write_log(path, entries):
+    """Write entries as JSON lines, plus one corrupt line"""
+    lines = [json.dumps(entry) for entry in entries] + ["not json"]
+    path.write_text("\n".join(lines) + "\n")
+
+
+def _make_record(msg="hello %s", args=("world",), **extra):
+    """Build a LogRecord carrying optional extra attributes"""
+    record = logging.LogRecord("noteshub", logging.INFO, __file__, 10, msg, args, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def test_json_formatter_output():
+    """Test formatter emits one JSON object with message, timestamp and extras"""
+    record = _make_record(request_id="req-1", duration_ms=12.5, payload={"x": object()})
+
+    entry = json.loads(JSONFormatter().format(record))
+
+    assert entry["message"] == "hello world"
+    assert entry["level"] == "INFO"
+    assert entry["request_id"] == "req-1"
+    assert entry["duration_ms"] == 12.5
+    assert "object object" in entry["payload"]["x"]
+    # Timestamp stays naive ISO 8601 so search_logs can compare it
+    assert datetime.fromisoformat(entry["timestamp"]).tzinfo is None
+
+
+def test_search_logs_filters(log_service, tmp_path):
+    """Test search_logs applies level, pattern and time window filters"""
+    _write_log(tmp_path / "app.log", [
+        {"timestamp": "2025-01-01T10:00:00", "level": "INFO", "message": "user login"},
+        {"timestamp": "2025-01-01T11:00:00", "level": "ERROR", "message": "db timeout"},
+        {"timestamp": "2025-01-01T12:00:00", "level": "INFO", "message": "user logout"},
+    ])
+
+    assert len(log_service.search_logs()) == 3
+    assert [e["message"] for e in log_service.search_logs(level="ERROR")] == ["db timeout"]
+    assert [e["message"] for e in log_service.search_logs(pattern="^user")] == ["user login", "user logout"]
+
+    window = log_service.search_logs(
+        start_time=datetime(2025, 1, 1, 10, 30),
+        end_time=datetime(2025, 1, 1, 11, 30)
+    )
+    assert [e["message"] for e in window] == ["db timeout"]
+
+
+def test_tail_lines_across_blocks(tmp_path):
+    """Test lines come back newest first, including ones split across blocks"""
+    path = tmp_path / "app.log"
+    lines = [f"line-{i:03d}-" + "x" * (i % 7) for i in range(200)]
+    path.write_text("\n".join(lines) + "\n")
+
+    assert [line.decode() for line in _tail_lines(path, block_size=16)] == lines[::-1]
+
+
+def test_get_recent_errors_returns_newest(log_service, tmp_path):
+    """Test recent errors are the last entries of error.log, in file order"""
+    _write_log(tmp_path / "error.log", [
+        {"timestamp": f"2025-01-01T10:00:{i:02d}", "level": level, "message": f"event {i}"}
+        for i, level in enumerate(["ERROR", "ERROR", "CRITICAL", "ERROR", "ERROR"])
+    ])
+
+    errors = log_service.get_recent_errors(count=2)
+
+    assert [e["message"] for e in errors] == ["event 3", "event 4"]
+
+
+def test_access_and_security_filters():
+    """Test filters match HTTP methods and security keywords"""
+    access = AccessLogFilter()
+    assert access.filter(_make_record("%s /api/notes 200", ("GET",)))
+    assert access.filter(_make_record("DELETE /api/notes/1", ()))
+    assert not access.filter(_make_record("TARGETING users", ()))
+
+    security = SecurityLogFilter()
+    assert security.filter(_make_record("User LOGIN succeeded", ()))
+    assert security.filter(_make_record("Access denied for %s", ("bob",)))
+    assert not security.filter(_make_record("note uploaded", ()))
+
+
+def test_queue_handler_keeps_exception_info():
+    """Test queued records keep exc_info and have args merged into msg"""
+    try:
+        raise ValueError("bad")
+    except ValueError:
+        record = _make_record(exc_info=sys.exc_info())
+
+    prepared = _LocalQueueHandler(queue.Queue()).prepare(record)
+
+    assert prepared.msg == "hello world"
+    assert prepared.args is None
+    assert prepared.exc_info is not None
+    assert "ValueError: bad" in json.loads(JSONFormatter().format(prepared))["exception"]
+
+
+def test_msgpack_log_round_trip(log_service, tmp_path):
+    """Test MessagePack frames written by the handler are searchable"""
+    handler = MsgpackRotatingFileHandler(tmp_path / "error.mpk", maxBytes=1024 * 1024, backupCount=1)
+    handler.setFormatter(MsgpackFormatter())
+    for i, level in enumerate([logging.ERROR, logging.WARNING, logging.ERROR]):
+        record = _make_record("event %d", (i,), user_id="u1")
+        record.levelno, record.levelname = level, logging.getLevelName(level)
+        handler.emit(record)
+    handler.close()
+
+    entries = log_service.search_logs(log_file="error.mpk", level="ERROR")
+    assert [e["message"] for e in entries] == ["event 0", "event 2"]
+    assert entries[0]["user_id"] == "u1"
+
+    log_service.msgpack_logging = True
+    assert [e["message"] for e in log_service.get_recent_errors(count=1)] == ["event 2"]
+
+
+def test_format_timestamp_matches_isoformat():
+    """Test cached timestamp formatting agrees with datetime across seconds"""
+    for created in (1700000000.0, 1700000000.25, 1700000001.5, 1700000001.75):
+        assert datetime.fromisoformat(_format_timestamp(created)) == datetime.utcfromtimestamp(created)
+
+
+def test_log_stats_and_cleanup(log_service, tmp_path):
+    """Test stats cover log files only and cleanup removes old rotated files"""
+    (tmp_path / "app.log").write_bytes(b"a" * 10)
+    (tmp_path / "app.log.1").write_bytes(b"b" * 20)
+    (tmp_path / "error.mpk.1").write_bytes(b"c" * 30)
+    (tmp_path / "notes.txt").write_bytes(b"ignored")
+    old = time.time() - 40 * 24 * 60 * 60
+    for name in ("app.log.1", "error.mpk.1"):
+        os.utime(tmp_path / name, (old, old))
+
+    stats = log_service.get_log_stats()
+    assert sorted(f["name"] for f in stats["files"]) == ["app.log", "app.log.1", "error.mpk.1"]
+    assert sum(f["size_bytes"] for f in stats["files"]) == 60
+
+    result = log_service.cleanup_old_logs(days=30)
+    assert result["deleted_count"] == 2
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["app.log", "notes.txt"]
+
+
+def test_search_logs_start_time_bisects(log_service, tmp_path):
+    """Test start_time searches skip earlier entries without reading them"""
+    _write_log(tmp_path / "app.log", [
+        {"timestamp": f"2025-01-01T10:{i // 60:02d}:{i % 60:02d}", "level": "INFO", "message": f"event {i}"}
+        for i in range(2000)
+    ])
+
+    with open(tmp_path / "app.log", "rb") as f:
+        _seek_json_log(f, datetime(2025, 1, 1, 10, 30, 0))
+        skipped = f.tell()
+    assert skipped > 0
+
+    results = log_service.search_logs(start_time=datetime(2025, 1, 1, 10, 30, 0), limit=3)
+    assert [e["message"] for e in results] == ["event 1800", "event 1801", "event 1802"]
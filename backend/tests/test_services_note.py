@@ -6,6 +6,7 @@ import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 import uuid
 from datetime import datetime
+from pymongo.errors import AutoReconnect, BulkWriteError
 
 from services.note_service import NoteService
 
@@ -89,14 +90,16 @@ async def test_get_notes_with_filters(note_service):
 @pytest.mark.asyncio
 async def test_increment_view_count(note_service):
     """Test incrementing note view count"""
-    note_service.db.notes.update_one = AsyncMock()
+    note_service.db.notes.bulk_write = AsyncMock(return_value=MagicMock(modified_count=1))
     
     await note_service.increment_view_count("note123")
+    await note_service.flush_counters()
+    note_service._flush_task.cancel()
     
-    note_service.db.notes.update_one.assert_called_once()
-    call_args = note_service.db.notes.update_one.call_args
-    assert call_args[0][0] == {"_id": "note123"}
-    assert "$inc" in call_args[0][1]
+    note_service.db.notes.bulk_write.assert_called_once()
+    operation = note_service.db.notes.bulk_write.call_args[0][0][0]
+    assert operation._filter == {"id": "note123"}
+    assert operation._doc == {"$inc": {"view_count": 1}}
 
 
 @pytest.mark.asyncio
@@ -121,3 +124,101 @@ async def test_update_note_approval_status(note_service):
     call_args = note_service.db.notes.update_one.call_args
     assert call_args[0][0] == {"_id": "note123"}
     assert "is_approved" in str(call_args[0][1])
+
+
+def _mock_find_cursor(note_service, docs):
+    """Wire db.notes.find to a chainable cursor returning docs"""
+    mock_cursor = MagicMock()
+    mock_cursor.sort = MagicMock(return_value=mock_cursor)
+    mock_cursor.skip = MagicMock(return_value=mock_cursor)
+    mock_cursor.limit = MagicMock(return_value=mock_cursor)
+    mock_cursor.to_list = AsyncMock(return_value=docs)
+    note_service.db.notes.find = MagicMock(return_value=mock_cursor)
+    return mock_cursor
+
+
+@pytest.mark.asyncio
+async def test_search_notes_uses_text_index(note_service):
+    """Test search queries use $text and rank by text score"""
+    cursor = _mock_find_cursor(note_service, [{"id": "n1"}])
+    
+    result = await note_service.search_notes("linear algebra", department="CSE")
+    
+    assert result == [{"id": "n1"}]
+    query, projection = note_service.db.notes.find.call_args[0]
+    assert projection == NoteService.LIST_PROJECTION
+    assert query == {"is_approved": True, "$text": {"$search": "linear algebra"}, "department": "CSE"}
+    assert cursor.sort.call_args[0][0][0] == ("score", {"$meta": "textScore"})
+
+
+@pytest.mark.asyncio
+async def test_search_notes_short_query_prefix_match(note_service):
+    """Test short queries fall back to an escaped prefix match"""
+    _mock_find_cursor(note_service, [])
+    
+    await note_service.search_notes("c+")
+    
+    query = note_service.db.notes.find.call_args[0][0]
+    assert "$text" not in query
+    assert query["$or"][0] == {"title": {"$regex": "^c\\+", "$options": "i"}}
+
+
+@pytest.mark.asyncio
+async def test_counter_increments_are_coalesced(note_service):
+    """Test repeated views/downloads become one $inc per note in a single bulk write"""
+    note_service.db.notes.bulk_write = AsyncMock(return_value=MagicMock(modified_count=2))
+    
+    for _ in range(3):
+        assert await note_service.increment_view_count("n1") is True
+    await note_service.increment_download_count("n1")
+    await note_service.increment_view_count("n2")
+    
+    assert await note_service.flush_counters() == 2
+    
+    note_service.db.notes.bulk_write.assert_awaited_once()
+    operations = note_service.db.notes.bulk_write.call_args[0][0]
+    updates = {op._filter["id"]: op._doc["$inc"] for op in operations}
+    assert updates == {
+        "n1": {"view_count": 3, "download_count": 1},
+        "n2": {"view_count": 1}
+    }
+    
+    # Buffers are empty after a flush
+    assert await note_service.flush_counters() == 0
+    note_service._flush_task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_counter_flush_failure_restores_increments(note_service):
+    """Test increments survive a failed bulk write and are retried on the next flush"""
+    note_service.db.notes.bulk_write = AsyncMock(side_effect=AutoReconnect("connection closed"))
+    
+    await note_service.increment_view_count("n1")
+    await note_service.increment_download_count("n1")
+    assert await note_service.flush_counters() == 0
+    
+    # Increments made while the write was failing are merged, not overwritten
+    await note_service.increment_view_count("n1")
+    note_service.db.notes.bulk_write = AsyncMock(return_value=MagicMock(modified_count=1))
+    assert await note_service.flush_counters() == 1
+    note_service._flush_task.cancel()
+    
+    [operation] = note_service.db.notes.bulk_write.call_args[0][0]
+    assert operation._doc == {"$inc": {"view_count": 2, "download_count": 1}}
+
+
+@pytest.mark.asyncio
+async def test_counter_flush_partial_failure_restores_failed_notes_only(note_service):
+    """Test only the notes whose updates failed are put back after a partial bulk write"""
+    await note_service.increment_view_count("n1")
+    await note_service.increment_view_count("n2")
+    
+    async def bulk_write(operations, ordered):
+        failed = next(i for i, op in enumerate(operations) if op._filter["id"] == "n2")
+        raise BulkWriteError({"writeErrors": [{"index": failed, "errmsg": "timeout"}], "nModified": 1})
+    
+    note_service.db.notes.bulk_write = bulk_write
+    assert await note_service.flush_counters() == 1
+    note_service._flush_task.cancel()
+    
+    assert note_service._view_counts == {"n2": 1}
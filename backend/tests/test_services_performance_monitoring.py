@@ -0,0 +1,264 @@
+"""
+Performance Monitoring Service Unit Tests
+"""
+
+import asyncio
+
+import pytest
+from unittest.mock import MagicMock
+
+from services import performance_monitoring
+from services.performance_monitoring import PerformanceMonitoringService
+
+
+@pytest.fixture
+def monitor(monkeypatch):
+    """Create a PerformanceMonitoringService with Sentry reporting disabled"""
+    monkeypatch.setenv("PERFORMANCE_MONITORING_ENABLED", "false")
+    monkeypatch.setenv("METRIC_STATS_CACHE_TTL", "0")
+    return PerformanceMonitoringService()
+
+
+def test_endpoint_stats_percentiles(monitor):
+    """Test endpoint percentiles use nearest-rank indexes over the window"""
+    for duration in range(100, 0, -1):
+        monitor.track_endpoint("GET", "/api/notes", float(duration), 500 if duration <= 10 else 200)
+
+    stats = monitor.get_endpoint_stats()["GET /api/notes"]
+
+    assert stats["count"] == 100
+    assert stats["p50_duration_ms"] == 51.0
+    assert stats["p95_duration_ms"] == 96.0
+    assert stats["p99_duration_ms"] == 100.0
+    assert stats["min_duration_ms"] == 1.0
+    assert stats["max_duration_ms"] == 100.0
+    assert stats["avg_duration_ms"] == pytest.approx(50.5)
+    assert stats["error_count"] == 10
+    assert stats["error_rate"] == pytest.approx(0.1)
+
+
+def test_query_stats_filters_by_collection(monitor):
+    """Test query stats are grouped per operation and filtered by collection"""
+    monitor.slow_query_threshold = 100
+    for duration in (5.0, 150.0, 20.0):
+        monitor.track_database_query("notes", "find", duration)
+    monitor.track_database_query("users", "find", 1.0)
+
+    stats = monitor.get_query_stats(collection="notes")
+
+    assert list(stats) == ["notes.find"]
+    assert stats["notes.find"]["count"] == 3
+    assert stats["notes.find"]["p95_duration_ms"] == 150.0
+    assert stats["notes.find"]["slow_query_count"] == 1
+
+
+def test_endpoint_samples_stored_as_columns(monitor):
+    """Test endpoint samples are appended to parallel arrays"""
+    monitor.track_endpoint("POST", "/api/notes", 12.5, 201, user_id="user-1")
+    monitor.track_endpoint("POST", "/api/notes", 30.0, 422)
+
+    series = monitor.endpoint_metrics["POST /api/notes"]
+
+    assert list(series.durations) == [12.5, 30.0]
+    assert list(series.status_codes) == [201, 422]
+    assert series.user_ids == ["user-1", None]
+    assert len(series.timestamps) == 2
+
+
+def test_stats_exclude_samples_outside_window(monitor):
+    """Test samples older than the window are ignored"""
+    for duration in (10.0, 20.0, 30.0):
+        monitor.track_endpoint("GET", "/api/notes", duration, 200)
+        monitor.track_database_query("notes", "find", duration)
+
+    # Age the first sample of each series past the window
+    monitor.endpoint_metrics["GET /api/notes"].timestamps[0] -= 3600
+    monitor.query_metrics["notes.find"].timestamps[0] -= 3600
+
+    endpoint_stats = monitor.get_endpoint_stats(minutes=30)["GET /api/notes"]
+    query_stats = monitor.get_query_stats(minutes=30)["notes.find"]
+
+    assert endpoint_stats["count"] == 2
+    assert endpoint_stats["min_duration_ms"] == 20.0
+    assert query_stats["count"] == 2
+    assert monitor.get_endpoint_stats(endpoint="GET /missing") == {}
+
+
+def test_window_start_found_by_bisect(monitor):
+    """Test the window keeps only samples newer than the cutoff"""
+    for duration in (1.0, 2.0, 3.0, 4.0):
+        monitor.track_endpoint("GET", "/api/search", duration, 200)
+
+    series = monitor.endpoint_metrics["GET /api/search"]
+    series.timestamps[0] -= 7200
+    series.timestamps[1] -= 3600
+
+    assert monitor.get_endpoint_stats(minutes=90)["GET /api/search"]["count"] == 3
+    assert monitor.get_endpoint_stats(minutes=30)["GET /api/search"]["count"] == 2
+
+    # Stats must not hold on to the arrays' buffers
+    monitor.track_endpoint("GET", "/api/search", 5.0, 200)
+    assert monitor.get_endpoint_stats(minutes=30)["GET /api/search"]["count"] == 3
+
+
+def test_metric_buffers_are_bounded(monkeypatch):
+    """Test old samples are evicted once a buffer passes METRIC_BUFFER_SIZE"""
+    monkeypatch.setenv("PERFORMANCE_MONITORING_ENABLED", "false")
+    monkeypatch.setenv("METRIC_BUFFER_SIZE", "8")
+    monitor = PerformanceMonitoringService()
+
+    for i in range(50):
+        monitor.track_endpoint("GET", "/api/notes", float(i), 200)
+        monitor.track_database_query("notes", "find", float(i))
+        monitor.track_custom_metric("uploads", float(i))
+
+    endpoint_series = monitor.endpoint_metrics["GET /api/notes"]
+    query_series = monitor.query_metrics["notes.find"]
+
+    assert len(endpoint_series) < 10
+    assert len(endpoint_series.user_ids) == len(endpoint_series.timestamps) == len(endpoint_series)
+    assert endpoint_series.durations[-1] == 49.0
+    assert len(query_series) < 10
+    assert len(monitor.custom_metrics["uploads"]) == 8
+    assert monitor.get_endpoint_stats()["GET /api/notes"]["max_duration_ms"] == 49.0
+
+
+def test_latency_histogram_covers_evicted_samples(monkeypatch):
+    """Test histogram percentiles include samples trimmed from the buffer"""
+    monkeypatch.setenv("PERFORMANCE_MONITORING_ENABLED", "false")
+    monkeypatch.setenv("METRIC_BUFFER_SIZE", "10")
+    monitor = PerformanceMonitoringService()
+
+    for duration in range(1, 1001):
+        monitor.track_endpoint("GET", "/api/notes", float(duration), 200)
+
+    stats = monitor.get_latency_histogram_stats()["GET /api/notes"]
+
+    assert stats["count"] == 1000
+    assert stats["p50_duration_ms"] == pytest.approx(501, rel=0.01)
+    assert stats["p95_duration_ms"] == pytest.approx(951, rel=0.01)
+    assert stats["p99_duration_ms"] == pytest.approx(991, rel=0.01)
+    assert monitor.get_latency_histogram_stats(endpoint="GET /missing") == {}
+
+
+def test_stats_cached_until_ttl_expires(monkeypatch):
+    """Test repeated stats calls reuse the result within the TTL"""
+    monkeypatch.setenv("PERFORMANCE_MONITORING_ENABLED", "false")
+    monitor = PerformanceMonitoringService()
+    monitor.track_endpoint("GET", "/api/notes", 10.0, 200)
+
+    first = monitor.get_endpoint_stats()
+    monitor.track_endpoint("GET", "/api/notes", 20.0, 200)
+
+    assert monitor.get_endpoint_stats() is first
+    assert monitor.get_endpoint_stats(minutes=5)["GET /api/notes"]["count"] == 2
+
+    # Expire the cached entry
+    computed_at, stats = monitor._stats_cache[("endpoint", None, 60)]
+    monitor._stats_cache[("endpoint", None, 60)] = (computed_at - 60, stats)
+
+    assert monitor.get_endpoint_stats()["GET /api/notes"]["count"] == 2
+
+    monitor.reset_metrics()
+    assert monitor.get_endpoint_stats() == {}
+
+
+def test_track_endpoint_tags_ambient_transaction(monkeypatch):
+    """Test Sentry data goes on the current transaction instead of a new one"""
+    monkeypatch.setenv("PERFORMANCE_MONITORING_ENABLED", "true")
+    monitor = PerformanceMonitoringService()
+
+    transaction = MagicMock()
+    scope = MagicMock(transaction=transaction)
+    sentry = MagicMock()
+    sentry.get_current_scope.return_value = scope
+    monkeypatch.setattr(performance_monitoring, "sentry_sdk", sentry, raising=False)
+    monkeypatch.setattr(performance_monitoring, "SENTRY_AVAILABLE", True)
+
+    monitor.track_endpoint("GET", "/api/notes", 12.0, 200, user_id="user-1")
+
+    sentry.start_transaction.assert_not_called()
+    transaction.set_measurement.assert_called_once_with("duration", 12.0, "millisecond")
+    transaction.set_tag.assert_any_call("status_code", 200)
+    transaction.set_tag.assert_any_call("user_id", "user-1")
+
+    # Outside a request there is no transaction to annotate
+    scope.transaction = None
+    monitor.track_endpoint("GET", "/api/notes", 12.0, 200)
+    assert transaction.set_measurement.call_count == 1
+
+
+def test_slow_events_sampled_for_sentry(monkeypatch, caplog):
+    """Test every slow event is logged but only every Nth goes to Sentry"""
+    monkeypatch.setenv("PERFORMANCE_MONITORING_ENABLED", "true")
+    monkeypatch.setenv("SLOW_EVENT_SENTRY_SAMPLE", "5")
+    monitor = PerformanceMonitoringService()
+    monitor.slow_query_threshold = 100
+
+    sentry = MagicMock()
+    monkeypatch.setattr(performance_monitoring, "sentry_sdk", sentry, raising=False)
+    monkeypatch.setattr(performance_monitoring, "SENTRY_AVAILABLE", True)
+
+    with caplog.at_level("WARNING", logger="services.performance_monitoring"):
+        for _ in range(12):
+            monitor.track_database_query("notes", "find", 250.0, {"subject": "math"})
+
+    warnings = [r for r in caplog.records if r.levelname == "WARNING"]
+
+    assert sentry.capture_message.call_count == 3
+    assert len(warnings) == 12
+    assert warnings[0].getMessage() == "Slow query detected: notes.find took 250.0ms"
+    assert warnings[0].query_details == "{'subject': 'math'}"
+
+
+def test_samples_use_monotonic_timestamps(monitor, monkeypatch):
+    """Test samples are stamped with time.monotonic() floats"""
+    monkeypatch.setattr(performance_monitoring.time, "monotonic", lambda: 1234.5)
+
+    monitor.track_endpoint("GET", "/api/notes", 10.0, 200)
+    monitor.track_custom_metric("uploads", 1.0)
+
+    assert monitor.endpoint_metrics["GET /api/notes"].timestamps[0] == 1234.5
+    assert monitor.custom_metrics["uploads"][0]["timestamp"] == 1234.5
+    assert monitor.get_endpoint_stats()["GET /api/notes"]["count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_custom_metrics_sent_to_sentry_in_aggregate(monkeypatch):
+    """Test custom metric values are buffered and flushed as one aggregate"""
+    monkeypatch.setenv("PERFORMANCE_MONITORING_ENABLED", "true")
+    monitor = PerformanceMonitoringService()
+    monitor.MEASUREMENT_FLUSH_INTERVAL = 0.01
+
+    sentry = MagicMock()
+    monkeypatch.setattr(performance_monitoring, "sentry_sdk", sentry, raising=False)
+    monkeypatch.setattr(performance_monitoring, "SENTRY_AVAILABLE", True)
+
+    for value in (10.0, 20.0, 30.0):
+        monitor.track_custom_metric("function.upload.duration", value)
+
+    sentry.metrics.gauge.assert_not_called()
+
+    await asyncio.sleep(0.05)
+
+    sentry.metrics.gauge.assert_any_call("function.upload.duration.count", 3)
+    sentry.metrics.gauge.assert_any_call("function.upload.duration.avg", 20.0)
+    sentry.metrics.gauge.assert_any_call("function.upload.duration.max", 30.0)
+    assert sentry.metrics.gauge.call_count == 4
+    sentry.set_measurement.assert_not_called()
+    assert monitor._measurement_flush_task.done()
+
+
+def test_custom_metric_flushed_immediately_without_event_loop(monkeypatch):
+    """Test values tracked outside an event loop are sent right away"""
+    monkeypatch.setenv("PERFORMANCE_MONITORING_ENABLED", "true")
+    monitor = PerformanceMonitoringService()
+
+    sentry = MagicMock()
+    monkeypatch.setattr(performance_monitoring, "sentry_sdk", sentry, raising=False)
+    monkeypatch.setattr(performance_monitoring, "SENTRY_AVAILABLE", True)
+
+    monitor.track_custom_metric("cache.hits", 1.0)
+
+    sentry.metrics.gauge.assert_any_call("cache.hits.count", 1)
+    assert monitor._pending_measurements == {}
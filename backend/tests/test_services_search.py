@@ -4,8 +4,16 @@ Search Service Unit Tests
 
 import pytest
 from unittest.mock import AsyncMock, MagicMock
+from pymongo.errors import OperationFailure
 
-from services.search_service import SearchService
+from services.search_service import (
+    AUTOCOMPLETE_COLLATION,
+    HISTORY_TRIM_EVERY,
+    RESULT_PROJECTION,
+    SearchService,
+    build_search_ngrams,
+    file_extension,
+)
 
 
 @pytest.fixture
@@ -83,6 +91,24 @@ async def test_ensure_text_indexes(search_service):
     search_service.db.notes.create_index.assert_called_once()
 
 
+@pytest.mark.asyncio
+async def test_ensure_text_indexes_replaces_old_text_index(search_service):
+    """Test a text index left under another name is dropped and recreated"""
+    search_service.db.notes.create_index = AsyncMock(
+        side_effect=[OperationFailure("text index already exists"), "notes_text_index"]
+    )
+    search_service.db.notes.index_information = AsyncMock(return_value={
+        "_id_": {"key": [("_id", 1)]},
+        "title_text_subject_text": {"key": [("_fts", "text"), ("_ftsx", 1)]},
+    })
+    search_service.db.notes.drop_index = AsyncMock()
+    
+    await search_service.ensure_text_indexes()
+    
+    search_service.db.notes.drop_index.assert_awaited_once_with("title_text_subject_text")
+    assert search_service.db.notes.create_index.await_count == 2
+
+
 @pytest.mark.asyncio
 async def test_get_popular_searches(search_service):
     """Test getting popular search queries"""
@@ -101,3 +127,200 @@ async def test_get_popular_searches(search_service):
     
     assert len(result) == 2
     assert result[0]["count"] >= result[1]["count"]  # Should be sorted by count
+
+
+def test_build_search_ngrams():
+    """Test note trigrams are lowercased and not built across fields"""
+    ngrams = build_search_ngrams("Data  Structures", "DSA", None)
+
+    assert "dat" in ngrams
+    assert "a s" in ngrams
+    assert "dsa" in ngrams
+    assert "s d" not in ngrams
+    assert ngrams == sorted(set(ngrams))
+
+
+@pytest.mark.asyncio
+async def test_fuzzy_search_uses_ngram_index(search_service):
+    """Test fuzzy search matches by shared trigrams instead of a regex scan"""
+    mock_cursor = MagicMock()
+    mock_cursor.to_list = AsyncMock(return_value=[{"id": "note1", "title": "Algorithms"}])
+    search_service.db.notes.aggregate = MagicMock(return_value=mock_cursor)
+
+    result = await search_service.fuzzy_search("algoritm", limit=5)
+
+    assert result == [{"id": "note1", "title": "Algorithms"}]
+    pipeline = search_service.db.notes.aggregate.call_args[0][0]
+    assert pipeline[0]["$match"] == {
+        "search_ngrams": {"$in": sorted(["alg", "lgo", "gor", "ori", "rit", "itm"])},
+        "is_approved": True
+    }
+    assert pipeline[2]["$match"] == {"_shared": {"$gte": 3}}
+    assert {"$limit": 5} in pipeline
+
+
+@pytest.mark.asyncio
+async def test_fuzzy_search_short_query_escapes_regex(search_service):
+    """Test queries without a trigram fall back to an escaped subsequence regex"""
+    mock_cursor = MagicMock()
+    mock_cursor.limit = MagicMock(return_value=mock_cursor)
+    mock_cursor.to_list = AsyncMock(return_value=[])
+    search_service.db.notes.find = MagicMock(return_value=mock_cursor)
+
+    await search_service.fuzzy_search("c+")
+
+    search_query = search_service.db.notes.find.call_args[0][0]
+    assert search_query["$or"][0]["title"]["$regex"] == "c.*\\+"
+
+
+@pytest.mark.asyncio
+async def test_save_search_history_trims_periodically(search_service):
+    """Test history is capped every HISTORY_TRIM_EVERY saves, not on each save"""
+    search_service.db.search_history.update_one = AsyncMock(return_value=MagicMock(upserted_id="new"))
+    mock_cursor = MagicMock()
+    mock_cursor.to_list = AsyncMock(return_value=[{"_id": "old1"}, {"_id": "old2"}])
+    search_service.db.search_history.aggregate = MagicMock(return_value=mock_cursor)
+    search_service.db.search_history.delete_many = AsyncMock()
+
+    for i in range(HISTORY_TRIM_EVERY - 1):
+        await search_service.save_search_history("user-1", f"query {i}")
+
+    search_service.db.search_history.aggregate.assert_not_called()
+
+    await search_service.save_search_history("user-1", "one more")
+
+    assert search_service.db.search_history.update_one.await_count == HISTORY_TRIM_EVERY
+    search_service.db.search_history.delete_many.assert_awaited_once_with(
+        {"_id": {"$in": ["old1", "old2"]}}
+    )
+
+
+@pytest.mark.asyncio
+async def test_autocomplete_titles_and_subjects_in_one_query(search_service):
+    """Test title and subject suggestions come from a single $facet aggregation"""
+    mock_cursor = MagicMock()
+    mock_cursor.to_list = AsyncMock(return_value=[{
+        "titles": [{"_id": "Data Structures"}, {"_id": None}],
+        "subjects": [{"_id": "Databases"}, {"_id": "Data Structures"}]
+    }])
+    search_service.db.notes.aggregate = MagicMock(return_value=mock_cursor)
+
+    result = await search_service.get_autocomplete_suggestions("dat")
+
+    assert result == ["Data Structures", "Databases"]
+    search_service.db.notes.aggregate.assert_called_once()
+    pipeline = search_service.db.notes.aggregate.call_args[0][0]
+    assert set(pipeline[1]["$facet"]) == {"titles", "subjects"}
+
+
+@pytest.mark.asyncio
+async def test_autocomplete_uses_collated_prefix_range(search_service):
+    """Test autocomplete matches a prefix range under a case-insensitive collation"""
+    mock_cursor = MagicMock()
+    mock_cursor.to_list = AsyncMock(return_value=[{"_id": "CSE"}])
+    search_service.db.notes.aggregate = MagicMock(return_value=mock_cursor)
+
+    result = await search_service.get_autocomplete_suggestions("cs", field="department")
+
+    assert result == ["CSE"]
+    pipeline = search_service.db.notes.aggregate.call_args[0][0]
+    assert pipeline[0]["$match"]["department"] == {"$gte": "cs", "$lt": "cs\uffff"}
+    assert search_service.db.notes.aggregate.call_args[1] == {"collation": AUTOCOMPLETE_COLLATION}
+
+
+@pytest.mark.asyncio
+async def test_autocomplete_and_popular_results_cached(search_service):
+    """Test repeated autocomplete/popular lookups are served from the cache"""
+    suggestions_cursor = MagicMock()
+    suggestions_cursor.to_list = AsyncMock(return_value=[{"_id": "Physics"}])
+    search_service.db.notes.aggregate = MagicMock(return_value=suggestions_cursor)
+    popular_cursor = MagicMock()
+    popular_cursor.to_list = AsyncMock(return_value=[{"_id": "dsa", "count": 3, "last_searched": None}])
+    search_service.db.search_history.aggregate = MagicMock(return_value=popular_cursor)
+
+    for _ in range(3):
+        assert await search_service.get_autocomplete_suggestions("ph", field="subject") == ["Physics"]
+        assert (await search_service.get_popular_searches(limit=5))[0]["query"] == "dsa"
+
+    assert search_service.db.notes.aggregate.call_count == 1
+    assert search_service.db.search_history.aggregate.call_count == 1
+
+    # Different arguments are cached separately
+    await search_service.get_autocomplete_suggestions("ph", field="subject", limit=3)
+    assert search_service.db.notes.aggregate.call_count == 2
+
+    # Expired entries are refetched
+    for key, (_, result) in list(search_service._result_cache.items()):
+        search_service._result_cache[key] = (0.0, result)
+    await search_service.get_popular_searches(limit=5)
+    assert search_service.db.search_history.aggregate.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_autocomplete_dedupes_and_stops_at_limit(search_service):
+    """Test duplicate suggestions are dropped and the result stops at limit"""
+    mock_cursor = MagicMock()
+    mock_cursor.to_list = AsyncMock(return_value=[{
+        "titles": [{"_id": "Maths I"}, {"_id": "Maths II"}],
+        "subjects": [{"_id": "Maths I"}, {"_id": ""}, {"_id": "Mechanics"}, {"_id": "Materials"}]
+    }])
+    search_service.db.notes.aggregate = MagicMock(return_value=mock_cursor)
+
+    result = await search_service.get_autocomplete_suggestions("ma", limit=3)
+
+    assert result == ["Maths I", "Maths II", "Mechanics"]
+
+
+def test_file_extension():
+    """Test file extensions are normalized for the file_extension field"""
+    assert file_extension("Lecture Notes.PDF") == "pdf"
+    assert file_extension("archive.tar.gz") == "gz"
+    assert file_extension("README") == ""
+    assert file_extension(None) == ""
+
+
+@pytest.mark.asyncio
+async def test_search_notes_filters_file_type_by_extension_field(search_service):
+    """Test the file type filter is an equality match on file_extension"""
+    mock_cursor = MagicMock()
+    mock_cursor.sort = MagicMock(return_value=mock_cursor)
+    mock_cursor.limit = MagicMock(return_value=mock_cursor)
+    mock_cursor.to_list = AsyncMock(return_value=[])
+    search_service.db.notes.find = MagicMock(return_value=mock_cursor)
+
+    await search_service.search_notes("", file_type=".PDF", user_college="RVCE")
+
+    search_query = search_service.db.notes.find.call_args[0][0]
+    assert search_query == {"college": "RVCE", "file_extension": "pdf"}
+
+
+@pytest.mark.asyncio
+async def test_search_notes_projects_result_fields(search_service):
+    """Test search results leave out _id and internal fields, plus the text score"""
+    mock_cursor = MagicMock()
+    mock_cursor.sort = MagicMock(return_value=mock_cursor)
+    mock_cursor.limit = MagicMock(return_value=mock_cursor)
+    mock_cursor.to_list = AsyncMock(return_value=[{"id": "note1", "title": "Optics", "score": 1.5}])
+    search_service.db.notes.find = MagicMock(return_value=mock_cursor)
+
+    result = await search_service.search_notes("optics")
+
+    assert result == [{"id": "note1", "title": "Optics"}]
+    projection = search_service.db.notes.find.call_args[0][1]
+    assert projection == {**RESULT_PROJECTION, "score": {"$meta": "textScore"}}
+
+
+@pytest.mark.asyncio
+async def test_save_search_history_skips_recent_duplicate(search_service):
+    """Test a search repeated within 24 hours is not inserted or counted again"""
+    search_service.db.search_history.update_one = AsyncMock(return_value=MagicMock(upserted_id=None))
+    search_service.db.search_history.aggregate = MagicMock()
+
+    for _ in range(HISTORY_TRIM_EVERY):
+        await search_service.save_search_history("user-1", "optics", {"year": 2})
+
+    search_service.db.search_history.aggregate.assert_not_called()
+    filter_doc, update = search_service.db.search_history.update_one.call_args[0]
+    assert filter_doc["user_id"] == "user-1" and filter_doc["query"] == "optics"
+    assert update["$setOnInsert"]["filters"] == {"year": 2}
+    assert search_service.db.search_history.update_one.call_args[1] == {"upsert": True}
@@ -0,0 +1,228 @@
+"""
+Storage Service Unit Tests
+"""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, call
+
+from services.storage_service import StorageService
+
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 16
+
+
+@pytest.fixture
+def local_storage(tmp_path, monkeypatch):
+    """Create a StorageService using local storage under a temp directory"""
+    monkeypatch.delenv("SUPABASE_URL", raising=False)
+    monkeypatch.delenv("SUPABASE_KEY", raising=False)
+    monkeypatch.chdir(tmp_path)
+    return StorageService()
+
+
+@pytest.mark.asyncio
+async def test_upload_note_local_fallback(local_storage, tmp_path):
+    """Test notes are written to uploads/notes without Supabase"""
+    success, filename, error = await local_storage.upload_note(b"%PDF-1.4 notes", "Lecture.pdf", "user-1")
+
+    assert success is True
+    assert error is None
+    assert filename.endswith(".pdf")
+    assert (tmp_path / "uploads" / "notes" / filename).read_bytes() == b"%PDF-1.4 notes"
+
+
+@pytest.mark.asyncio
+async def test_upload_profile_picture_local_fallback(local_storage, tmp_path):
+    """Test profile pictures are written to uploads/profile without Supabase"""
+    success, filename, error = await local_storage.upload_profile_picture(PNG, "me.png", "user-1")
+
+    assert success is True
+    assert filename.startswith("profile_")
+    assert (tmp_path / "uploads" / "profile" / filename).read_bytes() == PNG
+
+
+@pytest.mark.asyncio
+async def test_upload_note_rejects_invalid_type(local_storage):
+    """Test disallowed extensions are rejected before anything is written"""
+    success, filename, error = await local_storage.upload_note(b"MZ", "setup.exe", "user-1")
+
+    assert success is False
+    assert filename is None
+    assert "not allowed" in error
+
+
+@pytest.mark.asyncio
+async def test_buckets_created_at_startup_not_per_upload(local_storage):
+    """Test buckets are created by ensure_buckets and uploads skip create_bucket"""
+    client = MagicMock()
+    client.storage.create_bucket.side_effect = [None, Exception("Bucket already exists")]
+    client.storage.from_.return_value.get_public_url.return_value = "https://cdn/notes/x.pdf"
+    local_storage.client = client
+    local_storage.storage_enabled = True
+
+    await local_storage.ensure_buckets()
+    for _ in range(3):
+        success, url, _ = await local_storage.upload_note(b"%PDF-1.4", "a.pdf", "user-1")
+        assert success is True
+        assert url == "https://cdn/notes/x.pdf"
+
+    assert client.storage.create_bucket.call_args_list == [
+        call("notes", {"public": False}),
+        call("profile-pictures", {"public": True}),
+    ]
+    assert client.storage.from_.return_value.upload.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_ensure_buckets_noop_without_supabase(local_storage):
+    """Test local storage has no buckets to create"""
+    await local_storage.ensure_buckets()
+
+
+@pytest.mark.asyncio
+async def test_upload_notes_batch_skips_files_failing_scan(local_storage, tmp_path):
+    """Test batch uploads keep input order and never store rejected files"""
+    async def scan_file(path):
+        with open(path, "rb") as f:
+            infected = f.read().startswith(b"EICAR")
+        return {"safe": not infected, "message": "Threat detected and quarantined"}
+
+    scanner = MagicMock()
+    scanner.scan_file = AsyncMock(side_effect=scan_file)
+    files = [
+        (b"%PDF-1.4 one", "one.pdf"),
+        (b"EICAR payload", "two.pdf"),
+        (b"MZ", "three.exe"),
+        (b"# notes", "four.md"),
+    ]
+
+    results = await local_storage.upload_notes_batch(files, "user-1", scanner=scanner, scan_workers=2, upload_workers=2)
+
+    assert [success for success, _, _ in results] == [True, False, False, True]
+    assert results[1][2] == "Threat detected and quarantined"
+    assert "not allowed" in results[2][2]
+    # Invalid files are rejected before the scanner sees them
+    assert scanner.scan_file.await_count == 3
+    stored = sorted(p.read_bytes() for p in (tmp_path / "uploads" / "notes").iterdir())
+    assert stored == [b"# notes", b"%PDF-1.4 one"]
+
+
+@pytest.mark.parametrize("filename", ["../notes.pdf", "a/b.pdf", "a\\b.pdf", "notes..pdf"])
+def test_validate_file_rejects_path_tricks(local_storage, filename):
+    """Test separators and parent references in filenames are rejected"""
+    assert local_storage.validate_file(filename, 10) == (False, "Invalid filename")
+
+
+def test_validate_file_extension_case_insensitive(local_storage):
+    """Test the extension check ignores case and needs a dot"""
+    assert local_storage.validate_file("Lecture.PDF", 10) == (True, None)
+    assert local_storage.validate_file("archive.tar.gz", 10)[0] is False
+    assert local_storage.validate_file("pdf", 10)[0] is False
+
+
+async def _chunks(*parts):
+    for part in parts:
+        yield part
+
+
+@pytest.mark.asyncio
+async def test_upload_note_streams_chunks_to_local_storage(local_storage, tmp_path):
+    """Test a chunk iterator is spooled to disk and moved into uploads/notes"""
+    success, filename, error = await local_storage.upload_note(
+        _chunks(b"%PDF-1.4 ", b"page one ", b"page two"), "Lecture.pdf", "user-1"
+    )
+
+    assert success is True
+    assert error is None
+    assert (tmp_path / "uploads" / "notes" / filename).read_bytes() == b"%PDF-1.4 page one page two"
+
+
+@pytest.mark.asyncio
+async def test_upload_note_stream_over_limit_rejected(local_storage, tmp_path):
+    """Test streamed uploads stop and fail once they pass the size limit"""
+    local_storage.MAX_FILE_SIZE = 10
+
+    success, filename, error = await local_storage.upload_note(
+        _chunks(b"12345678", b"12345678", b"12345678"), "big.pdf", "user-1"
+    )
+
+    assert success is False
+    assert filename is None
+    assert error.startswith("File too large")
+    assert not (tmp_path / "uploads").exists()
+
+
+@pytest.mark.asyncio
+async def test_upload_note_stream_passes_file_to_supabase(local_storage):
+    """Test streamed uploads hand Supabase an open file rather than bytes"""
+    client = MagicMock()
+    bucket = client.storage.from_.return_value
+    bucket.upload.side_effect = lambda path, f, options: uploaded.append(f.read())
+    bucket.get_public_url.return_value = "https://cdn/notes/x.pdf"
+    uploaded = []
+    local_storage.client = client
+    local_storage.storage_enabled = True
+
+    success, url, _ = await local_storage.upload_note(_chunks(b"%PDF", b"-1.4"), "a.pdf", "user-1")
+
+    assert success is True
+    assert url == "https://cdn/notes/x.pdf"
+    assert uploaded == [b"%PDF-1.4"]
+    assert bucket.upload.call_args.args[2] == {"content-type": "application/pdf"}
+
+
+def test_guess_mime_cached_per_extension(local_storage, monkeypatch):
+    """Test mime types are guessed once per extension and fall back to the default"""
+    StorageService._MIME_CACHE.clear()
+    guess = MagicMock(side_effect=lambda name: ({".pdf": "application/pdf"}.get(name[4:]), None))
+    monkeypatch.setattr("services.storage_service.mimetypes.guess_type", guess)
+
+    assert local_storage._guess_mime("a.PDF", "application/octet-stream") == "application/pdf"
+    assert local_storage._guess_mime("b.pdf", "application/octet-stream") == "application/pdf"
+    assert local_storage._guess_mime("c.unknown", "image/jpeg") == "image/jpeg"
+    assert local_storage._guess_mime("d.unknown", "image/jpeg") == "image/jpeg"
+    assert guess.call_count == 2
+    StorageService._MIME_CACHE.clear()
+
+
+def test_generate_unique_filename(local_storage):
+    """Test generated names are 32 hex chars plus the lowercased extension"""
+    first = local_storage.generate_unique_filename("Lecture Notes.PDF")
+    second = local_storage.generate_unique_filename("Lecture Notes.PDF")
+
+    assert first != second
+    assert first.endswith(".pdf")
+    assert len(first) == 36
+    int(first[:32], 16)
+    assert len(local_storage.generate_unique_filename("README")) == 32
+
+
+@pytest.mark.asyncio
+async def test_upload_rejects_content_not_matching_extension(local_storage, tmp_path):
+    """Test sniffed magic bytes must match the claimed extension"""
+    success, _, error = await local_storage.upload_note(b"MZ\x90\x00" + b"\x00" * 64, "notes.pdf", "user-1")
+    assert success is False
+    assert error == "File content does not match its type"
+
+    success, _, error = await local_storage.upload_profile_picture(b"%PDF-1.4", "me.png", "user-1")
+    assert success is False
+
+    success, _, error = await local_storage.upload_note(_chunks(PNG), "notes.txt", "user-1")
+    assert success is False
+    assert not (tmp_path / "uploads").exists()
+
+
+@pytest.mark.asyncio
+async def test_upload_sends_sniffed_content_type(local_storage):
+    """Test Supabase gets the sniffed type, or the extension guess for text"""
+    client = MagicMock()
+    bucket = client.storage.from_.return_value
+    local_storage.client = client
+    local_storage.storage_enabled = True
+
+    await local_storage.upload_profile_picture(PNG, "me.jpg.png", "user-1")
+    await local_storage.upload_note(b"# Chapter 1", "notes.md", "user-1")
+
+    content_types = [c.args[2]["content-type"] for c in bucket.upload.call_args_list]
+    assert content_types[0] == "image/png"
+    assert content_types[1] in ("text/markdown", "application/octet-stream")
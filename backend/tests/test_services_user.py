@@ -5,6 +5,7 @@ User Service Unit Tests
 import pytest
 from unittest.mock import AsyncMock, MagicMock
 import uuid
+from datetime import datetime, timedelta
 
 from services.user_service import UserService
 
@@ -58,7 +59,7 @@ async def test_get_user_by_usn_found(user_service):
     result = await user_service.get_user_by_usn("1RV21CS001")
     
     assert result == expected_user
-    user_service.db.users.find_one.assert_called_once_with({"usn": "1RV21CS001"})
+    user_service.db.users.find_one.assert_called_once_with({"usn": "1RV21CS001"}, None)
 
 
 @pytest.mark.asyncio
@@ -77,6 +78,19 @@ async def test_get_user_by_email_found(user_service):
     assert result == expected_user
 
 
+@pytest.mark.asyncio
+async def test_get_user_by_email_with_projection(user_service):
+    """Test lookups pass the projection through to find_one"""
+    user_service.db.users.find_one = AsyncMock(return_value={"id": "user123", "password_hash": "hash"})
+    
+    await user_service.get_user_by_email("test@example.com", {"_id": 0, "id": 1, "password_hash": 1})
+    
+    user_service.db.users.find_one.assert_called_once_with(
+        {"email": "test@example.com"},
+        {"_id": 0, "id": 1, "password_hash": 1}
+    )
+
+
 @pytest.mark.asyncio
 async def test_create_user(user_service):
     """Test creating a new user"""
@@ -131,3 +145,71 @@ async def test_get_user_stats(user_service):
     
     assert stats["notes_count"] == 5
     assert stats["bookmarks_count"] == 3
+
+
+@pytest.mark.asyncio
+async def test_get_user_stats_single_notes_aggregation(user_service):
+    """Test upload count and totals come from one $facet aggregation"""
+    user_service.db.users.find_one = AsyncMock(return_value={"created_at": datetime.utcnow() - timedelta(days=3)})
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(return_value=[{
+        "count": [{"n": 4}],
+        "sums": [{"_id": None, "total_downloads": 12, "total_views": 40}]
+    }])
+    user_service.db.notes.aggregate = MagicMock(return_value=cursor)
+    user_service.db.notes.count_documents = AsyncMock()
+    
+    stats = await user_service.get_user_stats("user123")
+    
+    assert stats["uploadCount"] == 4
+    assert stats["downloadCount"] == 12
+    assert stats["viewCount"] == 40
+    assert stats["daysSinceJoined"] == 3
+    user_service.db.notes.count_documents.assert_not_called()
+    user_service.db.notes.aggregate.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_get_user_stats_no_notes(user_service):
+    """Test users without notes get zero counts"""
+    user_service.db.users.find_one = AsyncMock(return_value={"created_at": datetime.utcnow()})
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(return_value=[{"count": [], "sums": []}])
+    user_service.db.notes.aggregate = MagicMock(return_value=cursor)
+    
+    stats = await user_service.get_user_stats("user123")
+    
+    assert stats["uploadCount"] == 0
+    assert stats["downloadCount"] == 0
+    assert stats["viewCount"] == 0
+
+
+@pytest.mark.asyncio
+async def test_password_hashing_runs_off_event_loop(user_service, monkeypatch):
+    """Test bcrypt hashing and verification run in worker threads"""
+    import threading
+    from services import user_service as user_service_module
+    
+    loop_thread = threading.get_ident()
+    threads = []
+    
+    def fake_hash(password):
+        threads.append(threading.get_ident())
+        return f"hashed:{password}"
+    
+    def fake_verify(password, hashed):
+        threads.append(threading.get_ident())
+        return hashed == f"hashed:{password}"
+    
+    monkeypatch.setattr(user_service_module, "get_password_hash", fake_hash)
+    monkeypatch.setattr(user_service_module, "verify_password", fake_verify)
+    user_service.db.users.update_one = AsyncMock(return_value=MagicMock(modified_count=1))
+    
+    assert await user_service.update_password("user123", "s3cret") is True
+    assert await user_service.verify_user_password({"password_hash": "hashed:s3cret"}, "s3cret") is True
+    
+    user_service.db.users.update_one.assert_called_once_with(
+        {"id": "user123"}, {"$set": {"password_hash": "hashed:s3cret"}}
+    )
+    assert len(threads) == 2
+    assert loop_thread not in threads
@@ -0,0 +1,233 @@
+"""
+Virus Scanner Unit Tests
+"""
+
+import hashlib
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+from services import virus_scanner
+from services.virus_scanner import VirusScanner
+
+
+_check_clamav = VirusScanner._check_clamav
+_connect_clamd = VirusScanner._connect_clamd
+
+
+@pytest.fixture
+def scanner(tmp_path, monkeypatch):
+    """Create a VirusScanner quarantining into a temp directory, without ClamAV"""
+    monkeypatch.setenv("QUARANTINE_DIR", str(tmp_path / "quarantine"))
+    monkeypatch.setenv("VIRUS_SCAN_ENABLED", "true")
+    monkeypatch.setattr(VirusScanner, "_check_clamav", lambda self: False)
+    monkeypatch.setattr(VirusScanner, "_connect_clamd", lambda self: None)
+    return VirusScanner()
+
+
+def test_calculate_file_hash(scanner, tmp_path):
+    """Test the file hash is the SHA256 prefix used in quarantine names"""
+    data = b"lecture notes" * 10000
+    path = tmp_path / "notes.pdf"
+    path.write_bytes(data)
+
+    assert scanner._calculate_file_hash(path) == hashlib.sha256(data).hexdigest()[:16]
+
+
+class _ClamdError(Exception):
+    pass
+
+
+class _ClamdConnectionError(_ClamdError):
+    pass
+
+
+@pytest.fixture
+def fake_clamd(monkeypatch):
+    """Stand in for the clamd module and return the client mock it creates"""
+    client = MagicMock()
+    module = SimpleNamespace(
+        ClamdError=_ClamdError,
+        ConnectionError=_ClamdConnectionError,
+        ClamdUnixSocket=MagicMock(return_value=client),
+    )
+    monkeypatch.setattr(virus_scanner, "clamd", module, raising=False)
+    return client
+
+
+@pytest.mark.asyncio
+async def test_clamd_scan_clean_file(scanner, fake_clamd, tmp_path):
+    """Test clean files are streamed to clamd instead of spawning clamscan"""
+    streamed = []
+    fake_clamd.instream.side_effect = lambda f: streamed.append(f.read()) or {"stream": ("OK", None)}
+    scanner.clamd_socket = "/tmp/clamd.sock"
+    scanner.clamav_available = True
+    path = tmp_path / "notes.pdf"
+    path.write_bytes(b"%PDF-1.4")
+
+    with patch("services.virus_scanner.subprocess.run") as run:
+        result = await scanner.scan_file(str(path))
+
+    run.assert_not_called()
+    assert result["safe"] is True
+    assert result["method"] == "clamd"
+    assert streamed == [b"%PDF-1.4"]
+
+
+@pytest.mark.asyncio
+async def test_clamd_scan_uses_a_client_per_scan(scanner, fake_clamd, tmp_path):
+    """Test concurrent scans do not share one clamd socket"""
+    fake_clamd.instream.return_value = {"stream": ("OK", None)}
+    scanner.clamd_socket = "/tmp/clamd.sock"
+    scanner.clamav_available = True
+    path = tmp_path / "notes.pdf"
+    path.write_bytes(b"%PDF-1.4")
+
+    await scanner.scan_file(str(path))
+    await scanner.scan_file(str(path))
+
+    assert virus_scanner.clamd.ClamdUnixSocket.call_count == 2
+
+
+@pytest.mark.parametrize("error", [_ClamdError("INSTREAM size limit exceeded"), TimeoutError("timed out")])
+@pytest.mark.asyncio
+async def test_clamd_scan_errors_are_reported_unscanned(scanner, fake_clamd, tmp_path, error):
+    """Test daemon errors and socket timeouts fail the scan instead of raising"""
+    fake_clamd.instream.side_effect = error
+    scanner.clamd_socket = "/tmp/clamd.sock"
+    scanner.clamav_available = True
+    path = tmp_path / "notes.pdf"
+    path.write_bytes(b"%PDF-1.4")
+
+    with patch("services.virus_scanner.subprocess.run") as run:
+        result = await scanner.scan_file(str(path))
+
+    run.assert_not_called()
+    assert result == {"safe": False, "scanned": False, "error": str(error)}
+
+
+@pytest.mark.asyncio
+async def test_clamd_scan_quarantines_infected_file(scanner, fake_clamd, tmp_path):
+    """Test a FOUND response reports the signature and quarantines the file"""
+    fake_clamd.instream.return_value = {"stream": ("FOUND", "Eicar-Test-Signature")}
+    scanner.clamd_socket = "/tmp/clamd.sock"
+    scanner.clamav_available = True
+    path = tmp_path / "eicar.pdf"
+    path.write_bytes(b"X5O!P%@AP")
+
+    result = await scanner.scan_file(str(path))
+
+    assert result["safe"] is False
+    assert result["threat_info"] == "Eicar-Test-Signature"
+    assert not path.exists()
+    assert any(Path(scanner.quarantine_dir).glob("*_virus_detected.pdf"))
+
+
+@pytest.mark.asyncio
+async def test_clamd_connection_error_falls_back_to_clamscan(scanner, fake_clamd, tmp_path):
+    """Test scans fall back to clamscan when the daemon connection drops"""
+    fake_clamd.instream.side_effect = _ClamdConnectionError("socket closed")
+    scanner.clamd_socket = "/tmp/clamd.sock"
+    scanner.clamav_available = True
+    path = tmp_path / "notes.pdf"
+    path.write_bytes(b"%PDF-1.4")
+
+    with patch("services.virus_scanner.subprocess.run") as run:
+        run.return_value = MagicMock(returncode=0)
+        result = await scanner.scan_file(str(path))
+
+    assert run.call_args.args[0][0] == "clamscan"
+    assert result["safe"] is True
+    assert result["method"] == "clamav"
+
+
+@pytest.mark.asyncio
+async def test_basic_validation_flags_null_bytes_in_text(scanner, tmp_path):
+    """Test text files with null bytes in the header are quarantined"""
+    path = tmp_path / "notes.txt"
+    path.write_bytes(b"plain\x00text")
+
+    result = await scanner._basic_validation(path)
+
+    assert result["safe"] is False
+    assert result["threat_type"] == "null_bytes"
+    assert not path.exists()
+
+
+@pytest.mark.asyncio
+async def test_basic_validation_allows_binary_documents(scanner, tmp_path):
+    """Test null bytes are expected in binary formats like PDF"""
+    path = tmp_path / "notes.pdf"
+    path.write_bytes(b"%PDF-1.4\x00\x01")
+
+    result = await scanner._basic_validation(path)
+
+    assert result == {"safe": True, "scanned": True, "method": "basic_validation"}
+    assert path.exists()
+
+
+def test_check_clamav_probes_path_once(scanner, monkeypatch):
+    """Test the clamscan lookup uses PATH and is cached in the environment"""
+    monkeypatch.delenv("CLAMAV_AVAILABLE", raising=False)
+    which = MagicMock(return_value="/usr/bin/clamscan")
+    monkeypatch.setattr(virus_scanner.shutil, "which", which)
+
+    with patch("services.virus_scanner.subprocess.run") as run:
+        assert _check_clamav(scanner) is True
+        assert _check_clamav(scanner) is True
+
+    run.assert_not_called()
+    which.assert_called_once_with("clamscan")
+    assert virus_scanner.os.environ["CLAMAV_AVAILABLE"] == "1"
+
+    monkeypatch.setenv("CLAMAV_AVAILABLE", "0")
+    assert _check_clamav(scanner) is False
+
+
+def test_connect_clamd_sets_socket_deadline(scanner, monkeypatch):
+    """Test the clamd socket is opened with the scan timeout and pinged"""
+    client = MagicMock()
+    module = SimpleNamespace(ConnectionError=_ClamdConnectionError, ClamdUnixSocket=MagicMock(return_value=client))
+    monkeypatch.setattr(virus_scanner, "clamd", module, raising=False)
+    monkeypatch.setattr(virus_scanner, "CLAMD_AVAILABLE", True)
+    monkeypatch.setenv("CLAMD_SOCKET", "/tmp/clamd.sock")
+
+    assert _connect_clamd(scanner) == "/tmp/clamd.sock"
+    module.ClamdUnixSocket.assert_called_once_with(path="/tmp/clamd.sock", timeout=VirusScanner.SCAN_TIMEOUT)
+    client.ping.assert_called_once()
+
+    client.ping.side_effect = _ClamdConnectionError("refused")
+    assert _connect_clamd(scanner) is None
+
+
+def test_quarantine_file_writes_metadata(scanner, tmp_path):
+    """Test quarantined files are moved next to a .meta record"""
+    path = tmp_path / "payload.exe"
+    path.write_bytes(b"MZ")
+
+    scanner._quarantine_file(path, "suspicious_extension")
+
+    assert not path.exists()
+    [meta] = Path(scanner.quarantine_dir).glob("*.meta")
+    quarantined = meta.with_suffix("")
+    assert quarantined.read_bytes() == b"MZ"
+    lines = meta.read_text().splitlines()
+    assert lines[0] == f"Original Path: {path}"
+    assert lines[1] == "Reason: suspicious_extension"
+    assert lines[3] == f"Hash: {hashlib.sha256(b'MZ').hexdigest()[:16]}"
+
+
+def test_get_quarantine_stats_skips_metadata(scanner):
+    """Test stats count quarantined files but not their .meta records"""
+    quarantine = Path(scanner.quarantine_dir)
+    (quarantine / "a_virus_detected.pdf").write_bytes(b"x" * 2048)
+    (quarantine / "a_virus_detected.pdf.meta").write_text("Reason: virus_detected\n")
+    (quarantine / "subdir").mkdir()
+
+    stats = scanner.get_quarantine_stats()
+
+    assert stats["total_files"] == 1
+    assert stats["files"][0]["name"] == "a_virus_detected.pdf"
+    assert stats["files"][0]["size_bytes"] == 2048